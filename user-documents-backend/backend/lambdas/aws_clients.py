@@ -0,0 +1,114 @@
+"""
+Registro de clientes AWS reutilizados entre invocaciones "warm" de la Lambda.
+
+Los clientes de boto3 son costosos de crear (sesión, resolución de endpoints,
+pool de conexiones TLS), así que se crean una sola vez por contenedor y se
+comparten entre requests.
+"""
+import threading
+
+import boto3
+from botocore.config import Config
+
+from .config import get_settings
+from .metrics import instrument_client
+from .resilience import apply_policy
+
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+_resources = {}
+_tables = {}
+
+
+def build_client_config(settings=None, service_name=None):
+    """
+    Construye la configuración de botocore (pool, keep-alive, timeouts y
+    reintentos). botocore hace un solo intento por llamada: los reintentos
+    los decide resilience.py dentro del plazo de la invocación
+    """
+    if settings is None:
+        settings = get_settings()
+
+    read_timeouts = {'dynamodb': settings.dynamodb_read_timeout, 's3': settings.s3_read_timeout}
+    config = Config(
+        region_name=settings.aws_region,
+        max_pool_connections=settings.max_pool_connections,
+        tcp_keepalive=settings.tcp_keepalive,
+        connect_timeout=settings.connect_timeout,
+        read_timeout=read_timeouts.get(service_name, 60),
+        retries={
+            'mode': settings.retry_mode,
+            'total_max_attempts': 1
+        }
+    )
+    if service_name == 's3':
+        # SigV4 para que las URLs prefirmadas funcionen en cualquier región
+        config = config.merge(Config(signature_version='s3v4'))
+    return config
+
+
+def _get_session():
+    # Debe llamarse con _lock adquirido: boto3.Session no es thread-safe
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    return _session
+
+
+def get_client(service_name):
+    """Obtener un cliente de boto3 compartido (lazy y thread-safe)"""
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = _get_session().client(service_name, config=build_client_config(service_name=service_name))
+                instrument_client(client)
+                apply_policy(client)
+                _clients[service_name] = client
+    return client
+
+
+def get_resource(service_name):
+    """Obtener un resource de boto3 compartido (lazy y thread-safe)"""
+    resource = _resources.get(service_name)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(service_name)
+            if resource is None:
+                resource = _get_session().resource(service_name, config=build_client_config(service_name=service_name))
+                instrument_client(resource.meta.client)
+                apply_policy(resource.meta.client)
+                _resources[service_name] = resource
+    return resource
+
+
+def get_table(table_name=None):
+    """Obtener el handle de una tabla de DynamoDB compartido"""
+    if table_name is None:
+        table_name = get_settings().table_name
+
+    table = _tables.get(table_name)
+    if table is None:
+        dynamodb = get_resource('dynamodb')
+        with _lock:
+            table = _tables.get(table_name)
+            if table is None:
+                table = dynamodb.Table(table_name)
+                _tables[table_name] = table
+    return table
+
+
+def reset_clients():
+    """
+    Descarta todos los clientes cacheados (usado en pruebas para aislar
+    cambios de configuración o de entorno entre casos)
+    """
+    global _session
+    with _lock:
+        _clients.clear()
+        _resources.clear()
+        _tables.clear()
+        _session = None
@@ -0,0 +1,240 @@
+"""
+Subida de varios documentos en una sola request (POST /documents/batch).
+
+Los archivos se suben a S3 en paralelo y los metadatos se escriben con
+BatchWriteItem, reintentando los UnprocessedItems con el backoff de la
+política de resiliencia y dentro del plazo de la invocación (los errores de
+toda la llamada ya los reintenta la política). La respuesta incluye el
+resultado de cada documento.
+"""
+import logging
+import time
+import uuid
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+from . import metrics, resilience, storage_codec
+from .aws_clients import get_client, get_resource, get_table
+from .concurrency import submit, wait_all
+from .config import get_settings
+from .http_utils import content_etag, create_response, parse_json_body
+from .metadata_cache import invalidate_document
+from .routing import route
+from .schema import DEFAULT_CONTENT_TYPE, TYPE_DATE_ATTRIBUTE, build_s3_key, build_type_date
+from .validation import content_size_error, decode_file_content, request_size_error, validate_document_fields
+from .versions import publish_version
+
+
+logger = logging.getLogger(__name__)
+
+# Límite de DynamoDB por llamada a BatchWriteItem
+BATCH_WRITE_LIMIT = 25
+
+_sleep = time.sleep
+
+
+def _backoff(attempt):
+    """
+    Espera antes del intento attempt + 1 (backoff de resilience). Devuelve
+    False si otro intento no cabe en el plazo de la invocación.
+    """
+    delay = resilience.retry_delay(attempt)
+    remaining = resilience.remaining_time()
+    if remaining is not None and delay + resilience.MIN_ATTEMPT_SECONDS > remaining:
+        metrics.put_metric('DeadlineExceeded', 1)
+        return False
+    _sleep(delay)
+    return True
+
+
+def batch_write_items(table_name, items, max_attempts=None):
+    """
+    Escribe los items con BatchWriteItem en bloques de 25, reintentando los no
+    procesados. Devuelve el conjunto de claves (user_id, document_id) que no se
+    pudieron escribir.
+    """
+    if max_attempts is None:
+        max_attempts = get_settings().batch_write_max_attempts
+    dynamodb = get_resource('dynamodb')
+    failed = set()
+
+    for start in range(0, len(items), BATCH_WRITE_LIMIT):
+        pending = [{'PutRequest': {'Item': item}} for item in items[start:start + BATCH_WRITE_LIMIT]]
+        for attempt in range(1, max_attempts + 1):
+            try:
+                response = dynamodb.batch_write_item(RequestItems={table_name: pending})
+                pending = response.get('UnprocessedItems', {}).get(table_name, [])
+            except ClientError as e:
+                # La política de resiliencia ya agotó los reintentos de la llamada
+                logger.error("DynamoDB batch write error: %s", e)
+                break
+
+            if not pending or attempt == max_attempts:
+                break
+            metrics.put_metric('BatchWriteRetries', 1)
+            if not _backoff(attempt):
+                break
+
+        for request in pending:
+            item = request['PutRequest']['Item']
+            failed.add((item['user_id'], item['document_id']))
+
+    return failed
+
+
+def _discard_stored(s3_client, item, table=None):
+    """Elimina el archivo subido de un documento del lote (y sus metadatos, con table)"""
+    try:
+        s3_client.delete_object(Bucket=item['s3_bucket'], Key=item['s3_key'])
+    except ClientError as e:
+        logger.error("Orphan S3 object left at %s: %s", item['s3_key'], e)
+    if table is not None:
+        try:
+            table.delete_item(Key={'user_id': item['user_id'], 'document_id': item['document_id']})
+        except ClientError as e:
+            logger.error("Orphan metadata left for document %s: %s", item['document_id'], e)
+
+
+@route('POST', '/documents/batch')
+@metrics.route('upload_documents_batch')
+def upload_documents_batch(event):
+    """
+    Maneja la subida de varios documentos (POST /documents/batch)
+    """
+    s3_client = None
+    stored = []
+    try:
+        error_message = request_size_error(event)
+        if error_message:
+            return create_response(413, {'error': error_message})
+        body, error_response = parse_json_body(event)
+        if error_response:
+            return error_response
+
+        documents = body.get('documents')
+        if not isinstance(documents, list) or not documents:
+            return create_response(400, {'error': 'documents must be a non-empty list'})
+
+        settings = get_settings()
+        if len(documents) > settings.batch_max_documents:
+            return create_response(400, {'error': f'At most {settings.batch_max_documents} documents per batch'})
+
+        s3_client = get_client('s3')
+        s3_bucket = settings.bucket_name
+        results = [None] * len(documents)
+        prepared = []
+
+        # Validar y decodificar cada documento con las mismas reglas que POST /documents
+        for index, document in enumerate(documents):
+            fields, error_message = validate_document_fields(document)
+            if error_message is None and isinstance(document['file_content'], str):
+                file_content = document['file_content']
+                error_message = content_size_error(fields[1], (file_content, 0, len(file_content)))
+                if error_message:
+                    results[index] = {'index': index, 'status': 413, 'error': error_message}
+                    continue
+            if error_message is None:
+                with metrics.timer('Base64Decode'):
+                    file_bytes, error_message = decode_file_content(document['file_content'])
+            if error_message:
+                results[index] = {'index': index, 'status': 400, 'error': error_message}
+                continue
+
+            user_id, document_type, file_name = fields
+            etag, content_md5 = content_etag(file_bytes)
+            content_type = document.get('content_type', DEFAULT_CONTENT_TYPE)
+            with metrics.timer('Compress'):
+                stored_bytes, content_encoding = storage_codec.encode_for_storage(file_bytes, content_type)
+            document_id = str(uuid.uuid4())
+            upload_date = datetime.utcnow().isoformat()
+            item = {
+                'document_id': document_id,
+                'user_id': user_id,
+                'document_type': document_type,
+                'file_name': file_name,
+                's3_bucket': s3_bucket,
+                's3_key': build_s3_key(user_id, document_type, document_id, file_name),
+                'upload_date': upload_date,
+                TYPE_DATE_ATTRIBUTE: build_type_date(document_type, upload_date),
+                'file_size': len(file_bytes),
+                'content_type': content_type,
+                'etag': etag
+            }
+            put_kwargs = {
+                'Bucket': s3_bucket,
+                'Key': item['s3_key'],
+                'Body': stored_bytes,
+                'ContentMD5': content_md5,
+                'ContentType': content_type
+            }
+            if content_encoding != storage_codec.IDENTITY:
+                item['content_encoding'] = content_encoding
+                item['stored_size'] = len(stored_bytes)
+                put_kwargs['ContentEncoding'] = content_encoding
+                put_kwargs['ContentMD5'] = content_etag(stored_bytes)[1]
+            prepared.append((index, item, put_kwargs))
+
+        # Subir los archivos a S3 en paralelo
+        outcomes = wait_all([
+            submit(s3_client.put_object, **put_kwargs)
+            for _, _, put_kwargs in prepared
+        ])
+
+        for (index, item, _), (_, error) in zip(prepared, outcomes):
+            if error is not None:
+                logger.error("S3 upload error for batch item %s: %s", index, error)
+                results[index] = {'index': index, 'status': 500, 'error': 'Failed to upload file to S3'}
+            else:
+                stored.append((index, item))
+        # Liberar el contenido decodificado antes de escribir los metadatos
+        del prepared
+
+        # Guardar los metadatos con BatchWriteItem
+        failed_keys = batch_write_items(settings.table_name, [item for _, item in stored]) if stored else set()
+
+        published = []
+
+        for index, item in stored:
+            if (item['user_id'], item['document_id']) in failed_keys:
+                # Compensar: sin metadatos el archivo quedaría huérfano
+                _discard_stored(s3_client, item)
+                results[index] = {'index': index, 'status': 500, 'error': 'Failed to save document metadata'}
+            else:
+                published.append(item)
+                results[index] = {
+                    'index': index,
+                    'status': 201,
+                    'document_id': item['document_id'],
+                    'user_id': item['user_id'],
+                    'document_type': item['document_type'],
+                    'file_name': item['file_name']
+                }
+
+        # Actualizar los punteros LATEST# en paralelo; la condición de
+        # update_latest deja la versión más reciente si el lote tiene varias del
+        # mismo tipo
+        if published:
+            table = get_table()
+            wait_all([submit(publish_version, table, item) for item in published])
+            for user_id, document_type in {(item['user_id'], item['document_type']) for item in published}:
+                invalidate_document(user_id, document_type)
+
+        succeeded = sum(1 for result in results if result['status'] == 201)
+        response_data = {
+            'message': 'Batch processed',
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results
+        }
+        # 207 Multi-Status si algún documento falló
+        return create_response(201 if succeeded == len(results) else 207, response_data)
+
+    except Exception as e:
+        logger.error("Unexpected error in upload_documents_batch: %s", e)
+        # El cliente recibe un 500 para todo el lote: no dejar archivos ni
+        # metadatos de los documentos ya subidos
+        if stored:
+            table = get_table()
+            wait_all([submit(_discard_stored, s3_client, item, table) for _, item in stored])
+        return create_response(500, {'error': 'Internal server error'})
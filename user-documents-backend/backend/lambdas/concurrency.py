@@ -0,0 +1,58 @@
+"""
+Pool de hilos compartido para lanzar llamadas AWS en paralelo.
+
+Se crea una sola vez por contenedor. Las tareas se ejecutan con una copia del
+contexto (contextvars) de quien las lanza, para que las métricas de la
+invocación sigan registrándose desde los hilos del pool.
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import get_settings
+
+
+_lock = threading.Lock()
+_executor = None
+
+
+def get_executor():
+    """Obtener el pool de hilos compartido (lazy y thread-safe)"""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_settings().worker_threads,
+                    thread_name_prefix='aws-worker'
+                )
+    return _executor
+
+
+def submit(function, *args, **kwargs):
+    """Ejecuta function en el pool con el contexto actual. Devuelve un Future."""
+    context = contextvars.copy_context()
+    return get_executor().submit(context.run, function, *args, **kwargs)
+
+
+def wait_all(futures):
+    """
+    Espera a todas las tareas y devuelve (resultado, excepción) por cada una,
+    sin abandonar ninguna aunque alguna falle
+    """
+    outcomes = []
+    for future in futures:
+        try:
+            outcomes.append((future.result(), None))
+        except Exception as e:
+            outcomes.append((None, e))
+    return outcomes
+
+
+def reset_executor():
+    """Cierra el pool compartido (usado en pruebas)"""
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,209 @@
+"""Configuración del backend leída desde variables de entorno"""
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Configuración del backend leída desde variables de entorno
+    """
+    aws_region: str
+    table_name: str
+    bucket_name: str
+    max_pool_connections: int
+    tcp_keepalive: bool
+    retry_mode: str
+    max_attempts: int
+    connect_timeout: float
+    dynamodb_read_timeout: float
+    s3_read_timeout: float
+    retry_base_delay: float
+    retry_max_delay: float
+    deadline_margin: float
+    circuit_failure_threshold: int
+    circuit_reset_timeout: float
+    inline_download_max_bytes: int
+    range_max_bytes: int
+    presigned_url_expires: int
+    presigned_upload_expires: int
+    pending_upload_ttl: int
+    multipart_part_size: int
+    upload_spool_max_bytes: int
+    max_request_body_bytes: int
+    max_upload_bytes: int
+    document_type_max_bytes: dict
+    allowed_document_types: tuple
+    allowed_file_extensions: tuple
+    dedup_uploads: bool
+    version_retention: int
+    idempotency_ttl: int
+    idempotency_lock_timeout: int
+    idempotency_cache_max_entries: int
+    idempotency_cache_ttl: float
+    storage_codec: str
+    storage_codec_level: int
+    compression_min_bytes: int
+    compression_max_bytes: int
+    log_sample_rate: float
+    log_body_preview_chars: int
+    metrics_enabled: bool
+    metrics_namespace: str
+    worker_threads: int
+    eager_init: bool
+    batch_max_documents: int
+    batch_write_max_attempts: int
+    metadata_cache_max_entries: int
+    metadata_cache_ttl: float
+    metadata_cache_negative_ttl: float
+
+
+def _env_int(environ, name, default):
+    """Leer un entero de las variables de entorno"""
+    value = environ.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'Environment variable {name} must be an integer, got {value!r}')
+
+
+def _env_float(environ, name, default):
+    """Leer un número decimal de las variables de entorno"""
+    value = environ.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f'Environment variable {name} must be a number, got {value!r}')
+
+
+def _env_bool(environ, name, default):
+    """Leer un booleano de las variables de entorno"""
+    value = environ.get(name)
+    if value is None or value == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _env_choice(environ, name, default, choices):
+    """Leer un valor que debe ser una de las opciones permitidas"""
+    value = (environ.get(name) or default).strip().lower()
+    if value not in choices:
+        raise ValueError(f'Environment variable {name} must be one of {", ".join(choices)}, got {value!r}')
+    return value
+
+
+def _env_list(environ, name):
+    """Leer una lista separada por comas (vacía: sin restricción)"""
+    value = environ.get(name) or ''
+    return tuple(item.strip() for item in value.split(',') if item.strip())
+
+
+def _env_size_map(environ, name):
+    """Leer pares "clave=bytes" separados por comas"""
+    sizes = {}
+    for entry in _env_list(environ, name):
+        key, separator, value = entry.partition('=')
+        try:
+            if not separator:
+                raise ValueError
+            sizes[key.strip()] = int(value)
+        except ValueError:
+            raise ValueError(f'Environment variable {name} must be a list of type=bytes, got {entry!r}')
+    return sizes
+
+
+def load_settings(environ=None):
+    """
+    Construye la configuración a partir de las variables de entorno
+    """
+    if environ is None:
+        environ = os.environ
+
+    return Settings(
+        aws_region=environ.get('AWS_REGION') or environ.get('AWS_DEFAULT_REGION') or 'us-east-1',
+        table_name=environ.get('DOCUMENTS_TABLE', 'UserDocuments'),
+        bucket_name=environ.get('DOCUMENTS_BUCKET', 'user-documents-bucket'),
+        max_pool_connections=_env_int(environ, 'AWS_MAX_POOL_CONNECTIONS', 50),
+        tcp_keepalive=_env_bool(environ, 'AWS_TCP_KEEPALIVE', True),
+        # 'adaptive': botocore limita la tasa de envío del cliente al recibir
+        # throttling. Los reintentos los decide resilience.py
+        retry_mode=environ.get('AWS_RETRY_MODE', 'adaptive'),
+        max_attempts=_env_int(environ, 'AWS_MAX_ATTEMPTS', 5),
+        connect_timeout=_env_float(environ, 'AWS_CONNECT_TIMEOUT', 2.0),
+        dynamodb_read_timeout=_env_float(environ, 'DYNAMODB_READ_TIMEOUT', 3.0),
+        s3_read_timeout=_env_float(environ, 'S3_READ_TIMEOUT', 10.0),
+        retry_base_delay=_env_float(environ, 'RETRY_BASE_DELAY', 0.05),
+        retry_max_delay=_env_float(environ, 'RETRY_MAX_DELAY', 2.0),
+        # Tiempo reservado al final de la invocación para construir la respuesta
+        deadline_margin=_env_float(environ, 'DEADLINE_MARGIN', 0.5),
+        # Llamadas abandonadas consecutivas (tras sus reintentos) que abren el
+        # circuito de un servicio (0: sin circuito)
+        circuit_failure_threshold=_env_int(environ, 'CIRCUIT_FAILURE_THRESHOLD', 5),
+        circuit_reset_timeout=_env_float(environ, 'CIRCUIT_RESET_TIMEOUT', 10.0),
+        inline_download_max_bytes=_env_int(environ, 'INLINE_DOWNLOAD_MAX_BYTES', 256 * 1024),
+        # Un rango en base64 debe caber en la respuesta de Lambda (6 MB)
+        range_max_bytes=_env_int(environ, 'RANGE_MAX_BYTES', 3 * 1024 * 1024),
+        presigned_url_expires=_env_int(environ, 'PRESIGNED_URL_EXPIRES', 300),
+        presigned_upload_expires=_env_int(environ, 'PRESIGNED_UPLOAD_EXPIRES', 900),
+        pending_upload_ttl=_env_int(environ, 'PENDING_UPLOAD_TTL', 24 * 60 * 60),
+        multipart_part_size=_env_int(environ, 'MULTIPART_PART_SIZE', 8 * 1024 * 1024),
+        # Contenido decodificado que se mantiene en memoria antes de pasar a /tmp
+        upload_spool_max_bytes=_env_int(environ, 'UPLOAD_SPOOL_MAX_BYTES', 1024 * 1024),
+        # Límite de payload de una invocación síncrona de Lambda
+        max_request_body_bytes=_env_int(environ, 'MAX_REQUEST_BODY_BYTES', 6 * 1024 * 1024),
+        max_upload_bytes=_env_int(environ, 'MAX_UPLOAD_BYTES', 4 * 1024 * 1024),
+        document_type_max_bytes=_env_size_map(environ, 'DOCUMENT_TYPE_MAX_BYTES'),
+        allowed_document_types=_env_list(environ, 'ALLOWED_DOCUMENT_TYPES'),
+        allowed_file_extensions=tuple(
+            extension.lower().lstrip('.') for extension in _env_list(environ, 'ALLOWED_FILE_EXTENSIONS')
+        ),
+        dedup_uploads=_env_bool(environ, 'DEDUP_UPLOADS', False),
+        # Versiones conservadas por usuario y tipo de documento (0: todas)
+        version_retention=_env_int(environ, 'VERSION_RETENTION', 0),
+        # Ventana en la que un reintento con la misma Idempotency-Key devuelve
+        # la respuesta original, y tiempo tras el que una request en curso se
+        # considera abandonada
+        idempotency_ttl=_env_int(environ, 'IDEMPOTENCY_TTL', 24 * 60 * 60),
+        idempotency_lock_timeout=_env_int(environ, 'IDEMPOTENCY_LOCK_TIMEOUT', 60),
+        idempotency_cache_max_entries=_env_int(environ, 'IDEMPOTENCY_CACHE_MAX_ENTRIES', 256),
+        idempotency_cache_ttl=_env_float(environ, 'IDEMPOTENCY_CACHE_TTL', 300.0),
+        storage_codec=_env_choice(environ, 'STORAGE_CODEC', 'none', ('none', 'gzip', 'deflate')),
+        storage_codec_level=_env_int(environ, 'STORAGE_CODEC_LEVEL', 6),
+        compression_min_bytes=_env_int(environ, 'COMPRESSION_MIN_BYTES', 1024),
+        # Los documentos mayores se guardan sin comprimir: sus rangos se leen
+        # de S3 como rangos de bytes (0: sin límite)
+        compression_max_bytes=_env_int(environ, 'COMPRESSION_MAX_BYTES', 1024 * 1024),
+        log_sample_rate=_env_float(environ, 'LOG_SAMPLE_RATE', 1.0),
+        log_body_preview_chars=_env_int(environ, 'LOG_BODY_PREVIEW_CHARS', 512),
+        metrics_enabled=_env_bool(environ, 'METRICS_ENABLED', True),
+        metrics_namespace=environ.get('METRICS_NAMESPACE', 'UserDocuments'),
+        worker_threads=_env_int(environ, 'WORKER_THREADS', 8),
+        # Crear clientes y tabla en la fase de init de Lambda (ver lambda_function.initialize)
+        eager_init=_env_bool(environ, 'EAGER_INIT', bool(environ.get('AWS_LAMBDA_FUNCTION_NAME'))),
+        batch_max_documents=_env_int(environ, 'BATCH_MAX_DOCUMENTS', 25),
+        batch_write_max_attempts=_env_int(environ, 'BATCH_WRITE_MAX_ATTEMPTS', 5),
+        metadata_cache_max_entries=_env_int(environ, 'METADATA_CACHE_MAX_ENTRIES', 1024),
+        metadata_cache_ttl=_env_float(environ, 'METADATA_CACHE_TTL', 30.0),
+        metadata_cache_negative_ttl=_env_float(environ, 'METADATA_CACHE_NEGATIVE_TTL', 5.0)
+    )
+
+
+_settings = None
+
+
+def get_settings():
+    """Obtener la configuración (se lee una sola vez por contenedor)"""
+    global _settings
+    if _settings is None:
+        _settings = load_settings()
+    return _settings
+
+
+def reset_settings():
+    """Descartar la configuración cacheada (usado en pruebas)"""
+    global _settings
+    _settings = None
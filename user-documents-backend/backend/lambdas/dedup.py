@@ -0,0 +1,122 @@
+"""
+Almacenamiento direccionado por contenido para las subidas inline (opcional,
+DEDUP_UPLOADS=true).
+
+El contenido idéntico de un mismo usuario se guarda una sola vez en
+"{user_id}/blobs/{sha256}". Cada blob tiene un item de referencias en
+UserDocuments (document_id "BLOB#{sha256}", sin type_date ni upload_date, así
+que no aparece en los índices) con:
+
+- ref_count: número de documentos que apuntan al blob
+- stored: el objeto ya se subió a S3 (una subida duplicada solo escribe metadatos)
+- stored_size: tamaño del objeto en S3 (comprimido o no), lo guarda la subida
+  que confirma el objeto
+- content_encoding: codec con el que se guardó el objeto (ver storage_codec.py);
+  lo fija la primera subida y los documentos que reutilizan el blob lo heredan
+- releasing: el blob se está eliminando; las nuevas subidas no lo reutilizan
+
+La deduplicación es por usuario: los documentos de cada usuario siguen bajo su
+prefijo de S3 y el tiempo de subida no revela si otro usuario tiene el mismo
+archivo.
+"""
+import logging
+from collections import namedtuple
+
+from botocore.exceptions import ClientError
+
+from . import metrics
+from .resilience import non_idempotent
+from .schema import blob_item_id, build_blob_s3_key
+
+
+logger = logging.getLogger(__name__)
+
+Blob = namedtuple('Blob', ['content_sha256', 's3_key', 'needs_upload', 'content_encoding', 'stored_size'])
+
+
+def acquire_blob(table, user_id, sha256, file_size, etag, content_encoding):
+    """
+    Suma una referencia al blob del contenido (creándolo si no existe).
+    Devuelve un Blob, o None si el blob se está eliminando (el documento se
+    guarda entonces sin deduplicar).
+    """
+    s3_key = build_blob_s3_key(user_id, sha256)
+    try:
+        # ADD no es idempotente: un reintento tras un 5xx o un timeout podría
+        # sumar dos referencias
+        with non_idempotent():
+            response = table.update_item(
+                Key={'user_id': user_id, 'document_id': blob_item_id(sha256)},
+                UpdateExpression=(
+                    'ADD ref_count :one SET s3_key = :s3_key, file_size = :file_size, etag = :etag, '
+                    'content_encoding = if_not_exists(content_encoding, :content_encoding)'
+                ),
+                ConditionExpression='attribute_not_exists(releasing)',
+                ExpressionAttributeValues={
+                    ':one': 1,
+                    ':s3_key': s3_key,
+                    ':file_size': file_size,
+                    ':etag': etag,
+                    ':content_encoding': content_encoding
+                },
+                ReturnValues='ALL_OLD'
+            )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        raise
+
+    # Si el objeto aún no está confirmado (blob nuevo o subida concurrente) se
+    # sube de nuevo: la key y el contenido son los mismos
+    previous = response.get('Attributes', {})
+    needs_upload = not previous.get('stored')
+    metrics.put_metric('DedupHit', 0 if needs_upload else 1)
+    # stored_size solo se conoce si el objeto ya está confirmado (y falta en
+    # los blobs anteriores a este campo)
+    stored_size = None if needs_upload else previous.get('stored_size')
+    return Blob(sha256, s3_key, needs_upload, previous.get('content_encoding', content_encoding), stored_size)
+
+
+def mark_blob_stored(table, user_id, sha256, stored_size):
+    """Marca el objeto del blob como subido, con su tamaño en S3"""
+    table.update_item(
+        Key={'user_id': user_id, 'document_id': blob_item_id(sha256)},
+        UpdateExpression='SET #stored = :stored, stored_size = :stored_size',
+        ConditionExpression='attribute_exists(ref_count)',
+        ExpressionAttributeNames={'#stored': 'stored'},  # palabra reservada
+        ExpressionAttributeValues={':stored': True, ':stored_size': stored_size}
+    )
+
+
+def release_blob(table, s3_client, s3_bucket, user_id, sha256):
+    """
+    Resta una referencia. Cuando no quedan referencias se elimina el objeto
+    de S3 y el item del blob. Los errores se registran y no se propagan: en el
+    peor caso queda un blob sin referencias.
+    """
+    key = {'user_id': user_id, 'document_id': blob_item_id(sha256)}
+    try:
+        with non_idempotent():
+            response = table.update_item(
+                Key=key,
+                UpdateExpression='ADD ref_count :minus_one',
+                ConditionExpression='ref_count > :zero',
+                ExpressionAttributeValues={':minus_one': -1, ':zero': 0},
+                ReturnValues='UPDATED_NEW'
+            )
+        if response['Attributes']['ref_count'] > 0:
+            return
+
+        # Sin referencias: bloquear nuevas reutilizaciones antes de borrar
+        table.update_item(
+            Key=key,
+            UpdateExpression='SET releasing = :releasing',
+            ConditionExpression='ref_count = :zero',
+            ExpressionAttributeValues={':releasing': True, ':zero': 0}
+        )
+        s3_client.delete_object(Bucket=s3_bucket, Key=build_blob_s3_key(user_id, sha256))
+        table.delete_item(Key=key)
+    except ClientError as e:
+        # ConditionalCheckFailed: otra subida reutilizó el blob entretanto
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            logger.error("Failed to release blob %s of user %s: %s", sha256, user_id, e)
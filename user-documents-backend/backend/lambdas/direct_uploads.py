@@ -0,0 +1,399 @@
+"""
+Subidas directas a S3 en dos pasos.
+
+1. POST /documents con "upload_mode": "presigned" crea un registro de metadatos
+   pendiente y devuelve un destino prefirmado (PUT o POST) para subir el archivo
+   directamente a S3, sin pasar los bytes por la Lambda.
+2. El documento se finaliza (tamaño, ETag/checksum, fecha) con una llamada
+   explícita a POST /documents/{user_id}/{document_id}/complete o mediante el
+   evento ObjectCreated de S3.
+
+Los documentos pendientes no tienen type_date, así que no aparecen como
+"último documento" hasta que se finalizan.
+
+El tamaño de las subidas de un solo objeto está limitado como en las inline
+(max_document_bytes): el PUT prefirmado firma el Content-Length del file_size
+declarado y el POST incluye una condición content-length-range. Un objeto
+mayor que el límite se elimina al finalizar, junto con su registro pendiente.
+"""
+import logging
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import unquote_plus
+
+from botocore.exceptions import ClientError
+
+from . import metrics
+from .aws_clients import get_client, get_table
+from .config import get_settings
+from .http_utils import create_response, parse_json_body
+from .metadata_cache import invalidate_document
+from .multipart_uploads import complete_multipart_object, parse_declared_parts
+from .routing import route
+from .validation import max_document_bytes, size_limit_error
+from .schema import (
+    DEFAULT_CONTENT_TYPE,
+    STATUS_COMMITTED,
+    STATUS_PENDING,
+    TYPE_DATE_ATTRIBUTE,
+    TYPE_DATE_SEPARATOR,
+    build_s3_key,
+    build_type_date,
+    parse_s3_key
+)
+from .versions import publish_version
+
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_METHOD_PUT = 'PUT'
+UPLOAD_METHOD_POST = 'POST'
+UPLOAD_METHODS = (UPLOAD_METHOD_PUT, UPLOAD_METHOD_POST)
+
+# Errores de CompleteMultipartUpload causados por las partes enviadas por el cliente
+INVALID_PARTS_ERRORS = ('EntityTooSmall', 'InvalidPart', 'InvalidPartOrder')
+
+
+def create_upload_session(user_id, document_type, file_name, body):
+    """
+    Crea el registro pendiente y el destino prefirmado para subir el archivo
+    """
+    upload_method = str(body.get('upload_method', UPLOAD_METHOD_PUT)).upper()
+    if upload_method not in UPLOAD_METHODS:
+        return create_response(400, {'error': f'Invalid upload_method. Use one of: {", ".join(UPLOAD_METHODS)}'})
+
+    content_type = body.get('content_type', DEFAULT_CONTENT_TYPE)
+    checksum_sha256 = body.get('checksum_sha256')
+    if not isinstance(content_type, str) or (checksum_sha256 is not None and not isinstance(checksum_sha256, str)):
+        return create_response(400, {'error': 'content_type and checksum_sha256 must be strings'})
+    if checksum_sha256 is not None and upload_method != UPLOAD_METHOD_PUT:
+        return create_response(400, {'error': 'checksum_sha256 is only supported with upload_method PUT'})
+    # El PUT firma el tamaño declarado; el POST lo limita con su política
+    file_size = body.get('file_size')
+    if file_size is None and upload_method == UPLOAD_METHOD_PUT:
+        return create_response(400, {'error': 'file_size is required with upload_method PUT'})
+    if file_size is not None:
+        if not isinstance(file_size, int) or isinstance(file_size, bool) or file_size < 1:
+            return create_response(400, {'error': 'file_size must be a positive integer'})
+        error_message = size_limit_error(document_type, file_size)
+        if error_message:
+            return create_response(413, {'error': error_message})
+
+    settings = get_settings()
+    s3_client = get_client('s3')
+    table = get_table()
+
+    document_id = str(uuid.uuid4())
+    s3_bucket = settings.bucket_name
+    s3_key = build_s3_key(user_id, document_type, document_id, file_name)
+    expires_in = settings.presigned_upload_expires
+
+    try:
+        if upload_method == UPLOAD_METHOD_PUT:
+            params = {'Bucket': s3_bucket, 'Key': s3_key, 'ContentType': content_type, 'ContentLength': file_size}
+            headers = {'Content-Type': content_type, 'Content-Length': str(file_size)}
+            if checksum_sha256:
+                # S3 rechaza el PUT si el contenido no coincide con el checksum declarado
+                params['ChecksumSHA256'] = checksum_sha256
+                headers['x-amz-checksum-sha256'] = checksum_sha256
+            upload_target = {
+                'method': UPLOAD_METHOD_PUT,
+                'url': s3_client.generate_presigned_url('put_object', Params=params, ExpiresIn=expires_in),
+                'headers': headers
+            }
+        else:
+            presigned_post = s3_client.generate_presigned_post(
+                Bucket=s3_bucket,
+                Key=s3_key,
+                Fields={'Content-Type': content_type},
+                Conditions=[
+                    {'Content-Type': content_type},
+                    ['content-length-range', 1, file_size or max_document_bytes(document_type)]
+                ],
+                ExpiresIn=expires_in
+            )
+            upload_target = {
+                'method': UPLOAD_METHOD_POST,
+                'url': presigned_post['url'],
+                'fields': presigned_post['fields']
+            }
+    except ClientError as e:
+        logger.error("S3 presign error: %s", e)
+        return create_response(500, {'error': 'Failed to generate upload URL'})
+
+    pending_item = {
+        'document_id': document_id,
+        'user_id': user_id,
+        'document_type': document_type,
+        'file_name': file_name,
+        's3_bucket': s3_bucket,
+        's3_key': s3_key,
+        'content_type': content_type,
+        'status': STATUS_PENDING,
+        'created_at': datetime.utcnow().isoformat(),
+        # TTL de DynamoDB: los registros pendientes abandonados se eliminan solos
+        'expires_at': int(time.time()) + settings.pending_upload_ttl
+    }
+    if checksum_sha256:
+        pending_item['checksum_sha256'] = checksum_sha256
+
+    try:
+        table.put_item(Item=pending_item)
+        logger.info("Pending upload created for document: %s", document_id)
+    except ClientError as e:
+        logger.error("DynamoDB put error: %s", e)
+        return create_response(500, {'error': 'Failed to save document metadata'})
+
+    upload_target['expires_in'] = expires_in
+    response_data = {
+        'message': 'Upload session created',
+        'document_id': document_id,
+        'user_id': user_id,
+        'document_type': document_type,
+        'file_name': file_name,
+        'status': STATUS_PENDING,
+        'upload': upload_target
+    }
+    return create_response(201, response_data)
+
+
+def finalize_document(table, item, file_size, etag, checksum_sha256=None):
+    """
+    Marca un documento pendiente como confirmado con su tamaño y checksum.
+    Devuelve el item actualizado, o None si otro proceso ya lo finalizó.
+    """
+    upload_date = datetime.utcnow().isoformat()
+    update_expression = (
+        'SET #status = :committed, file_size = :file_size, etag = :etag, '
+        'upload_date = :upload_date, #type_date = :type_date'
+    )
+    values = {
+        ':committed': STATUS_COMMITTED,
+        ':pending': STATUS_PENDING,
+        ':file_size': file_size,
+        ':etag': etag,
+        ':upload_date': upload_date,
+        ':type_date': build_type_date(item['document_type'], upload_date)
+    }
+    if checksum_sha256:
+        update_expression += ', checksum_sha256 = :checksum_sha256'
+        values[':checksum_sha256'] = checksum_sha256
+
+    try:
+        response = table.update_item(
+            Key={'user_id': item['user_id'], 'document_id': item['document_id']},
+            UpdateExpression=update_expression + ' REMOVE expires_at',
+            ConditionExpression='#status = :pending',
+            ExpressionAttributeNames={'#status': 'status', '#type_date': TYPE_DATE_ATTRIBUTE},
+            ExpressionAttributeValues=values,
+            ReturnValues='ALL_NEW'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        raise
+
+    logger.info("Document finalized: %s", item['document_id'])
+    publish_version(table, response['Attributes'])
+    invalidate_document(item['user_id'], item['document_type'])
+    return response['Attributes']
+
+
+def discard_oversized(table, s3_client, item):
+    """
+    Elimina el objeto subido de un documento pendiente que excede el límite
+    de su tipo, y el registro pendiente
+    """
+    logger.warning("Discarding oversized upload of document %s", item['document_id'])
+    metrics.put_metric('OversizedUploads', 1)
+    s3_client.delete_object(Bucket=item['s3_bucket'], Key=item['s3_key'])
+    try:
+        table.delete_item(
+            Key={'user_id': item['user_id'], 'document_id': item['document_id']},
+            ConditionExpression='#status = :pending',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':pending': STATUS_PENDING}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+
+def _completed_object(s3_client, item):
+    """
+    (file_size, etag) del objeto de un multipart upload que S3 ya completó.
+    Devuelve ((file_size, etag), None) o (None, respuesta de error).
+    """
+    try:
+        head = s3_client.head_object(Bucket=item['s3_bucket'], Key=item['s3_key'])
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            # El upload se abortó (o caducó por la regla de ciclo de vida)
+            return None, create_response(409, {'error': 'Multipart upload no longer exists'})
+        logger.error("S3 head error: %s", e)
+        return None, create_response(500, {'error': 'Failed to verify uploaded file'})
+    return (head['ContentLength'], head['ETag'].strip('"')), None
+
+
+@route('POST', '/documents/{user_id}/{document_id}/complete')
+@metrics.route('complete_upload')
+def complete_upload(event, user_id, document_id):
+    """
+    Finaliza una subida directa o multipart
+    (POST /documents/{user_id}/{document_id}/complete)
+    """
+    # Los items LATEST#, BLOB# e IDEMPOTENCY# no son sesiones de subida
+    if TYPE_DATE_SEPARATOR in document_id:
+        return create_response(404, {'error': 'Upload session not found'})
+    try:
+        table = get_table()
+        s3_client = get_client('s3')
+
+        try:
+            item = table.get_item(Key={'user_id': user_id, 'document_id': document_id}).get('Item')
+        except ClientError as e:
+            logger.error("DynamoDB get error: %s", e)
+            return create_response(500, {'error': 'Failed to query document metadata'})
+
+        if not item or 'status' not in item:
+            return create_response(404, {'error': 'Upload session not found'})
+
+        if item['status'] == STATUS_PENDING and 'multipart_upload_id' in item:
+            # Partes y tamaño declarados por el cliente (cuerpo opcional)
+            declared = (None, None)
+            if event.get('body'):
+                body, error_response = parse_json_body(event)
+                if error_response:
+                    return error_response
+                declared, error_message = parse_declared_parts(body)
+                if error_message:
+                    return create_response(400, {'error': error_message})
+
+            completed, error_response = None, None
+            try:
+                completed, error_response = complete_multipart_object(s3_client, item, *declared)
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                if code in INVALID_PARTS_ERRORS:
+                    return create_response(400, {'error': f'Invalid multipart upload parts: {code}'})
+                if code != 'NoSuchUpload':
+                    logger.error("S3 multipart complete error: %s", e)
+                    return create_response(500, {'error': 'Failed to complete multipart upload'})
+            if error_response:
+                return error_response
+            if completed is None:
+                # NoSuchUpload: un intento anterior completó el objeto pero no
+                # llegó a finalizar los metadatos
+                completed, error_response = _completed_object(s3_client, item)
+                if error_response:
+                    return error_response
+
+            file_size, etag = completed
+            try:
+                finalized = finalize_document(table, item, file_size, etag)
+            except ClientError as e:
+                logger.error("DynamoDB update error: %s", e)
+                return create_response(500, {'error': 'Failed to save document metadata'})
+
+            if finalized is None:
+                finalized = table.get_item(Key={'user_id': user_id, 'document_id': document_id}, ConsistentRead=True)['Item']
+            item = finalized
+
+        elif item['status'] == STATUS_PENDING:
+            try:
+                head_kwargs = {'Bucket': item['s3_bucket'], 'Key': item['s3_key']}
+                if item.get('checksum_sha256'):
+                    head_kwargs['ChecksumMode'] = 'ENABLED'
+                head = s3_client.head_object(**head_kwargs)
+            except ClientError as e:
+                if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                    return create_response(409, {'error': 'File has not been uploaded to S3 yet'})
+                logger.error("S3 head error: %s", e)
+                return create_response(500, {'error': 'Failed to verify uploaded file'})
+
+            error_message = size_limit_error(item['document_type'], head['ContentLength'])
+            if error_message:
+                try:
+                    discard_oversized(table, s3_client, item)
+                except ClientError as e:
+                    logger.error("Failed to discard oversized upload %s: %s", document_id, e)
+                return create_response(413, {'error': error_message})
+
+            try:
+                finalized = finalize_document(
+                    table,
+                    item,
+                    head['ContentLength'],
+                    head['ETag'].strip('"'),
+                    head.get('ChecksumSHA256') or item.get('checksum_sha256')
+                )
+            except ClientError as e:
+                logger.error("DynamoDB update error: %s", e)
+                return create_response(500, {'error': 'Failed to save document metadata'})
+
+            if finalized is None:
+                # El evento de S3 se adelantó: leer el estado definitivo
+                finalized = table.get_item(Key={'user_id': user_id, 'document_id': document_id}, ConsistentRead=True)['Item']
+            item = finalized
+
+        response_data = {
+            'message': 'Document upload completed',
+            'document_id': document_id,
+            'user_id': user_id,
+            'document_type': item['document_type'],
+            'file_name': item['file_name'],
+            'file_size': int(item['file_size']),
+            'upload_date': item['upload_date'],
+            'status': item['status']
+        }
+        return create_response(200, response_data)
+
+    except Exception as e:
+        logger.error("Unexpected error in complete_upload: %s", e)
+        return create_response(500, {'error': 'Internal server error'})
+
+
+def is_s3_event(event):
+    """Indica si el evento proviene de una notificación de S3"""
+    records = event.get('Records')
+    return bool(records) and records[0].get('eventSource') == 'aws:s3'
+
+
+@metrics.route('handle_s3_event')
+def handle_s3_event(event):
+    """
+    Finaliza los documentos pendientes a partir de eventos ObjectCreated de S3.
+
+    Los errores de AWS se propagan para que Lambda reintente el evento.
+    """
+    table = get_table()
+    s3_client = get_client('s3')
+    finalized = 0
+
+    for record in event['Records']:
+        if not record.get('eventName', '').startswith('ObjectCreated'):
+            continue
+
+        s3_object = record['s3']['object']
+        s3_key = unquote_plus(s3_object['key'])
+        parsed = parse_s3_key(s3_key)
+        if parsed is None:
+            logger.info("Ignoring S3 object outside the documents layout: %s", s3_key)
+            continue
+
+        user_id, _, document_id = parsed
+        item = table.get_item(Key={'user_id': user_id, 'document_id': document_id}).get('Item')
+        if not item or item.get('status') != STATUS_PENDING or item.get('s3_key') != s3_key:
+            continue
+
+        # Las subidas multipart no tienen el límite de las de un solo objeto
+        if 'multipart_upload_id' not in item and size_limit_error(item['document_type'], s3_object['size']):
+            discard_oversized(table, s3_client, item)
+            continue
+
+        if finalize_document(table, item, s3_object['size'], s3_object.get('eTag', '').strip('"'),
+                             item.get('checksum_sha256')):
+            finalized += 1
+
+    return {'finalized': finalized}
@@ -0,0 +1,192 @@
+"""
+Listado paginado de los documentos de un usuario (GET /documents/{user_id}).
+
+Solo devuelve metadatos (ProjectionExpression, sin acceso a S3). Los filtros
+se resuelven con la condición de clave de un índice, sin recorrer la partición:
+
+- sin document_type: UserDocumentUploadDateIndex, rango sobre upload_date
+- con document_type: UserDocumentTypeDateIndex, rango sobre "{tipo}#{fecha}"
+
+Query string: limit, next_token, document_type, from, to (fechas ISO 8601,
+ambas inclusivas; "to=2024-05-31" incluye todo ese día).
+
+GET /documents/{user_id}/{document_type}/versions es el mismo listado para un
+tipo: su historial de versiones.
+"""
+import base64
+import binascii
+import json
+import logging
+import re
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from . import metrics
+from .aws_clients import get_table
+from .http_utils import create_response, get_query_param
+from .models import DocumentSummary
+from .routing import route
+from .schema import (
+    LIST_ATTRIBUTES,
+    TYPE_DATE_ATTRIBUTE,
+    TYPE_DATE_INDEX,
+    TYPE_DATE_SEPARATOR,
+    UPLOAD_DATE_ATTRIBUTE,
+    UPLOAD_DATE_INDEX,
+    type_date_prefix
+)
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+# Prefijo de fecha ISO 8601 (año, mes, día y hora opcionales)
+_DATE_PATTERN = re.compile(r'^\d{4}(-\d{2}(-\d{2}(T[\d:.]+)?)?)?$')
+# Mayor que cualquier carácter de una fecha ISO: cierra el rango de "to"
+_DATE_UPPER_BOUND = '~'
+
+# Atributos de clave del LastEvaluatedKey de cada índice
+_INDEX_KEYS = {
+    TYPE_DATE_INDEX: {'user_id', 'document_id', TYPE_DATE_ATTRIBUTE},
+    UPLOAD_DATE_INDEX: {'user_id', 'document_id', UPLOAD_DATE_ATTRIBUTE}
+}
+
+
+def encode_page_token(index_name, last_evaluated_key):
+    """Token opaco de continuación a partir del LastEvaluatedKey"""
+    payload = json.dumps({'index': index_name, 'key': last_evaluated_key}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_page_token(token, index_name, user_id):
+    """
+    Recupera el ExclusiveStartKey de un token. Devuelve None si el token no
+    es válido o corresponde a otra consulta (otro índice u otro usuario).
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, ValueError, UnicodeError):
+        return None
+
+    if not isinstance(payload, dict) or payload.get('index') != index_name:
+        return None
+    key = payload.get('key')
+    if not isinstance(key, dict) or set(key) != _INDEX_KEYS[index_name]:
+        return None
+    if not all(isinstance(value, str) for value in key.values()) or key['user_id'] != user_id:
+        return None
+    return key
+
+
+def _parse_limit(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return None
+    return limit if 1 <= limit <= MAX_PAGE_SIZE else None
+
+
+def _key_condition(user_id, document_type, date_from, date_to):
+    """Índice y condición de clave para los filtros pedidos"""
+    condition = Key('user_id').eq(user_id)
+    if document_type:
+        prefix = type_date_prefix(document_type)
+        if date_from or date_to:
+            lower = prefix + (date_from or '')
+            upper = prefix + (date_to or '') + _DATE_UPPER_BOUND
+            return TYPE_DATE_INDEX, condition & Key(TYPE_DATE_ATTRIBUTE).between(lower, upper)
+        return TYPE_DATE_INDEX, condition & Key(TYPE_DATE_ATTRIBUTE).begins_with(prefix)
+
+    sort_key = Key(UPLOAD_DATE_ATTRIBUTE)
+    if date_from and date_to:
+        condition &= sort_key.between(date_from, date_to + _DATE_UPPER_BOUND)
+    elif date_from:
+        condition &= sort_key.gte(date_from)
+    elif date_to:
+        condition &= sort_key.lte(date_to + _DATE_UPPER_BOUND)
+    return UPLOAD_DATE_INDEX, condition
+
+
+def _query_documents(event, user_id, document_type):
+    """Consulta paginada de metadatos con los filtros de la query string"""
+    limit = _parse_limit(get_query_param(event, 'limit'))
+    if limit is None:
+        return create_response(400, {'error': f'limit must be an integer between 1 and {MAX_PAGE_SIZE}'})
+
+    if document_type is not None and (not document_type or TYPE_DATE_SEPARATOR in document_type):
+        return create_response(400, {'error': f'document_type must be non-empty and not contain "{TYPE_DATE_SEPARATOR}"'})
+
+    date_from = get_query_param(event, 'from')
+    date_to = get_query_param(event, 'to')
+    for name, value in (('from', date_from), ('to', date_to)):
+        if value is not None and not _DATE_PATTERN.match(value):
+            return create_response(400, {'error': f'{name} must be an ISO 8601 date (YYYY-MM-DD)'})
+    if date_from and date_to and date_from > date_to:
+        return create_response(400, {'error': 'from must not be later than to'})
+
+    index_name, key_condition = _key_condition(user_id, document_type, date_from, date_to)
+    query_kwargs = {
+        'IndexName': index_name,
+        'KeyConditionExpression': key_condition,
+        'ProjectionExpression': ', '.join(LIST_ATTRIBUTES),
+        'ScanIndexForward': False,  # Más reciente primero
+        'Limit': limit
+    }
+
+    next_token = get_query_param(event, 'next_token')
+    if next_token:
+        start_key = decode_page_token(next_token, index_name, user_id)
+        if start_key is None:
+            return create_response(400, {'error': 'Invalid next_token'})
+        query_kwargs['ExclusiveStartKey'] = start_key
+
+    try:
+        response = get_table().query(**query_kwargs)
+    except ClientError as e:
+        logger.error("DynamoDB query error: %s", e)
+        return create_response(500, {'error': 'Failed to list documents'})
+
+    documents = [DocumentSummary.from_item(item) for item in response.get('Items', [])]
+    last_key = response.get('LastEvaluatedKey')
+    response_data = {
+        'user_id': user_id,
+        'documents': documents,
+        'count': len(documents),
+        'next_token': encode_page_token(index_name, last_key) if last_key else None
+    }
+    return create_response(200, response_data)
+
+
+@route('GET', '/documents/{user_id}')
+@metrics.route('list_documents')
+def list_documents(event, user_id):
+    """
+    Lista los metadatos de los documentos de un usuario, del más reciente al
+    más antiguo (GET /documents/{user_id})
+    """
+    try:
+        return _query_documents(event, user_id, get_query_param(event, 'document_type'))
+    except Exception as e:
+        logger.error("Unexpected error in list_documents: %s", e)
+        return create_response(500, {'error': 'Internal server error'})
+
+
+@route('GET', '/documents/{user_id}/{document_type}/versions')
+@metrics.route('list_document_versions')
+def list_document_versions(event, user_id, document_type):
+    """
+    Historial de versiones de un tipo de documento, de la más reciente a la
+    más antigua (GET /documents/{user_id}/{document_type}/versions). Admite
+    los mismos parámetros que el listado salvo document_type.
+    """
+    try:
+        return _query_documents(event, user_id, document_type)
+    except Exception as e:
+        logger.error("Unexpected error in list_document_versions: %s", e)
+        return create_response(500, {'error': 'Internal server error'})
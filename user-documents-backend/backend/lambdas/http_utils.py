@@ -0,0 +1,270 @@
+"""
+Utilidades HTTP compartidas por los handlers (eventos de API Gateway)
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from .models import json_default
+
+
+def get_header(event, name):
+    """Obtener un header de la request sin distinguir mayúsculas/minúsculas"""
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def get_query_param(event, name):
+    """Obtener un parámetro de la query string"""
+    params = event.get('queryStringParameters') or {}
+    return params.get(name)
+
+
+def parse_json_body(event):
+    """
+    Parsea el cuerpo JSON de la request.
+    Devuelve (body, None) o (None, respuesta de error).
+    """
+    if 'body' not in event or event['body'] is None:
+        return None, create_response(400, {'error': 'Missing request body'})
+
+    body = event['body']
+    if isinstance(body, str):
+        try:
+            body = json.loads(body)
+        except json.JSONDecodeError:
+            return None, create_response(400, {'error': 'Invalid JSON in request body'})
+
+    if not isinstance(body, dict):
+        return None, create_response(400, {'error': 'Request body must be a JSON object'})
+
+    return body, None
+
+
+def content_disposition(file_name):
+    """Header Content-Disposition para descargar el archivo con su nombre original"""
+    safe_name = file_name.replace('"', '').replace('\\', '')
+    return f'attachment; filename="{safe_name}"'
+
+
+def content_etag(data):
+    """
+    ETag de un objeto subido en una sola operación (MD5 en hex, como S3) y el
+    Content-MD5 en base64 para que S3 verifique la integridad del cuerpo
+    """
+    digest = hashlib.md5(data)
+    return digest.hexdigest(), base64.b64encode(digest.digest()).decode('ascii')
+
+
+def _parse_timestamp(timestamp):
+    """Fecha ISO 8601 de los metadatos (UTC sin zona) a datetime con zona"""
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def validator_headers(etag, upload_date):
+    """
+    Headers ETag/Last-Modified de un documento. El cliente debe revalidar
+    (no-cache) pero puede reutilizar su copia si recibe un 304.
+    """
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': 'private, no-cache',
+        'Access-Control-Expose-Headers': 'ETag, Last-Modified, Content-Range, Accept-Ranges'
+    }
+    modified = _parse_timestamp(upload_date)
+    if modified is not None:
+        headers['Last-Modified'] = format_datetime(modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def _etag_matches(if_none_match, etag):
+    """Comparación débil de If-None-Match (lista de ETags o "*")"""
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
+
+
+def is_not_modified(event, etag, upload_date):
+    """
+    Evalúa If-None-Match / If-Modified-Since. If-None-Match tiene prioridad
+    y, si está presente, If-Modified-Since se ignora (RFC 9110).
+    """
+    if_none_match = get_header(event, 'If-None-Match')
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = get_header(event, 'If-Modified-Since')
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    modified = _parse_timestamp(upload_date)
+    # Last-Modified tiene resolución de segundos
+    return modified is not None and modified.replace(microsecond=0) <= since
+
+
+def _parse_non_negative(value):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number >= 0 else None
+
+
+def _range_from_header(range_header, file_size):
+    """
+    Rango (start, end) de un header "bytes=a-b", "bytes=a-" o "bytes=-n".
+    Devuelve None si la sintaxis no se soporta (p. ej. varios rangos).
+    """
+    unit, _, spec = range_header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec or '-' not in spec:
+        return None
+    first, _, last = (part.strip() for part in spec.partition('-'))
+    if not first:
+        suffix = _parse_non_negative(last)
+        if not suffix:
+            return None
+        return max(file_size - suffix, 0), file_size - 1
+    start = _parse_non_negative(first)
+    if start is None:
+        return None
+    if not last:
+        return start, file_size - 1
+    end = _parse_non_negative(last)
+    if end is None or end < start:
+        return None
+    return start, end
+
+
+def _if_range_matches(if_range, etag, upload_date):
+    """If-Range: el rango solo se aplica si el cliente tiene la versión actual"""
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        return if_range.strip('"') == etag
+    modified = _parse_timestamp(upload_date)
+    try:
+        since = parsedate_to_datetime(if_range)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return modified is not None and modified.replace(microsecond=0) == since
+
+
+def resolve_byte_range(event, file_size, etag, upload_date, max_bytes):
+    """
+    Rango de bytes pedido con el header Range o con los parámetros
+    offset/length (el header tiene prioridad).
+    Devuelve ((start, end), None), (None, None) si se sirve el documento
+    completo, o (None, respuesta de error). Los rangos se limitan a max_bytes:
+    el cliente sabe por Content-Range qué parte recibió.
+    """
+    range_header = get_header(event, 'Range')
+    if range_header is not None:
+        if_range = get_header(event, 'If-Range')
+        if if_range is not None and not _if_range_matches(if_range, etag, upload_date):
+            return None, None
+        byte_range = _range_from_header(range_header, file_size)
+        if byte_range is None:
+            return None, None
+    else:
+        offset = get_query_param(event, 'offset')
+        length = get_query_param(event, 'length')
+        if offset is None and length is None:
+            return None, None
+        start = _parse_non_negative(offset) if offset is not None else 0
+        size = _parse_non_negative(length) if length is not None else None
+        if start is None or (length is not None and not size):
+            return None, create_response(400, {'error': 'offset must be a non-negative integer and length a positive integer'})
+        byte_range = (start, start + size - 1 if size else file_size - 1)
+
+    start, end = byte_range
+    if start >= file_size:
+        return None, create_response(416, {'error': 'Requested range not satisfiable'},
+                                     {'Content-Range': f'bytes */{file_size}'})
+    return (start, min(end, file_size - 1, start + max_bytes - 1)), None
+
+
+def create_response(status_code, body, headers=None):
+    """
+    Crea una respuesta HTTP estándar
+    """
+    response_headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+    if headers:
+        response_headers.update(headers)
+    return {
+        'statusCode': status_code,
+        'headers': response_headers,
+        'body': json.dumps(body, default=json_default)
+    }
+
+
+def document_headers(document_metadata):
+    """Metadatos del documento como headers de una respuesta binaria"""
+    return {
+        'Content-Disposition': content_disposition(document_metadata.file_name),
+        'X-Document-Id': document_metadata.document_id,
+        'X-Document-Type': document_metadata.document_type,
+        'X-Upload-Date': document_metadata.upload_date,
+        'X-File-Size': str(document_metadata.file_size),
+        'Access-Control-Expose-Headers': (
+            'ETag, Last-Modified, Content-Range, Accept-Ranges, Content-Disposition, '
+            'X-Document-Id, X-Document-Type, X-Upload-Date, X-File-Size'
+        )
+    }
+
+
+def binary_response(status_code, body_base64, content_type, headers=None):
+    """
+    Respuesta con el archivo como cuerpo. API Gateway decodifica el base64
+    (isBase64Encoded); en una REST API el tipo debe estar en binaryMediaTypes
+    (p. ej. */*).
+    """
+    response_headers = {
+        'Content-Type': content_type,
+        'Access-Control-Allow-Origin': '*'
+    }
+    if headers:
+        response_headers.update(headers)
+    return {
+        'statusCode': status_code,
+        'headers': response_headers,
+        'body': body_base64,
+        'isBase64Encoded': True
+    }
+
+
+def not_modified_response(headers):
+    """Respuesta 304 sin cuerpo con los validadores del documento"""
+    response_headers = {'Access-Control-Allow-Origin': '*'}
+    response_headers.update(headers)
+    return {
+        'statusCode': 304,
+        'headers': response_headers,
+        'body': ''
+    }
@@ -0,0 +1,243 @@
+"""
+Idempotency-Key para POST /documents.
+
+Un cliente que reintenta una subida (por ejemplo tras un timeout) envía la
+misma Idempotency-Key: el reintento recibe la respuesta original sin volver a
+subir el archivo a S3 ni crear otro documento.
+
+Cada clave tiene un registro en UserDocuments (document_id
+"IDEMPOTENCY#{clave}", sin type_date ni upload_date, así que no aparece en los
+índices) con:
+
+- fingerprint: sha256 del cuerpo de la request; reutilizar la clave con otro
+  cuerpo es un error (422)
+- status: in_progress mientras se procesa la primera request, completed
+  cuando se guarda su respuesta
+- lock_token: identifica a la request que reclamó la clave; si la escritura
+  condicional se aplicó pero su respuesta se perdió (5xx, timeout), el
+  reintento de la política de resiliencia reconoce su propio registro
+- response: código, headers y cuerpo de la respuesta original
+- expires_at: TTL de DynamoDB (IDEMPOTENCY_TTL)
+
+La primera request reclama la clave con una escritura condicional, así que las
+duplicadas concurrentes reciben 409 hasta que termina (o hasta que pasa
+IDEMPOTENCY_LOCK_TIMEOUT, si la primera se abandonó). Las respuestas 5xx no se
+guardan: el registro se elimina y el cliente puede reintentar.
+
+Las respuestas completadas se guardan además en una caché del contenedor: un
+reintento que llega al mismo contenedor no lee DynamoDB.
+"""
+import hashlib
+import logging
+import threading
+import time
+import uuid
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+from . import metrics
+from .config import get_settings
+from .http_utils import create_response, get_header
+from .metadata_cache import TTLCache
+from .schema import idempotency_item_id
+
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# Caracteres del cuerpo codificados por bloque al calcular el fingerprint
+FINGERPRINT_CHUNK_CHARS = 64 * 1024
+
+STATUS_IN_PROGRESS = 'in_progress'
+STATUS_COMPLETED = 'completed'
+
+_deserializer = TypeDeserializer()
+
+
+def get_idempotency_key(event):
+    """Devuelve (clave, None), (None, None) si no hay header o (None, respuesta de error)"""
+    key = get_header(event, IDEMPOTENCY_HEADER)
+    if key is None:
+        return None, None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        return None, create_response(400, {
+            'error': f'{IDEMPOTENCY_HEADER} must be between 1 and {MAX_KEY_LENGTH} printable characters'
+        })
+    return key, None
+
+
+def request_fingerprint(event):
+    """sha256 del cuerpo de la request, por bloques para no copiar el cuerpo entero"""
+    body = event.get('body') or ''
+    hasher = hashlib.sha256()
+    if isinstance(body, str):
+        # La codificación UTF-8 por bloques de caracteres es la del cuerpo entero
+        for start in range(0, len(body), FINGERPRINT_CHUNK_CHARS):
+            hasher.update(body[start:start + FINGERPRINT_CHUNK_CHARS].encode('utf-8'))
+    else:
+        hasher.update(body)
+    return hasher.hexdigest()
+
+
+def _item_key(user_id, key):
+    return {'user_id': user_id, 'document_id': idempotency_item_id(key)}
+
+
+def claim(table, user_id, key, fingerprint):
+    """
+    Reclama la clave para esta request. Devuelve None si la request debe
+    procesarse, o el registro existente (completado o en curso).
+    """
+    settings = get_settings()
+    now = int(time.time())
+    lock_token = uuid.uuid4().hex
+    item = _item_key(user_id, key)
+    item.update({
+        'status': STATUS_IN_PROGRESS,
+        'fingerprint': fingerprint,
+        'lock_token': lock_token,
+        'locked_until': now + settings.idempotency_lock_timeout,
+        # TTL de DynamoDB: el borrado no es inmediato, de ahí la condición
+        # sobre expires_at
+        'expires_at': now + settings.idempotency_ttl
+    })
+    try:
+        table.put_item(
+            Item=item,
+            ConditionExpression=(
+                'attribute_not_exists(document_id) OR expires_at < :now'
+                ' OR (#status = :in_progress AND locked_until < :now AND fingerprint = :fingerprint)'
+            ),
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':now': now,
+                ':in_progress': STATUS_IN_PROGRESS,
+                ':fingerprint': fingerprint
+            },
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+        return None
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        # El registro existente viene en formato de bajo nivel
+        existing = e.response.get('Item') or {}
+        record = {name: _deserializer.deserialize(value) for name, value in existing.items()}
+        if record.get('lock_token') == lock_token:
+            # Un intento anterior de esta misma llamada ya reclamó la clave
+            return None
+        return record
+
+
+def complete(table, user_id, key, response):
+    """Guarda la respuesta de la request; con un 5xx libera la clave"""
+    try:
+        if response['statusCode'] >= 500:
+            table.delete_item(Key=_item_key(user_id, key))
+            return
+        table.update_item(
+            Key=_item_key(user_id, key),
+            UpdateExpression='SET #status = :completed, #response = :response REMOVE locked_until, lock_token',
+            ExpressionAttributeNames={'#status': 'status', '#response': 'response'},
+            ExpressionAttributeValues={':completed': STATUS_COMPLETED, ':response': stored_response(response)}
+        )
+    except ClientError as e:
+        # Un reintento recibirá 409 hasta IDEMPOTENCY_LOCK_TIMEOUT
+        logger.error("Failed to record idempotent response for key %s: %s", key, e)
+        metrics.put_metric('IdempotencyErrors', 1)
+
+
+def stored_response(response):
+    """Partes de la respuesta que se guardan para repetirla"""
+    return {
+        'statusCode': response['statusCode'],
+        'headers': dict(response.get('headers') or {}),
+        'body': response.get('body') or ''
+    }
+
+
+def replay_response(stored):
+    """Respuesta original de una clave completada"""
+    headers = dict(stored.get('headers') or {})
+    headers[REPLAYED_HEADER] = 'true'
+    return {'statusCode': int(stored['statusCode']), 'headers': headers, 'body': stored['body']}
+
+
+def _existing_response(record, fingerprint):
+    """Respuesta para una clave que ya tiene registro"""
+    if record.get('fingerprint') != fingerprint:
+        metrics.put_metric('IdempotencyConflict', 1)
+        return create_response(422, {'error': f'{IDEMPOTENCY_HEADER} was already used with a different request'})
+    if record.get('status') == STATUS_COMPLETED:
+        metrics.put_metric('IdempotentReplay', 1)
+        return replay_response(record['response'])
+    metrics.put_metric('IdempotencyConflict', 1)
+    return create_response(409, {'error': f'A request with this {IDEMPOTENCY_HEADER} is still in progress'},
+                           {'Retry-After': '1'})
+
+
+def run_idempotent(event, table, user_id, key, handler):
+    """
+    Ejecuta handler() una sola vez por (user_id, clave): los reintentos
+    reciben la respuesta original
+    """
+    fingerprint = request_fingerprint(event)
+    cache = get_response_cache()
+    cache_key = (user_id, key)
+    cached, entry = cache.get(cache_key)
+    if cached:
+        return _existing_response(entry, fingerprint)
+
+    try:
+        record = claim(table, user_id, key, fingerprint)
+    except ClientError as e:
+        logger.error("DynamoDB idempotency error: %s", e)
+        return create_response(500, {'error': 'Failed to check idempotency key'})
+    if record is not None:
+        if record.get('status') == STATUS_COMPLETED:
+            cache.put(cache_key, record)
+        return _existing_response(record, fingerprint)
+
+    try:
+        response = handler()
+    except Exception:
+        complete(table, user_id, key, {'statusCode': 500})
+        raise
+    complete(table, user_id, key, response)
+    if response['statusCode'] < 500:
+        cache.put(cache_key, {
+            'status': STATUS_COMPLETED,
+            'fingerprint': fingerprint,
+            'response': stored_response(response)
+        })
+    return response
+
+
+_lock = threading.Lock()
+_cache = None
+
+
+def get_response_cache():
+    """Caché de respuestas completadas del contenedor (lazy y thread-safe)"""
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                settings = get_settings()
+                _cache = TTLCache(
+                    max_entries=settings.idempotency_cache_max_entries,
+                    ttl=settings.idempotency_cache_ttl,
+                    negative_ttl=0
+                )
+    return _cache
+
+
+def reset_response_cache():
+    """Descartar la caché (usado en pruebas)"""
+    global _cache
+    with _lock:
+        _cache = None
@@ -1,143 +1,220 @@
-import json
+import base64
 import logging
-import boto3
-import boto3.dynamodb.conditions
-from botocore.exceptions import ClientError
 import uuid
 from datetime import datetime
-from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+# Los módulos de handlers registran sus rutas en routing.router al importarse
+from . import batch_uploads, document_listing, metrics, resilience, storage_codec  # noqa: F401
+from .aws_clients import get_client, get_table
+from .concurrency import get_executor, submit, wait_all
+from .config import get_settings
+from .dedup import acquire_blob, mark_blob_stored, release_blob
+from .direct_uploads import create_upload_session, handle_s3_event, is_s3_event
+from .http_utils import (
+    binary_response,
+    content_disposition,
+    create_response,
+    document_headers,
+    get_header,
+    get_query_param,
+    is_not_modified,
+    not_modified_response,
+    resolve_byte_range,
+    validator_headers
+)
+from .idempotency import get_idempotency_key, run_idempotent
+from .metadata_cache import get_metadata_cache, invalidate_document
+from .models import DocumentMetadata
+from .multipart_uploads import create_multipart_session
+from .request_logging import RequestLog
+from .routing import route, router
+from .schema import (
+    DEFAULT_CONTENT_TYPE,
+    TYPE_DATE_ATTRIBUTE,
+    TYPE_DATE_SEPARATOR,
+    build_s3_key,
+    build_type_date
+)
+from .upload_stream import decode_base64_content, parse_upload_body
+from .validation import content_size_error, request_size_error, validate_document_fields
+from .versions import get_latest, get_version, publish_version
 
 
 # Configurar logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-def convert_decimals(obj):
-    """
-    Convierte objetos Decimal de DynamoDB a tipos de Python serializables
-    """
-    if isinstance(obj, list):
-        return [convert_decimals(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {key: convert_decimals(value) for key, value in obj.items()}
-    elif hasattr(obj, 'to_eng_string'):  # Es un objeto Decimal
-        return float(obj) if '.' in str(obj) else int(obj)
-    else:
-        return obj
-    
+
+# Modos de descarga de GET /documents/{user_id}/{document_type}
+DOWNLOAD_INLINE = 'inline'
+DOWNLOAD_URL = 'url'
+DOWNLOAD_BINARY = 'binary'
+DOWNLOAD_MODES = (DOWNLOAD_INLINE, DOWNLOAD_URL, DOWNLOAD_BINARY)
+
+# Modos de subida de POST /documents
+UPLOAD_INLINE = 'inline'
+UPLOAD_PRESIGNED = 'presigned'
+UPLOAD_MULTIPART = 'multipart'
+UPLOAD_MODES = (UPLOAD_INLINE, UPLOAD_PRESIGNED, UPLOAD_MULTIPART)
+
 def get_dynamodb_table():
-    """Obtener la tabla de DynamoDB (lazy initialization)"""
-    # Configurar región por defecto si no está establecida
-    import os
-    if 'AWS_DEFAULT_REGION' not in os.environ:
-        os.environ['AWS_DEFAULT_REGION'] = 'us-east-1'
-    
-    dynamodb = boto3.resource('dynamodb')
-    return dynamodb.Table('UserDocuments')
+    """Obtener la tabla de DynamoDB (compartida entre invocaciones)"""
+    return get_table()
 
 def get_s3_client():
-    """Obtener cliente de S3 (lazy initialization)"""
-    # Configurar región por defecto si no está establecida
-    import os
-    if 'AWS_DEFAULT_REGION' not in os.environ:
-        os.environ['AWS_DEFAULT_REGION'] = 'us-east-1'
-    
-    return boto3.client('s3')
+    """Obtener cliente de S3 (compartido entre invocaciones)"""
+    return get_client('s3')
+
+def initialize():
+    """
+    Inicialización que necesitan todas las requests: configuración, clientes
+    de AWS, handle de la tabla y pool de hilos. En Lambda se ejecuta en la fase
+    de init (una vez por contenedor, antes de la primera request); si falla,
+    cada recurso se vuelve a crear de forma lazy en la primera request.
+    """
+    try:
+        get_settings()
+        get_s3_client()
+        get_dynamodb_table()
+        get_executor()
+    except Exception as e:
+        logger.warning("Eager initialization failed, resources will be created on demand: %s", e)
 
 def lambda_handler(event, context):
     """
     Función principal que maneja las requests HTTP
     """
+    # Notificaciones de S3 (finalización de subidas directas): los errores se
+    # propagan para que Lambda reintente el evento
+    metrics_token = metrics.start_invocation()
+    # Plazo de las llamadas AWS de la invocación (ver resilience.py)
+    request_token = resilience.start_request(context)
     try:
-        logger.info(f"Event received: {json.dumps(event)}")
-        
-        http_method = event.get('httpMethod')
-        path = event.get('path')
+        if is_s3_event(event):
+            try:
+                return handle_s3_event(event)
+            finally:
+                metrics.finish_invocation(metrics_token, event)
         
-        if http_method == 'POST' and path == '/documents':
-            return upload_document(event)
-        elif http_method == 'GET' and path.startswith('/documents/'):
-            return get_document(event)
-        else:
-            return create_response(404, {'error': 'Route not found'})
-            
+        request_log = RequestLog(event, context)
+        request_log.received()
+        # Los 500 causados por throttling o por el circuito abierto se
+        # devuelven como 503 con Retry-After
+        response = resilience.overload_response(route_request(event))
+        request_log.completed(response)
+        metrics.finish_invocation(metrics_token, event, response)
+        return response
+    finally:
+        resilience.finish_request(request_token)
+
+def route_request(event):
+    """
+    Enruta la request HTTP al handler correspondiente (ver routing.py)
+    """
+    try:
+        return router.dispatch(event)
     except Exception as e:
-        logger.error(f"Error processing request: {str(e)}")
+        logger.exception("Error processing request: %s", e)
         return create_response(500, {'error': 'Internal server error'})
 
-def create_response(status_code, body):
+@route('POST', '/documents')
+@metrics.route('upload_document')
+def upload_document(event):
     """
-    Crea una respuesta HTTP estándar
+    Maneja la subida de documentos (POST /documents). Con el header
+    Idempotency-Key los reintentos no repiten la subida (ver idempotency.py)
     """
-    return {
-        'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'body': json.dumps(body)
-    }
+    try:
+        # Rechazar los cuerpos demasiado grandes antes de parsearlos
+        error_message = request_size_error(event)
+        if error_message:
+            return create_response(413, {'error': error_message})
+        
+        # Parsear el cuerpo de la request (file_content se decodifica después
+        # directamente desde el cuerpo, sin copiarlo)
+        parsed, error_response = parse_upload_body(event)
+        if error_response:
+            return error_response
+        body, file_content = parsed
+        
+        upload_mode = body.get('upload_mode', UPLOAD_INLINE)
+        if upload_mode not in UPLOAD_MODES:
+            return create_response(400, {'error': f'Invalid upload_mode. Use one of: {", ".join(UPLOAD_MODES)}'})
+        
+        # Validar campos (en los modos 'presigned' y 'multipart' el archivo va
+        # directo a S3)
+        fields, error_message = validate_document_fields(body, require_content=(upload_mode == UPLOAD_INLINE))
+        if error_message:
+            return create_response(400, {'error': error_message})
+        user_id, document_type, file_name = fields
+        
+        # Tamaño estimado del archivo antes de decodificarlo
+        if upload_mode == UPLOAD_INLINE:
+            error_message = content_size_error(document_type, file_content)
+            if error_message:
+                return create_response(413, {'error': error_message})
+        
+        # Con Idempotency-Key, un reintento devuelve la respuesta original
+        idempotency_key, error_response = get_idempotency_key(event)
+        if error_response:
+            return error_response
+        if idempotency_key is None:
+            return store_document(body, file_content, fields, upload_mode)
+        return run_idempotent(
+            event, get_dynamodb_table(), user_id, idempotency_key,
+            lambda: store_document(body, file_content, fields, upload_mode)
+        )
+        
+    except Exception as e:
+        logger.error("Unexpected error in upload_document: %s", e)
+        return create_response(500, {'error': 'Internal server error'})
 
-def upload_document(event):
+def store_document(body, file_content, fields, upload_mode):
     """
-    Maneja la subida de documentos (POST /documents)
+    Crea el documento de una subida ya validada: sesión de subida directa o
+    multipart, o contenido inline guardado en S3 con sus metadatos
     """
+    user_id, document_type, file_name = fields
+    
+    if upload_mode == UPLOAD_PRESIGNED:
+        return create_upload_session(user_id, document_type, file_name, body)
+    if upload_mode == UPLOAD_MULTIPART:
+        return create_multipart_session(user_id, document_type, file_name, body)
+    
+    # Generar ID único para el documento
+    document_id = str(uuid.uuid4())
+    s3_key = build_s3_key(user_id, document_type, document_id, file_name)
+    
+    # Decodificar el contenido del archivo (base64) por bloques, con el
+    # tamaño y los checksums calculados al vuelo
+    settings = get_settings()
+    with metrics.timer('Base64Decode'):
+        upload, error_message = decode_base64_content(
+            file_content, settings.upload_spool_max_bytes, sha256=settings.dedup_uploads
+        )
+    if error_message:
+        return create_response(400, {'error': error_message})
+    stored = upload
+    blob = None
+    writes = []
     try:
-        # Parsear el cuerpo de la request
-        if 'body' not in event:
-            return create_response(400, {'error': 'Missing request body'})
+        # ETag calculado localmente (igual al de S3 en una subida simple sin
+        # comprimir), ya que los metadatos se escriben en paralelo con el objeto
+        etag = upload.md5_hex
+        content_type = body.get('content_type', DEFAULT_CONTENT_TYPE)
         
-        body = event['body']
-        if isinstance(body, str):
-            try:
-                body = json.loads(body)
-            except json.JSONDecodeError:
-                return create_response(400, {'error': 'Invalid JSON in request body'})
-        
-        # Validar campos requeridos
-        required_fields = ['user_id', 'document_type', 'file_name', 'file_content']
-        for field in required_fields:
-            if field not in body:
-                return create_response(400, {'error': f'Missing required field: {field}'})
-        
-        user_id = body['user_id']
-        document_type = body['document_type']
-        file_name = body['file_name']
-        file_content = body['file_content']
-        
-        # Validar tipos de datos
-        if not isinstance(user_id, str) or not isinstance(document_type, str) or not isinstance(file_name, str):
-            return create_response(400, {'error': 'user_id, document_type and file_name must be strings'})
-        
-        # Generar ID único para el documento
-        document_id = str(uuid.uuid4())
-        s3_key = f"{user_id}/{document_type}/{document_id}_{file_name}"
-        
-        # Decodificar el contenido del archivo (base64)
-        try:
-            import base64
-            file_bytes = base64.b64decode(file_content)
-        except Exception:
-            return create_response(400, {'error': 'Invalid file_content - must be base64 encoded'})
+        # Compresión según el tipo de contenido (STORAGE_CODEC)
+        with metrics.timer('Compress'):
+            stored, content_encoding = storage_codec.encode_content_for_storage(upload, content_type)
         
         # Obtener clientes AWS
         s3_client = get_s3_client()
         table = get_dynamodb_table()
         
-        # Subir archivo a S3
-        s3_bucket = 'user-documents-bucket'
-        try:
-            s3_client.put_object(
-                Bucket=s3_bucket,
-                Key=s3_key,
-                Body=file_bytes,
-                ContentType='application/octet-stream'
-            )
-            logger.info(f"File uploaded to S3: {s3_key}")
-        except ClientError as e:
-            logger.error(f"S3 upload error: {str(e)}")
-            return create_response(500, {'error': 'Failed to upload file to S3'})
-        
-        # Guardar metadatos en DynamoDB
+        # Subir archivo a S3 y guardar metadatos en DynamoDB en paralelo
+        s3_bucket = settings.bucket_name
+        upload_date = datetime.utcnow().isoformat()
         document_item = {
             'document_id': document_id,
             'user_id': user_id,
@@ -145,107 +222,345 @@ def upload_document(event):
             'file_name': file_name,
             's3_bucket': s3_bucket,
             's3_key': s3_key,
-            'upload_date': datetime.utcnow().isoformat(),
-            'file_size': len(file_bytes)
+            'upload_date': upload_date,
+            TYPE_DATE_ATTRIBUTE: build_type_date(document_type, upload_date),
+            'file_size': upload.size,
+            'content_type': content_type,
+            'etag': etag
         }
         
-        try:
-            table.put_item(Item=document_item)
-            logger.info(f"Metadata saved to DynamoDB for document: {document_id}")
-        except ClientError as e:
-            logger.error(f"DynamoDB put error: {str(e)}")
-            # Intentar eliminar el archivo de S3 si falla DynamoDB
+        # Modo deduplicado: el documento apunta al blob de su contenido y solo
+        # se sube a S3 si el blob aún no existe
+        if settings.dedup_uploads:
+            blob = acquire_blob(table, user_id, upload.sha256_hex, upload.size, etag, content_encoding)
+            if blob is not None:
+                s3_key = document_item['s3_key'] = blob.s3_key
+                document_item['content_sha256'] = blob.content_sha256
+                # El blob conserva el codec con el que se guardó por primera vez
+                if blob.content_encoding != content_encoding:
+                    content_encoding = blob.content_encoding
+                    if blob.needs_upload:
+                        if stored is not upload:
+                            stored.close()
+                        stored = storage_codec.encode_content(upload, content_encoding)
+        
+        upload_object = blob is None or blob.needs_upload
+        # Tamaño del objeto en S3: el que sube esta request o el del blob
+        # reutilizado (stored puede tener otro codec)
+        stored_size = stored.size if upload_object else blob.stored_size
+        if content_encoding != storage_codec.IDENTITY:
+            document_item['content_encoding'] = content_encoding
+            if stored_size is not None:
+                document_item['stored_size'] = stored_size
+        
+        writes.append(submit(table.put_item, Item=document_item))
+        if upload_object:
+            # S3 lee el cuerpo desde el spool (memoria o /tmp)
+            put_kwargs = {
+                'Bucket': s3_bucket,
+                'Key': s3_key,
+                'Body': stored.stream(),
+                'ContentLength': stored.size,
+                'ContentMD5': stored.content_md5,
+                'ContentType': content_type
+            }
+            if content_encoding != storage_codec.IDENTITY:
+                put_kwargs['ContentEncoding'] = content_encoding
+            writes.append(submit(s3_client.put_object, **put_kwargs))
+        outcomes = wait_all(writes)
+    except Exception:
+        # Fallo inesperado antes de tener el resultado de las escrituras:
+        # deshacer los metadatos que llegaron a escribirse y la referencia al blob
+        if writes and wait_all(writes)[0][1] is None:
+            try:
+                table.delete_item(Key={'user_id': user_id, 'document_id': document_id})
+            except ClientError as e:
+                logger.error("Orphan metadata left for document %s: %s", document_id, e)
+        if blob is not None:
+            release_blob(table, s3_client, s3_bucket, user_id, blob.content_sha256)
+        raise
+    finally:
+        if stored is not upload:
+            stored.close()
+        upload.close()
+    dynamodb_error = outcomes[0][1]
+    s3_error = outcomes[1][1] if upload_object else None
+    
+    # Compensar la escritura que sí se hizo para no dejar huérfanos
+    if s3_error is not None:
+        logger.error("S3 upload error: %s", s3_error)
+        if dynamodb_error is None:
+            try:
+                table.delete_item(Key={'user_id': user_id, 'document_id': document_id})
+            except ClientError as e:
+                logger.error("Orphan metadata left for document %s: %s", document_id, e)
+        if blob is not None:
+            release_blob(table, s3_client, s3_bucket, user_id, blob.content_sha256)
+        return create_response(500, {'error': 'Failed to upload file to S3'})
+    
+    if dynamodb_error is not None:
+        logger.error("DynamoDB put error: %s", dynamodb_error)
+        if blob is not None:
+            release_blob(table, s3_client, s3_bucket, user_id, blob.content_sha256)
+        else:
             try:
                 s3_client.delete_object(Bucket=s3_bucket, Key=s3_key)
-            except ClientError:
-                pass
-            return create_response(500, {'error': 'Failed to save document metadata'})
+            except ClientError as e:
+                logger.error("Orphan S3 object left at %s: %s", s3_key, e)
+        return create_response(500, {'error': 'Failed to save document metadata'})
+    
+    if blob is not None and blob.needs_upload:
+        try:
+            mark_blob_stored(table, user_id, blob.content_sha256, stored_size)
+        except ClientError as e:
+            # La próxima subida del mismo contenido volverá a subir el objeto
+            logger.warning("Blob %s not marked as stored: %s", blob.content_sha256, e)
+    
+    logger.info("Document %s uploaded to S3 (%s) with metadata", document_id, s3_key)
+    # La nueva versión pasa a ser la más reciente del tipo; la cacheada (o
+    # el 404 cacheado) queda obsoleta
+    publish_version(table, document_item)
+    invalidate_document(user_id, document_type)
+    
+    # Respuesta exitosa
+    response_data = {
+        'message': 'Document uploaded successfully',
+        'document_id': document_id,
+        'user_id': user_id,
+        'document_type': document_type,
+        'file_name': file_name
+    }
+    
+    return create_response(201, response_data)
+
+def parse_download_mode(event):
+    """
+    Modo de descarga: 'inline' (contenido en base64 dentro del JSON, por
+    defecto), 'url' (URL prefirmada de S3 de corta duración) o 'binary' (el
+    archivo como cuerpo de la respuesta, metadatos en headers).
+    Accept: application/octet-stream equivale a 'binary'.
+    Devuelve (modo, None) o (None, respuesta de error).
+    """
+    download_mode = get_query_param(event, 'download') or get_header(event, 'X-Download-Mode')
+    if download_mode is None:
+        accept = (get_header(event, 'Accept') or '').split(';')[0].strip().lower()
+        download_mode = DOWNLOAD_BINARY if accept == DEFAULT_CONTENT_TYPE else DOWNLOAD_INLINE
+    download_mode = download_mode.lower()
+    if download_mode not in DOWNLOAD_MODES:
+        return None, create_response(400, {'error': f'Invalid download mode. Use one of: {", ".join(DOWNLOAD_MODES)}'})
+    return download_mode, None
+
+@route('GET', '/documents/{user_id}/{document_type}')
+@metrics.route('get_document')
+def get_document(event, user_id, document_type):
+    """
+    Maneja la consulta de documentos (GET /documents/{user_id}/{document_type}):
+    la versión más reciente del tipo
+    """
+    try:
+        if TYPE_DATE_SEPARATOR in document_type:
+            return create_response(400, {'error': f'document_type must not contain "{TYPE_DATE_SEPARATOR}"'})
         
-        # Respuesta exitosa
-        response_data = {
-            'message': 'Document uploaded successfully',
-            'document_id': document_id,
-            'user_id': user_id,
-            'document_type': document_type,
-            'file_name': file_name
-        }
+        download_mode, error_response = parse_download_mode(event)
+        if error_response:
+            return error_response
+        
+        # Los metadatos resueltos se cachean en el contenedor (también los
+        # resultados negativos, con un TTL más corto)
+        cache = get_metadata_cache()
+        cache_key = (user_id, document_type)
+        cached, document_metadata = cache.get(cache_key)
+        metrics.put_metric('MetadataCacheHit', 1 if cached else 0)
+        
+        if not cached:
+            # Puntero LATEST#{document_type}: una sola lectura por clave
+            try:
+                item = get_latest(get_dynamodb_table(), user_id, document_type)
+            except ClientError as e:
+                logger.error("DynamoDB query error: %s", e)
+                return create_response(500, {'error': 'Failed to query document metadata'})
+            document_metadata = DocumentMetadata.from_item(item) if item else None
+            cache.put(cache_key, document_metadata)
         
-        return create_response(201, response_data)
+        if document_metadata is None:
+            return create_response(404, {'error': 'Document not found'})
+        return serve_document(event, document_metadata, download_mode)
         
     except Exception as e:
-        logger.error(f"Unexpected error in upload_document: {str(e)}")
+        logger.error("Unexpected error in get_document: %s", e)
         return create_response(500, {'error': 'Internal server error'})
 
-def get_document(event):
+@route('GET', '/documents/{user_id}/{document_type}/versions/{document_id}')
+@metrics.route('get_document_version')
+def get_document_version(event, user_id, document_type, document_id):
     """
-    Maneja la consulta de documentos (GET /documents/{user_id}/{document_type})
+    Una versión concreta de un documento
+    (GET /documents/{user_id}/{document_type}/versions/{document_id})
     """
     try:
-        # Extraer user_id y document_type del path
-        path = event.get('path', '')
-        path_parts = path.split('/')
-        
-        # El path debería ser: /documents/{user_id}/{document_type}
-        if len(path_parts) < 4:
-            return create_response(400, {'error': 'Invalid path format. Use /documents/{user_id}/{document_type}'})
-        
-        user_id = path_parts[2]
-        document_type = path_parts[3]
+        download_mode, error_response = parse_download_mode(event)
+        if error_response:
+            return error_response
         
-        # Validar parámetros
-        if not user_id or not document_type:
-            return create_response(400, {'error': 'user_id and document_type are required'})
-        
-        # Obtener clientes AWS
-        table = get_dynamodb_table()
-        s3_client = get_s3_client()
-        
-        # Consultar DynamoDB para obtener el documento más reciente
         try:
-            response = table.query(
-                KeyConditionExpression=boto3.dynamodb.conditions.Key('user_id').eq(user_id),
-                FilterExpression=boto3.dynamodb.conditions.Attr('document_type').eq(document_type),
-                ScanIndexForward=False,  # Orden descendente (más reciente primero)
-                Limit=1
-            )
+            item = get_version(get_dynamodb_table(), user_id, document_type, document_id)
         except ClientError as e:
-            logger.error(f"DynamoDB query error: {str(e)}")
+            logger.error("DynamoDB get error: %s", e)
             return create_response(500, {'error': 'Failed to query document metadata'})
+        if item is None:
+            return create_response(404, {'error': 'Document version not found'})
+        return serve_document(event, DocumentMetadata.from_item(item), download_mode)
         
-        items = response.get('Items', [])
-        if not items:
-            return create_response(404, {'error': 'Document not found'})
-        
-        document_metadata = convert_decimals(items[0])
-        s3_bucket = document_metadata['s3_bucket']
-        s3_key = document_metadata['s3_key']
-        file_name = document_metadata['file_name']
-        
-        # Descargar archivo de S3
+    except Exception as e:
+        logger.error("Unexpected error in get_document_version: %s", e)
+        return create_response(500, {'error': 'Internal server error'})
+
+def serve_document(event, document_metadata, download_mode):
+    """
+    Respuesta con el contenido de una versión en el modo de descarga pedido
+    (peticiones condicionales y rangos incluidos)
+    """
+    s3_client = get_s3_client()
+    s3_bucket = document_metadata.s3_bucket
+    s3_key = document_metadata.s3_key
+    file_name = document_metadata.file_name
+    
+    # En modo 'url' solo se incluye el contenido si el archivo es pequeño;
+    # el resto se descarga directamente de S3
+    settings = get_settings()
+    if download_mode == DOWNLOAD_URL and document_metadata.file_size > settings.inline_download_max_bytes:
         try:
-            s3_response = s3_client.get_object(Bucket=s3_bucket, Key=s3_key)
-            file_content = s3_response['Body'].read()
+            download_url = s3_client.generate_presigned_url(
+                'get_object',
+                Params={
+                    'Bucket': s3_bucket,
+                    'Key': s3_key,
+                    'ResponseContentDisposition': content_disposition(file_name)
+                },
+                ExpiresIn=settings.presigned_url_expires
+            )
         except ClientError as e:
-            logger.error(f"S3 download error: {str(e)}")
-            return create_response(500, {'error': 'Failed to download file from S3'})
-        
-        # Codificar el contenido en base64 para la respuesta
-        import base64
-        file_content_base64 = base64.b64encode(file_content).decode('utf-8')
+            logger.error("S3 presign error: %s", e)
+            return create_response(500, {'error': 'Failed to generate download URL'})
         
-        # Preparar respuesta
         response_data = {
-            'document_id': document_metadata['document_id'],
-            'user_id': user_id,
-            'document_type': document_type,
+            'document_id': document_metadata.document_id,
+            'user_id': document_metadata.user_id,
+            'document_type': document_metadata.document_type,
             'file_name': file_name,
-            'file_content': file_content_base64,
-            'upload_date': document_metadata['upload_date'],
-            'file_size': document_metadata['file_size']
+            'upload_date': document_metadata.upload_date,
+            'file_size': document_metadata.file_size,
+            'delivery': DOWNLOAD_URL,
+            'download_url': download_url,
+            'expires_in': settings.presigned_url_expires
         }
-        
-        return create_response(200, response_data)
-        
-    except Exception as e:
-        logger.error(f"Unexpected error in get_document: {str(e)}")
-        return create_response(500, {'error': 'Internal server error'})
\ No newline at end of file
+        # La URL caduca: la respuesta no se puede reutilizar
+        return create_response(200, response_data, {'Cache-Control': 'no-store'})
+    
+    # Peticiones condicionales: si el cliente ya tiene esta versión se
+    # responde 304 solo con los metadatos, sin leer el objeto de S3.
+    # Los documentos sin etag (anteriores a este campo) usan su
+    # document_id, que es único por versión
+    etag = document_metadata.etag or document_metadata.document_id
+    validators = validator_headers(etag, document_metadata.upload_date)
+    if is_not_modified(event, etag, document_metadata.upload_date):
+        metrics.put_metric('NotModified', 1)
+        return not_modified_response(validators)
+    
+    # Rango de bytes (header Range o parámetros offset/length): solo se lee
+    # de S3 la parte pedida
+    file_size = document_metadata.file_size
+    byte_range, error_response = resolve_byte_range(
+        event, file_size, etag, document_metadata.upload_date, settings.range_max_bytes
+    )
+    if error_response:
+        return error_response
+    validators['Accept-Ranges'] = 'bytes'
+    
+    # Descargar archivo de S3. Los rangos se refieren al contenido original:
+    # de un objeto comprimido solo se lee y descomprime hasta el final del
+    # rango (los documentos grandes no se comprimen, ver COMPRESSION_MAX_BYTES)
+    content_encoding = document_metadata.content_encoding or storage_codec.IDENTITY
+    compressed = content_encoding != storage_codec.IDENTITY
+    get_kwargs = {'Bucket': s3_bucket, 'Key': s3_key}
+    if byte_range and not compressed:
+        get_kwargs['Range'] = 'bytes=%d-%d' % byte_range
+    try:
+        s3_response = s3_client.get_object(**get_kwargs)
+        if byte_range and compressed:
+            with metrics.timer('Decompress'):
+                file_content = storage_codec.decode_prefix(s3_response['Body'], content_encoding, byte_range[1] + 1)
+            s3_response['Body'].close()
+            file_content = file_content[byte_range[0]:]
+        else:
+            file_content = s3_response['Body'].read()
+    except ClientError as e:
+        # Los metadatos y el archivo se escriben en paralelo: durante la
+        # subida (o si la subida a S3 falló) el objeto puede no existir aún
+        if e.response['Error']['Code'] == 'NoSuchKey':
+            return create_response(404, {'error': 'Document content not available'})
+        if e.response['Error']['Code'] == 'InvalidRange':
+            return create_response(416, {'error': 'Requested range not satisfiable'},
+                                   {'Content-Range': f'bytes */{file_size}'})
+        logger.error("S3 download error: %s", e)
+        return create_response(500, {'error': 'Failed to download file from S3'})
+    
+    # En modo binario el documento completo se envía comprimido si el
+    # cliente acepta el codec (Content-Encoding); si no, se descomprime
+    send_encoded = (
+        compressed and download_mode == DOWNLOAD_BINARY and not byte_range
+        and storage_codec.accepts_encoding(get_header(event, 'Accept-Encoding'), content_encoding)
+    )
+    if compressed and not send_encoded and not byte_range:
+        with metrics.timer('Decompress'):
+            file_content = storage_codec.decode(file_content, content_encoding)
+    
+    # Codificar el contenido en base64 para la respuesta
+    with metrics.timer('Base64Encode'):
+        file_content_base64 = base64.b64encode(file_content).decode('utf-8')
+    
+    if byte_range:
+        start = byte_range[0]
+        end = start + len(file_content) - 1
+        validators['Content-Range'] = f'bytes {start}-{end}/{file_size}'
+    status_code = 206 if byte_range else 200
+    
+    # Respuesta binaria: API Gateway decodifica el cuerpo (isBase64Encoded)
+    # y el cliente recibe los bytes sin una capa JSON
+    if download_mode == DOWNLOAD_BINARY:
+        # Un blob deduplicado conserva el ContentType de la primera subida:
+        # el de los metadatos tiene prioridad
+        content_type = (document_metadata.content_type or s3_response.get('ContentType')
+                        or DEFAULT_CONTENT_TYPE)
+        headers = dict(validators)
+        headers.update(document_headers(document_metadata))
+        if compressed:
+            headers['Vary'] = 'Accept-Encoding'
+        if send_encoded:
+            # Representación codificada: equivalente, pero no idéntica byte a byte
+            headers['Content-Encoding'] = content_encoding
+            headers['ETag'] = 'W/' + headers['ETag']
+        return binary_response(status_code, file_content_base64, content_type, headers)
+    
+    # Preparar respuesta
+    response_data = {
+        'document_id': document_metadata.document_id,
+        'user_id': document_metadata.user_id,
+        'document_type': document_metadata.document_type,
+        'file_name': file_name,
+        'file_content': file_content_base64,
+        'upload_date': document_metadata.upload_date,
+        'file_size': file_size
+    }
+    
+    if byte_range:
+        response_data['range'] = {'start': start, 'end': end}
+    
+    return create_response(status_code, response_data, validators)
+
+
+# Con EAGER_INIT (por defecto, dentro de Lambda) la inicialización se hace al
+# importar el módulo; en pruebas y herramientas locales los recursos se crean
+# de forma lazy
+if get_settings().eager_init:
+    initialize()
@@ -0,0 +1,114 @@
+"""
+Caché en memoria de los metadatos resueltos por GET /documents/{user_id}/{document_type}.
+
+Vive en el contenedor mientras está caliente: LRU acotada por número de
+entradas y con TTL, de modo que las ráfagas de lecturas de los mismos usuarios
+no consumen capacidad de lectura de DynamoDB. Los resultados negativos
+(documento inexistente) se guardan con un TTL más corto.
+
+La invalidación es local: las escrituras de este contenedor invalidan su
+entrada, pero otros contenedores pueden servir metadatos anteriores hasta que
+caduque el TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from .config import get_settings
+
+
+class TTLCache:
+    """LRU acotada con caducidad por entrada y contadores de aciertos/fallos"""
+
+    def __init__(self, max_entries, ttl, negative_ttl, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key):
+        """
+        Devuelve (True, valor) si la entrada está vigente o (False, None).
+        El valor None representa un resultado negativo cacheado.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        """Guarda un valor (None para un resultado negativo)"""
+        ttl = self.negative_ttl if value is None else self.ttl
+        if not self.enabled or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries)
+            }
+
+
+_lock = threading.Lock()
+_cache = None
+
+
+def get_metadata_cache():
+    """Obtener la caché de metadatos del contenedor (lazy y thread-safe)"""
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                settings = get_settings()
+                _cache = TTLCache(
+                    max_entries=settings.metadata_cache_max_entries,
+                    ttl=settings.metadata_cache_ttl,
+                    negative_ttl=settings.metadata_cache_negative_ttl
+                )
+    return _cache
+
+
+def invalidate_document(user_id, document_type):
+    """Descarta la entrada de un usuario y tipo tras escribir una nueva versión"""
+    if _cache is not None:
+        _cache.invalidate((user_id, document_type))
+
+
+def reset_metadata_cache():
+    """Descartar la caché (usado en pruebas)"""
+    global _cache
+    with _lock:
+        _cache = None
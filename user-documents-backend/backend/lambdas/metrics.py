@@ -0,0 +1,257 @@
+"""
+Métricas de latencia y throughput en formato CloudWatch Embedded Metric Format.
+
+Cada invocación acumula sus métricas en memoria y al terminar se emiten como
+líneas JSON EMF (CloudWatch las extrae de los logs, sin llamadas de red):
+
+- Un documento por ruta (dimensión Route): Duration, HandlerDuration,
+  RequestBytes, ResponseBytes, Errors, ColdStart y los tiempos parciales
+  registrados con timer() (p. ej. Base64Decode).
+- Un documento por llamada AWS (dimensiones Service, Operation): AwsCallDuration,
+  AwsCallRetries, AwsCallErrors, AwsRequestBytes y AwsResponseBytes, recogidos
+  con los eventos de botocore registrados en cada cliente.
+
+El destino es intercambiable (set_sink); InMemorySink permite inspeccionar las
+métricas en pruebas y ejecuciones locales.
+"""
+import functools
+import json
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from botocore.utils import determine_content_length
+
+from .config import get_settings
+
+
+UNIT_MILLISECONDS = 'Milliseconds'
+UNIT_BYTES = 'Bytes'
+UNIT_COUNT = 'Count'
+
+_current = ContextVar('metrics_invocation', default=None)
+_cold_start = True
+
+
+class StdoutSink:
+    """Escribe cada documento EMF como una línea JSON en stdout (CloudWatch Logs)"""
+
+    def emit(self, document):
+        sys.stdout.write(json.dumps(document, separators=(',', ':')) + '\n')
+
+
+class InMemorySink:
+    """Acumula los documentos EMF en memoria (pruebas y ejecuciones locales)"""
+
+    def __init__(self):
+        self.documents = []
+
+    def emit(self, document):
+        self.documents.append(document)
+
+    def clear(self):
+        self.documents.clear()
+
+    def values(self, name, **dimensions):
+        """Valores registrados de una métrica, filtrando por dimensiones"""
+        found = []
+        for document in self.documents:
+            if name not in document:
+                continue
+            if any(document.get(key) != value for key, value in dimensions.items()):
+                continue
+            value = document[name]
+            found.extend(value if isinstance(value, list) else [value])
+        return found
+
+
+_sink = StdoutSink()
+
+
+def set_sink(sink):
+    """Reemplaza el destino de las métricas. Devuelve el destino anterior."""
+    global _sink
+    previous = _sink
+    _sink = sink
+    return previous
+
+
+def get_sink():
+    return _sink
+
+
+class _Invocation:
+    __slots__ = ('route', 'cold_start', 'started', 'values', 'aws_calls')
+
+    def __init__(self, cold_start):
+        self.route = None
+        self.cold_start = cold_start
+        self.started = time.perf_counter()
+        self.values = {}
+        self.aws_calls = {}
+
+    def add(self, name, value, unit):
+        self.values.setdefault(name, (unit, []))[1].append(value)
+
+    def add_aws(self, service, operation, name, value, unit):
+        metrics = self.aws_calls.setdefault((service, operation), {})
+        metrics.setdefault(name, (unit, []))[1].append(value)
+
+
+def start_invocation():
+    """
+    Abre el contexto de métricas de una invocación. Devuelve un token para
+    finish_invocation, o None si las métricas están deshabilitadas.
+    """
+    global _cold_start
+    if not get_settings().metrics_enabled:
+        return None
+    invocation = _Invocation(_cold_start)
+    _cold_start = False
+    return _current.set(invocation)
+
+
+def finish_invocation(token, event=None, response=None):
+    """Cierra la invocación y emite sus documentos EMF"""
+    if token is None:
+        return
+    invocation = _current.get()
+    _current.reset(token)
+    if invocation is None:
+        return
+
+    invocation.add('Duration', (time.perf_counter() - invocation.started) * 1000, UNIT_MILLISECONDS)
+    if event is not None and isinstance(event.get('body'), str):
+        invocation.add('RequestBytes', len(event['body']), UNIT_BYTES)
+    if isinstance(response, dict):
+        if isinstance(response.get('body'), str):
+            invocation.add('ResponseBytes', len(response['body']), UNIT_BYTES)
+        status_code = response.get('statusCode')
+        if status_code is not None:
+            invocation.add('Errors', 1 if status_code >= 500 else 0, UNIT_COUNT)
+    invocation.add('ColdStart', 1 if invocation.cold_start else 0, UNIT_COUNT)
+
+    namespace = get_settings().metrics_namespace
+    timestamp = int(time.time() * 1000)
+    route = invocation.route or 'unknown'
+    properties = {'ColdStartInvocation': invocation.cold_start}
+
+    _sink.emit(_build_document(namespace, timestamp, {'Route': route}, invocation.values, properties))
+    for (service, operation), values in invocation.aws_calls.items():
+        dimensions = {'Service': service, 'Operation': operation}
+        _sink.emit(_build_document(namespace, timestamp, dimensions, values, {'Route': route}))
+
+
+def _build_document(namespace, timestamp, dimensions, values, properties):
+    document = {
+        '_aws': {
+            'Timestamp': timestamp,
+            'CloudWatchMetrics': [{
+                'Namespace': namespace,
+                'Dimensions': [list(dimensions)],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, (unit, _) in values.items()]
+            }]
+        }
+    }
+    document.update(properties)
+    document.update(dimensions)
+    for name, (_, samples) in values.items():
+        document[name] = samples[0] if len(samples) == 1 else samples
+    return document
+
+
+def put_metric(name, value, unit=UNIT_COUNT):
+    """Registra un valor en la invocación actual (no hace nada fuera de una invocación)"""
+    invocation = _current.get()
+    if invocation is not None:
+        invocation.add(name, value, unit)
+
+
+def set_route(route):
+    invocation = _current.get()
+    if invocation is not None and invocation.route is None:
+        invocation.route = route
+
+
+@contextmanager
+def timer(name):
+    """Mide la duración de un bloque en milisegundos"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        put_metric(name, (time.perf_counter() - started) * 1000, UNIT_MILLISECONDS)
+
+
+def route(name):
+    """
+    Decorador para los handlers de cada ruta: fija la dimensión Route y mide
+    HandlerDuration
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            set_route(name)
+            with timer('HandlerDuration'):
+                return handler(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _body_length(body):
+    if body is None:
+        return None
+    # Acepta bytes, str y streams (botocore envuelve los Body en BytesIO)
+    return determine_content_length(body)
+
+
+def _before_call(model=None, params=None, context=None, **kwargs):
+    if context is not None:
+        context['metrics_started'] = time.perf_counter()
+        if params is not None:
+            context['metrics_request_bytes'] = _body_length(params.get('body'))
+
+
+def _record_call(model, context, retries, error, response_bytes=None):
+    invocation = _current.get()
+    if invocation is None or context is None or 'metrics_started' not in context:
+        return
+    service = model.service_model.service_name
+    operation = model.name
+    invocation.add_aws(service, operation, 'AwsCallDuration',
+                       (time.perf_counter() - context['metrics_started']) * 1000, UNIT_MILLISECONDS)
+    invocation.add_aws(service, operation, 'AwsCallRetries', retries, UNIT_COUNT)
+    invocation.add_aws(service, operation, 'AwsCallErrors', 1 if error else 0, UNIT_COUNT)
+    request_bytes = context.get('metrics_request_bytes')
+    if request_bytes:
+        invocation.add_aws(service, operation, 'AwsRequestBytes', request_bytes, UNIT_BYTES)
+    if response_bytes:
+        invocation.add_aws(service, operation, 'AwsResponseBytes', response_bytes, UNIT_BYTES)
+
+
+def _after_call(http_response=None, parsed=None, model=None, context=None, **kwargs):
+    parsed = parsed or {}
+    metadata = parsed.get('ResponseMetadata', {})
+    status_code = metadata.get('HTTPStatusCode') or getattr(http_response, 'status_code', 200)
+    _record_call(model, context, metadata.get('RetryAttempts', 0), status_code >= 300,
+                 parsed.get('ContentLength'))
+
+
+def _after_call_error(model=None, context=None, exception=None, **kwargs):
+    _record_call(model, context, 0, True)
+
+
+def instrument_client(client):
+    """Registra los eventos de botocore que miden cada llamada del cliente"""
+    events = client.meta.events
+    events.register('before-call.*.*', _before_call, unique_id='metrics-before-call')
+    events.register('after-call.*.*', _after_call, unique_id='metrics-after-call')
+    events.register('after-call-error.*.*', _after_call_error, unique_id='metrics-after-call-error')
+    return client
+
+
+def reset_cold_start():
+    """Marca la próxima invocación como arranque en frío (usado en pruebas)"""
+    global _cold_start
+    _cold_start = True
@@ -0,0 +1,171 @@
+"""
+Migración del layout de metadatos de UserDocuments.
+
+Crea los índices UserDocumentTypeDateIndex y UserDocumentUploadDateIndex si
+la tabla aún no los tiene y rellena el atributo type_date en los documentos
+existentes.
+
+Uso:
+    python -m backend.lambdas.migrations --table UserDocuments [--dry-run]
+"""
+import argparse
+import logging
+import time
+
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+from .aws_clients import get_client, get_table
+from .schema import (
+    TYPE_DATE_ATTRIBUTE,
+    TYPE_DATE_INDEX_DEFINITION,
+    UPLOAD_DATE_ATTRIBUTE,
+    UPLOAD_DATE_INDEX_DEFINITION,
+    build_type_date
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_index(table_name, index_definition, attribute_name, dynamodb_client=None):
+    """
+    Crea un GSI (de clave de ordenación attribute_name) si no existe.
+    Devuelve True si se solicitó su creación.
+    """
+    if dynamodb_client is None:
+        dynamodb_client = get_client('dynamodb')
+    index_name = index_definition['IndexName']
+
+    description = dynamodb_client.describe_table(TableName=table_name)['Table']
+    existing = {index['IndexName'] for index in description.get('GlobalSecondaryIndexes', [])}
+    if index_name in existing:
+        logger.info("Index %s already exists on %s", index_name, table_name)
+        return False
+
+    index = dict(index_definition)
+    if description.get('BillingModeSummary', {}).get('BillingMode') != 'PAY_PER_REQUEST':
+        throughput = description['ProvisionedThroughput']
+        index['ProvisionedThroughput'] = {
+            'ReadCapacityUnits': throughput['ReadCapacityUnits'],
+            'WriteCapacityUnits': throughput['WriteCapacityUnits']
+        }
+
+    dynamodb_client.update_table(
+        TableName=table_name,
+        AttributeDefinitions=[{'AttributeName': attribute_name, 'AttributeType': 'S'}],
+        GlobalSecondaryIndexUpdates=[{'Create': index}]
+    )
+    logger.info("Requested creation of index %s on %s", index_name, table_name)
+    return True
+
+
+def ensure_type_date_index(table_name, dynamodb_client=None):
+    """Crea el GSI tipo#fecha si no existe"""
+    return ensure_index(table_name, TYPE_DATE_INDEX_DEFINITION, TYPE_DATE_ATTRIBUTE, dynamodb_client)
+
+
+def ensure_upload_date_index(table_name, dynamodb_client=None):
+    """Crea el GSI de listado por fecha de subida si no existe"""
+    return ensure_index(table_name, UPLOAD_DATE_INDEX_DEFINITION, UPLOAD_DATE_ATTRIBUTE, dynamodb_client)
+
+
+def wait_for_indexes(table_name, dynamodb_client=None, delay=15, max_attempts=120):
+    """
+    Espera a que todos los GSI estén ACTIVE (DynamoDB no admite crear un
+    índice mientras otro se está creando)
+    """
+    if dynamodb_client is None:
+        dynamodb_client = get_client('dynamodb')
+    for _ in range(max_attempts):
+        description = dynamodb_client.describe_table(TableName=table_name)['Table']
+        statuses = [index.get('IndexStatus', 'ACTIVE') for index in description.get('GlobalSecondaryIndexes', [])]
+        if all(status == 'ACTIVE' for status in statuses):
+            return
+        time.sleep(delay)
+    raise TimeoutError(f"Indexes on {table_name} are not active after {delay * max_attempts}s")
+
+
+def backfill_type_date(table=None, dry_run=False, segment=None, total_segments=None, page_size=100):
+    """
+    Añade type_date a los documentos que no lo tienen.
+
+    Admite scans paralelos (segment/total_segments) para repartir la
+    migración entre varios procesos. Devuelve el número de items actualizados.
+    """
+    if table is None:
+        table = get_table()
+
+    scan_kwargs = {
+        'ProjectionExpression': 'user_id, document_id, document_type, upload_date',
+        'FilterExpression': (
+            Attr('document_type').exists()
+            & Attr('upload_date').exists()
+            & Attr(TYPE_DATE_ATTRIBUTE).not_exists()
+        ),
+        'Limit': page_size
+    }
+    if total_segments is not None:
+        scan_kwargs['Segment'] = segment or 0
+        scan_kwargs['TotalSegments'] = total_segments
+
+    updated = 0
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            type_date = build_type_date(item['document_type'], item['upload_date'])
+            if dry_run:
+                logger.info("Would set %s=%s on %s/%s", TYPE_DATE_ATTRIBUTE, type_date,
+                            item['user_id'], item['document_id'])
+                updated += 1
+                continue
+            try:
+                table.update_item(
+                    Key={'user_id': item['user_id'], 'document_id': item['document_id']},
+                    UpdateExpression='SET #type_date = :type_date',
+                    ConditionExpression='attribute_exists(document_id) AND attribute_not_exists(#type_date)',
+                    ExpressionAttributeNames={'#type_date': TYPE_DATE_ATTRIBUTE},
+                    ExpressionAttributeValues={':type_date': type_date}
+                )
+                updated += 1
+            except ClientError as e:
+                # Otro proceso ya migró el item (o fue eliminado entretanto)
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+    logger.info("Backfilled %s items", updated)
+    return updated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migrate UserDocuments to the type#date and upload date index layout')
+    parser.add_argument('--table', default=None, help='DynamoDB table name (defaults to DOCUMENTS_TABLE)')
+    parser.add_argument('--dry-run', action='store_true', help='Only report the items that would change')
+    parser.add_argument('--skip-index', action='store_true', help='Do not create the GSIs, only backfill')
+    parser.add_argument('--segment', type=int, default=None)
+    parser.add_argument('--total-segments', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    table = get_table(args.table)
+
+    if not args.skip_index and not args.dry_run:
+        for ensure in (ensure_type_date_index, ensure_upload_date_index):
+            if ensure(table.name):
+                wait_for_indexes(table.name)
+
+    backfill_type_date(
+        table,
+        dry_run=args.dry_run,
+        segment=args.segment,
+        total_segments=args.total_segments
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Registros tipados de los items de UserDocuments.
+
+Los items se leen de DynamoDB directamente en registros con __slots__: los
+campos numéricos conocidos por el esquema se convierten de Decimal a int al
+construirlos, y el resto se copia tal cual. Así no hace falta recorrer cada
+item de forma genérica y los registros (inmutables) se pueden compartir desde
+la caché de metadatos. create_response los serializa con json_default.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+
+def decimal_to_number(value):
+    """Decimal de DynamoDB a int (si es entero, incluidos exponentes como 1E+2) o float"""
+    if value == value.to_integral_value():
+        return int(value)
+    return float(value)
+
+
+def _int_or_none(value):
+    return int(value) if value is not None else None
+
+
+@dataclass(frozen=True, slots=True)
+class DocumentMetadata:
+    """Metadatos completos de un documento (GET /documents/{user_id}/{document_type})"""
+    user_id: str
+    document_id: str
+    document_type: str
+    file_name: str
+    s3_bucket: str
+    s3_key: str
+    upload_date: str
+    file_size: int
+    content_type: str = None
+    etag: str = None
+    content_encoding: str = None
+    stored_size: int = None
+    content_sha256: str = None
+
+    @classmethod
+    def from_item(cls, item):
+        return cls(
+            user_id=item['user_id'],
+            document_id=item['document_id'],
+            document_type=item['document_type'],
+            file_name=item['file_name'],
+            s3_bucket=item['s3_bucket'],
+            s3_key=item['s3_key'],
+            upload_date=item['upload_date'],
+            file_size=int(item.get('file_size', 0)),
+            content_type=item.get('content_type'),
+            etag=item.get('etag'),
+            content_encoding=item.get('content_encoding'),
+            stored_size=_int_or_none(item.get('stored_size')),
+            content_sha256=item.get('content_sha256')
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class DocumentSummary:
+    """Item del listado de documentos (los atributos de schema.LIST_ATTRIBUTES)"""
+    document_id: str
+    document_type: str
+    file_name: str
+    file_size: int
+    upload_date: str
+
+    @classmethod
+    def from_item(cls, item):
+        return cls(
+            document_id=item['document_id'],
+            document_type=item.get('document_type'),
+            file_name=item.get('file_name'),
+            file_size=_int_or_none(item.get('file_size')),
+            upload_date=item.get('upload_date')
+        )
+
+
+def json_default(obj):
+    """Serialización JSON de Decimal y de los registros (parámetro default de json.dumps)"""
+    if isinstance(obj, Decimal):
+        return decimal_to_number(obj)
+    if isinstance(obj, (DocumentMetadata, DocumentSummary)):
+        # Campos planos: no hace falta la copia recursiva de dataclasses.asdict
+        return {name: getattr(obj, name) for name in obj.__slots__}
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
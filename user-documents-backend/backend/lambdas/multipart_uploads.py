@@ -0,0 +1,434 @@
+"""
+Subidas multipart y reanudables para documentos grandes.
+
+El estado de la sesión se guarda en el mismo item pendiente del documento en
+UserDocuments (status "pending" + multipart_upload_id), de modo que un cliente
+puede reanudar tras un corte consultando qué partes ya recibió S3:
+
+    POST   /documents                                   "upload_mode": "multipart"
+    GET    /documents/{user_id}/{document_id}/upload            estado y partes recibidas
+    POST   /documents/{user_id}/{document_id}/upload/parts      URLs prefirmadas por parte
+    PUT    /documents/{user_id}/{document_id}/upload/parts/{n}  parte enviada a través de la Lambda
+    POST   /documents/{user_id}/{document_id}/complete          completar
+    DELETE /documents/{user_id}/{document_id}/upload            abortar
+
+Las partes enviadas a través de la Lambda están limitadas por el tamaño máximo
+del payload de invocación (MAX_REQUEST_BODY_BYTES, 6 MB): en base64 una parte
+de 5 MiB ocupa unos 7 MB, así que por la Lambda solo puede ir la última parte
+(o la única). El resto de partes se deben subir con las URLs prefirmadas.
+
+Al completar se comprueba que las partes forman el archivo entero: números
+consecutivos desde 1, todas salvo la última de al menos 5 MiB y, si el cliente
+los declaró (file_size al crear la sesión, o parts/file_size al completar),
+el tamaño total y las partes coinciden.
+
+Las sesiones abandonadas caducan por TTL en DynamoDB; el bucket debe tener una
+regla de ciclo de vida AbortIncompleteMultipartUpload para liberar sus partes.
+"""
+import base64
+import binascii
+import logging
+import time
+import uuid
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+from . import metrics
+from .aws_clients import get_client, get_table
+from .config import get_settings
+from .http_utils import create_response, parse_json_body
+from .routing import route
+from .schema import DEFAULT_CONTENT_TYPE, STATUS_PENDING, build_s3_key
+from .validation import request_size_error
+
+
+logger = logging.getLogger(__name__)
+
+# Límites de S3 para multipart upload
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_NUMBER = 10000
+# Máximo de URLs prefirmadas por request
+MAX_PRESIGNED_PARTS = 100
+
+
+def create_multipart_session(user_id, document_type, file_name, body):
+    """
+    Inicia el multipart upload en S3 y guarda la sesión como documento pendiente
+    """
+    content_type = body.get('content_type', DEFAULT_CONTENT_TYPE)
+    if not isinstance(content_type, str):
+        return create_response(400, {'error': 'content_type must be a string'})
+    # Tamaño total declarado (opcional): se comprueba al completar
+    expected_size = body.get('file_size')
+    if expected_size is not None and (not _is_size(expected_size) or expected_size < 1):
+        return create_response(400, {'error': 'file_size must be a positive integer'})
+
+    settings = get_settings()
+    s3_client = get_client('s3')
+    table = get_table()
+
+    document_id = str(uuid.uuid4())
+    s3_bucket = settings.bucket_name
+    s3_key = build_s3_key(user_id, document_type, document_id, file_name)
+
+    try:
+        multipart = s3_client.create_multipart_upload(Bucket=s3_bucket, Key=s3_key, ContentType=content_type)
+    except ClientError as e:
+        logger.error("S3 multipart initiate error: %s", e)
+        return create_response(500, {'error': 'Failed to start multipart upload'})
+
+    session_item = {
+        'document_id': document_id,
+        'user_id': user_id,
+        'document_type': document_type,
+        'file_name': file_name,
+        's3_bucket': s3_bucket,
+        's3_key': s3_key,
+        'content_type': content_type,
+        'status': STATUS_PENDING,
+        'multipart_upload_id': multipart['UploadId'],
+        'part_size': settings.multipart_part_size,
+        'created_at': datetime.utcnow().isoformat(),
+        'expires_at': int(time.time()) + settings.pending_upload_ttl
+    }
+    if expected_size is not None:
+        session_item['expected_size'] = expected_size
+
+    try:
+        table.put_item(Item=session_item)
+        logger.info("Multipart upload session created for document: %s", document_id)
+    except ClientError as e:
+        logger.error("DynamoDB put error: %s", e)
+        # Sin sesión el upload no se puede reanudar ni completar: abortarlo
+        try:
+            s3_client.abort_multipart_upload(Bucket=s3_bucket, Key=s3_key, UploadId=multipart['UploadId'])
+        except ClientError:
+            pass
+        return create_response(500, {'error': 'Failed to save document metadata'})
+
+    response_data = {
+        'message': 'Multipart upload session created',
+        'document_id': document_id,
+        'user_id': user_id,
+        'document_type': document_type,
+        'file_name': file_name,
+        'status': STATUS_PENDING,
+        'upload': {
+            'mode': 'multipart',
+            'part_size': settings.multipart_part_size,
+            'min_part_size': MIN_PART_SIZE,
+            'max_part_number': MAX_PART_NUMBER,
+            # Las partes por la Lambda van en base64 dentro del payload: solo la última cabe
+            'max_proxied_part_size': settings.max_request_body_bytes * 3 // 4
+        }
+    }
+    return create_response(201, response_data)
+
+
+def _load_session(user_id, document_id):
+    """
+    Carga la sesión multipart del documento.
+    Devuelve (item, None) o (None, respuesta de error).
+    """
+    try:
+        item = get_table().get_item(Key={'user_id': user_id, 'document_id': document_id}).get('Item')
+    except ClientError as e:
+        logger.error("DynamoDB get error: %s", e)
+        return None, create_response(500, {'error': 'Failed to query upload session'})
+
+    if not item or 'multipart_upload_id' not in item:
+        return None, create_response(404, {'error': 'Upload session not found'})
+    if item.get('status') != STATUS_PENDING:
+        return None, create_response(409, {'error': 'Upload session is already completed'})
+    return item, None
+
+
+def _is_size(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _parse_part_number(value):
+    """Valida un número de parte (1..10000). Devuelve None si no es válido."""
+    try:
+        part_number = int(value)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(value, bool) or part_number < 1 or part_number > MAX_PART_NUMBER:
+        return None
+    return part_number
+
+
+def list_uploaded_parts(s3_client, item):
+    """Partes ya recibidas por S3 (recorre todas las páginas de list_parts)"""
+    parts = []
+    kwargs = {'Bucket': item['s3_bucket'], 'Key': item['s3_key'], 'UploadId': item['multipart_upload_id']}
+    while True:
+        response = s3_client.list_parts(**kwargs)
+        parts.extend(response.get('Parts', []))
+        if not response.get('IsTruncated'):
+            return parts
+        kwargs['PartNumberMarker'] = response['NextPartNumberMarker']
+
+
+def parse_declared_parts(body):
+    """
+    Partes y tamaño declarados por el cliente al completar (opcionales):
+    {"parts": [{"part_number": 1, "etag": "..."}], "file_size": 123}.
+    Devuelve ((partes o None, tamaño o None), None) o (None, mensaje de error).
+    """
+    declared_parts = body.get('parts')
+    if declared_parts is not None:
+        if not isinstance(declared_parts, list) or not declared_parts:
+            return None, 'parts must be a non-empty list'
+        parsed = {}
+        for part in declared_parts:
+            number = _parse_part_number(part.get('part_number')) if isinstance(part, dict) else None
+            if number is None or not isinstance(part.get('etag'), str) or number in parsed:
+                return None, 'Each part must have a unique part_number and an etag'
+            parsed[number] = part['etag'].strip('"')
+        declared_parts = parsed
+    declared_size = body.get('file_size')
+    if declared_size is not None and not _is_size(declared_size):
+        return None, 'file_size must be an integer'
+    return (declared_parts, declared_size), None
+
+
+def check_parts(parts, expected_size=None, declared_parts=None):
+    """
+    Comprueba que las partes recibidas por S3 forman el archivo entero.
+    Devuelve None o (código de estado, mensaje de error).
+    """
+    numbers = [part['PartNumber'] for part in parts]
+    missing = sorted(set(range(1, numbers[-1] + 1)) - set(numbers))
+    if missing:
+        return 409, f'Missing parts: {", ".join(str(number) for number in missing[:20])}'
+    if declared_parts is not None and declared_parts != {
+        part['PartNumber']: part['ETag'].strip('"') for part in parts
+    }:
+        return 409, 'Uploaded parts do not match the declared parts'
+    too_small = [part['PartNumber'] for part in parts[:-1] if part['Size'] < MIN_PART_SIZE]
+    if too_small:
+        return 400, (f'Parts {", ".join(str(number) for number in too_small[:20])} are smaller than '
+                     f'{MIN_PART_SIZE} bytes (only the last part can be smaller; upload large parts '
+                     'with presigned URLs)')
+    file_size = sum(part['Size'] for part in parts)
+    if expected_size is not None and file_size != expected_size:
+        return 409, f'Uploaded size {file_size} does not match the declared file_size {expected_size}'
+    return None
+
+
+def complete_multipart_object(s3_client, item, declared_parts=None, declared_size=None):
+    """
+    Completa el multipart upload si las partes que S3 ha recibido forman el
+    archivo entero. Devuelve ((file_size, etag), None) o (None, respuesta de error).
+    """
+    parts = sorted(list_uploaded_parts(s3_client, item), key=lambda part: part['PartNumber'])
+    if not parts:
+        return None, create_response(409, {'error': 'No parts have been uploaded yet'})
+
+    expected_size = declared_size if declared_size is not None else item.get('expected_size')
+    error = check_parts(parts, None if expected_size is None else int(expected_size), declared_parts)
+    if error:
+        status_code, message = error
+        return None, create_response(status_code, {'error': message})
+
+    response = s3_client.complete_multipart_upload(
+        Bucket=item['s3_bucket'],
+        Key=item['s3_key'],
+        UploadId=item['multipart_upload_id'],
+        MultipartUpload={'Parts': [{'PartNumber': part['PartNumber'], 'ETag': part['ETag']} for part in parts]}
+    )
+    return (sum(part['Size'] for part in parts), response['ETag'].strip('"')), None
+
+
+@route('GET', '/documents/{user_id}/{document_id}/upload')
+@metrics.route('get_upload_session')
+def get_upload_session(event, user_id, document_id):
+    """
+    Estado de la sesión y partes recibidas (GET /documents/{user_id}/{document_id}/upload)
+    """
+    try:
+        item, error_response = _load_session(user_id, document_id)
+        if error_response:
+            return error_response
+
+        try:
+            parts = list_uploaded_parts(get_client('s3'), item)
+        except ClientError as e:
+            logger.error("S3 list parts error: %s", e)
+            return create_response(500, {'error': 'Failed to list uploaded parts'})
+
+        response_data = {
+            'document_id': item['document_id'],
+            'user_id': item['user_id'],
+            'document_type': item['document_type'],
+            'file_name': item['file_name'],
+            'status': item['status'],
+            'part_size': int(item['part_size']),
+            'parts': [
+                {'part_number': part['PartNumber'], 'size': part['Size'], 'etag': part['ETag'].strip('"')}
+                for part in parts
+            ]
+        }
+        return create_response(200, response_data)
+
+    except Exception as e:
+        logger.error("Unexpected error in get_upload_session: %s", e)
+        return create_response(500, {'error': 'Internal server error'})
+
+
+@route('POST', '/documents/{user_id}/{document_id}/upload/parts')
+@metrics.route('presign_upload_parts')
+def presign_upload_parts(event, user_id, document_id):
+    """
+    URLs prefirmadas para subir partes directamente a S3
+    (POST /documents/{user_id}/{document_id}/upload/parts)
+    """
+    try:
+        item, error_response = _load_session(user_id, document_id)
+        if error_response:
+            return error_response
+
+        body, error_response = parse_json_body(event)
+        if error_response:
+            return error_response
+
+        requested = body.get('part_numbers')
+        if not isinstance(requested, list) or not requested:
+            return create_response(400, {'error': 'part_numbers must be a non-empty list'})
+        if len(requested) > MAX_PRESIGNED_PARTS:
+            return create_response(400, {'error': f'At most {MAX_PRESIGNED_PARTS} part_numbers per request'})
+
+        part_numbers = [_parse_part_number(value) for value in requested]
+        if None in part_numbers:
+            return create_response(400, {'error': f'part_numbers must be integers between 1 and {MAX_PART_NUMBER}'})
+
+        s3_client = get_client('s3')
+        expires_in = get_settings().presigned_upload_expires
+        urls = []
+        for part_number in part_numbers:
+            urls.append({
+                'part_number': part_number,
+                'url': s3_client.generate_presigned_url(
+                    'upload_part',
+                    Params={
+                        'Bucket': item['s3_bucket'],
+                        'Key': item['s3_key'],
+                        'UploadId': item['multipart_upload_id'],
+                        'PartNumber': part_number
+                    },
+                    ExpiresIn=expires_in
+                )
+            })
+
+        return create_response(200, {'document_id': item['document_id'], 'expires_in': expires_in, 'parts': urls})
+
+    except Exception as e:
+        logger.error("Unexpected error in presign_upload_parts: %s", e)
+        return create_response(500, {'error': 'Internal server error'})
+
+
+@route('PUT', '/documents/{user_id}/{document_id}/upload/parts/{part_number}')
+@metrics.route('upload_part')
+def upload_part(event, user_id, document_id, part_number):
+    """
+    Sube una parte a través de la Lambda
+    (PUT /documents/{user_id}/{document_id}/upload/parts/{part_number})
+    """
+    try:
+        # El payload de Lambda no admite partes de 5 MiB en base64 (ver arriba)
+        error_message = request_size_error(event)
+        if error_message:
+            return create_response(413, {'error': error_message + '; upload large parts with presigned URLs'})
+
+        item, error_response = _load_session(user_id, document_id)
+        if error_response:
+            return error_response
+
+        part_number = _parse_part_number(part_number)
+        if part_number is None:
+            return create_response(400, {'error': f'part_number must be an integer between 1 and {MAX_PART_NUMBER}'})
+
+        # El cuerpo puede ser binario (isBase64Encoded) o JSON con part_content en base64
+        try:
+            if event.get('isBase64Encoded'):
+                part_bytes = base64.b64decode(event.get('body') or '', validate=True)
+            else:
+                body, error_response = parse_json_body(event)
+                if error_response:
+                    return error_response
+                if not isinstance(body.get('part_content'), str):
+                    return create_response(400, {'error': 'Missing required field: part_content'})
+                part_bytes = base64.b64decode(body['part_content'], validate=True)
+        except (binascii.Error, ValueError):
+            return create_response(400, {'error': 'Invalid part content - must be base64 encoded'})
+
+        if not part_bytes:
+            return create_response(400, {'error': 'Part content must not be empty'})
+
+        try:
+            response = get_client('s3').upload_part(
+                Bucket=item['s3_bucket'],
+                Key=item['s3_key'],
+                UploadId=item['multipart_upload_id'],
+                PartNumber=part_number,
+                Body=part_bytes
+            )
+        except ClientError as e:
+            logger.error("S3 upload part error: %s", e)
+            return create_response(500, {'error': 'Failed to upload part to S3'})
+
+        response_data = {
+            'document_id': item['document_id'],
+            'part_number': part_number,
+            'size': len(part_bytes),
+            'etag': response['ETag'].strip('"')
+        }
+        return create_response(200, response_data)
+
+    except Exception as e:
+        logger.error("Unexpected error in upload_part: %s", e)
+        return create_response(500, {'error': 'Internal server error'})
+
+
+@route('DELETE', '/documents/{user_id}/{document_id}/upload')
+@metrics.route('abort_upload')
+def abort_upload(event, user_id, document_id):
+    """
+    Aborta la sesión y libera las partes subidas (DELETE /documents/{user_id}/{document_id}/upload)
+    """
+    try:
+        item, error_response = _load_session(user_id, document_id)
+        if error_response:
+            return error_response
+
+        try:
+            get_client('s3').abort_multipart_upload(
+                Bucket=item['s3_bucket'],
+                Key=item['s3_key'],
+                UploadId=item['multipart_upload_id']
+            )
+        except ClientError as e:
+            # Si S3 ya no conoce el upload solo queda limpiar la sesión
+            if e.response['Error']['Code'] != 'NoSuchUpload':
+                logger.error("S3 abort error: %s", e)
+                return create_response(500, {'error': 'Failed to abort multipart upload'})
+
+        try:
+            get_table().delete_item(
+                Key={'user_id': item['user_id'], 'document_id': item['document_id']},
+                ConditionExpression='#status = :pending',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':pending': STATUS_PENDING}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                logger.error("DynamoDB delete error: %s", e)
+                return create_response(500, {'error': 'Failed to delete upload session'})
+
+        return create_response(200, {'message': 'Upload aborted', 'document_id': item['document_id']})
+
+    except Exception as e:
+        logger.error("Unexpected error in abort_upload: %s", e)
+        return create_response(500, {'error': 'Internal server error'})
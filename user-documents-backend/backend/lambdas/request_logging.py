@@ -0,0 +1,105 @@
+"""
+Logging estructurado y muestreado de requests.
+
+En lugar de serializar el evento completo (que incluye el archivo en base64)
+solo se registran los campos de enrutamiento, tamaños y tiempos. El cuerpo
+solo aparece en nivel DEBUG, con el contenido de los archivos redactado y
+truncado. Los mensajes se construyen de forma perezosa: si el nivel está
+deshabilitado no se serializa nada.
+"""
+import json
+import logging
+import random
+import re
+import time
+
+from .config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+# Campos del cuerpo que nunca se escriben en los logs
+REDACTED_FIELDS = ('file_content', 'part_content')
+_REDACT_PATTERN = re.compile(r'"(%s)"\s*:\s*"[^"]*"' % '|'.join(REDACTED_FIELDS))
+
+
+class LazyJson:
+    """Serializa el payload a JSON solo cuando el handler de logging lo formatea"""
+    __slots__ = ('payload',)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __str__(self):
+        return json.dumps(self.payload, separators=(',', ':'), default=str)
+
+
+def redact_body(body, max_chars):
+    """Cuerpo con los campos de contenido redactados y truncado a max_chars"""
+    if not isinstance(body, str):
+        body = json.dumps(body, default=str)
+    redacted = _REDACT_PATTERN.sub(lambda match: f'"{match.group(1)}":"<redacted>"', body)
+    if len(redacted) > max_chars:
+        return f"{redacted[:max_chars]}...<truncated {len(redacted) - max_chars} chars>"
+    return redacted
+
+
+def _body_size(event):
+    body = event.get('body')
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body)
+    return None
+
+
+class RequestLog:
+    """
+    Registro de una invocación: una línea al recibir la request y otra al
+    responder, con la duración. Las requests fuera de la muestra solo se
+    registran si fallan con un 5xx.
+    """
+    __slots__ = ('event', 'request_id', 'sampled', 'started')
+
+    def __init__(self, event, context):
+        self.event = event
+        self.request_id = getattr(context, 'aws_request_id', None)
+        self.sampled = random.random() < get_settings().log_sample_rate
+        self.started = time.perf_counter()
+
+    def _fields(self):
+        event = self.event
+        fields = {
+            'request_id': self.request_id,
+            'method': event.get('httpMethod'),
+            'path': event.get('path'),
+            'body_bytes': _body_size(event)
+        }
+        query = event.get('queryStringParameters')
+        if query:
+            fields['query'] = sorted(query)
+        return fields
+
+    def received(self):
+        if self.sampled and logger.isEnabledFor(logging.INFO):
+            fields = self._fields()
+            fields['event'] = 'request'
+            logger.info('%s', LazyJson(fields))
+        if self.sampled and logger.isEnabledFor(logging.DEBUG) and self.event.get('body') is not None:
+            logger.debug('Request body: %s',
+                         redact_body(self.event['body'], get_settings().log_body_preview_chars))
+
+    def completed(self, response):
+        status_code = response.get('statusCode') if isinstance(response, dict) else None
+        level = logging.ERROR if status_code is not None and status_code >= 500 else logging.INFO
+        if not (self.sampled or level == logging.ERROR) or not logger.isEnabledFor(level):
+            return
+
+        fields = self._fields()
+        fields.update({
+            'event': 'response',
+            'status': status_code,
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'response_bytes': len(response['body']) if isinstance(response.get('body'), str) else None
+        })
+        logger.log(level, '%s', LazyJson(fields))
@@ -0,0 +1,314 @@
+"""
+Política de reintentos, timeouts y throttling de las llamadas a S3 y DynamoDB.
+
+Se aplica a todos los clientes de aws_clients con eventos de botocore (como las
+métricas), sin cambiar las llamadas de los handlers:
+
+- Limitación adaptativa en el cliente: modo de reintentos 'adaptive' de
+  botocore, cuyo token bucket reduce la tasa de envío al recibir throttling.
+- Reintentos con backoff exponencial y jitter completo para el throttling
+  (ProvisionedThroughputExceededException, SlowDown...), los 5xx y los errores
+  de conexión. botocore hace un solo intento: los reintentos los decide
+  _needs_retry, que no reintenta si la espera más otro intento no caben en el
+  plazo de la invocación.
+- Plazo de la invocación: context.get_remaining_time_in_millis() menos
+  DEADLINE_MARGIN (el tiempo para construir la respuesta). Agotado el plazo
+  las llamadas fallan sin enviarse.
+- Timeouts por llamada: connect/read timeout del cliente de cada servicio.
+- Circuit breaker por servicio y contenedor: tras CIRCUIT_FAILURE_THRESHOLD
+  llamadas abandonadas consecutivas (cada una con sus reintentos, así que una
+  sola request con throttling no abre el circuito) las llamadas fallan de
+  inmediato durante CIRCUIT_RESET_TIMEOUT; después se deja pasar una llamada
+  de prueba.
+- Llamadas no idempotentes (como el ADD ref_count de dedup), dentro de
+  non_idempotent(): solo se reintenta el throttling, que rechaza la llamada
+  sin aplicarla; un 5xx o un timeout pueden haberla aplicado.
+
+Cuando una llamada se abandona por sobrecarga (reintentos agotados, circuito
+abierto o plazo agotado), el 500 del handler se convierte en un 503 con
+Retry-After (ver overload_response).
+"""
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from botocore.exceptions import ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as BotocoreConnectionError
+
+from . import metrics
+from .config import get_settings
+from .http_utils import create_response
+
+
+# Errores de throttling de S3 y DynamoDB
+THROTTLING_ERRORS = frozenset((
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'Throttling',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+    'SlowDown',
+    'RequestThrottled'
+))
+
+# Errores transitorios del servicio
+TRANSIENT_ERRORS = frozenset((
+    'InternalError',
+    'InternalServerError',
+    'ServiceUnavailable',
+    'RequestTimeout',
+    'RequestTimeoutException'
+))
+
+# Códigos de los errores generados por la política (no llegan a AWS)
+CIRCUIT_OPEN = 'CircuitOpen'
+DEADLINE_EXCEEDED = 'DeadlineExceeded'
+
+# Tiempo mínimo que debe quedar en el plazo para lanzar otro intento
+MIN_ATTEMPT_SECONDS = 0.1
+
+THROTTLED = 'throttled'
+TRANSIENT = 'transient'
+
+
+class _Request:
+    """Estado de la invocación compartido con los hilos del pool"""
+    __slots__ = ('deadline', 'retry_after')
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        # Segundos de Retry-After si alguna llamada se abandonó por sobrecarga
+        self.retry_after = None
+
+    def overloaded(self, retry_after):
+        self.retry_after = max(self.retry_after or 0, retry_after)
+
+
+_current = ContextVar('resilience_request', default=None)
+
+
+_non_idempotent = ContextVar('resilience_non_idempotent', default=False)
+
+
+@contextmanager
+def non_idempotent():
+    """Las llamadas del bloque solo se reintentan si fueron rechazadas por throttling"""
+    token = _non_idempotent.set(True)
+    try:
+        yield
+    finally:
+        _non_idempotent.reset(token)
+
+
+def start_request(context):
+    """
+    Abre el plazo de una invocación a partir del context de Lambda (sin
+    context, o fuera de Lambda, no hay plazo). Devuelve un token para
+    finish_request.
+    """
+    deadline = None
+    get_remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if get_remaining is not None:
+        deadline = time.monotonic() + get_remaining() / 1000 - get_settings().deadline_margin
+    return _current.set(_Request(deadline))
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def remaining_time():
+    """Segundos que quedan en el plazo de la invocación, o None si no hay plazo"""
+    request = _current.get()
+    if request is None or request.deadline is None:
+        return None
+    return request.deadline - time.monotonic()
+
+
+def _mark_overloaded(retry_after=1):
+    request = _current.get()
+    if request is not None:
+        request.overloaded(retry_after)
+
+
+def overload_response(response):
+    """
+    Convierte el 500 de una request abandonada por sobrecarga en un 503 con
+    Retry-After, para que el cliente reintente más tarde
+    """
+    request = _current.get()
+    if request is None or request.retry_after is None or response.get('statusCode') != 500:
+        return response
+    return create_response(503, {'error': 'Service temporarily unavailable, please retry later'},
+                           {'Retry-After': str(request.retry_after)})
+
+
+class CircuitBreaker:
+    """
+    Circuito de un servicio: se abre tras failure_threshold llamadas fallidas
+    consecutivas y, pasado reset_timeout, deja pasar una llamada de prueba
+    (un éxito lo cierra, un fallo lo vuelve a abrir)
+    """
+
+    def __init__(self, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._half_open = False
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        """True si la llamada puede enviarse"""
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = self._clock()
+            if now - self._opened_at >= self.reset_timeout:
+                # Una llamada de prueba por intervalo
+                self._opened_at = now
+                self._half_open = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._half_open = False
+
+    def record_failure(self):
+        """Registra una llamada fallida. Devuelve True si el circuito se abrió."""
+        if self.failure_threshold <= 0:
+            return False
+        with self._lock:
+            self._failures += 1
+            if self._half_open or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = self._clock()
+                self._half_open = False
+                return True
+            return False
+
+
+_lock = threading.Lock()
+_breakers = {}
+
+
+def get_breaker(service_name):
+    """Circuito del servicio (uno por contenedor)"""
+    breaker = _breakers.get(service_name)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.get(service_name)
+            if breaker is None:
+                settings = get_settings()
+                breaker = CircuitBreaker(settings.circuit_failure_threshold, settings.circuit_reset_timeout)
+                _breakers[service_name] = breaker
+    return breaker
+
+
+def reset_breakers():
+    """Descarta el estado de los circuitos (usado en pruebas)"""
+    with _lock:
+        _breakers.clear()
+
+
+def classify_failure(response=None, caught_exception=None):
+    """THROTTLED, TRANSIENT o None (éxito o error no reintentable) de un intento"""
+    if caught_exception is not None:
+        # Timeouts y errores de conexión (ConnectTimeout, ReadTimeout...)
+        if isinstance(caught_exception, (BotocoreConnectionError, HTTPClientError)):
+            return TRANSIENT
+        return None
+    if response is None:
+        return None
+    http_response, parsed = response
+    code = parsed.get('Error', {}).get('Code')
+    if code in THROTTLING_ERRORS or http_response.status_code == 429:
+        return THROTTLED
+    if code in TRANSIENT_ERRORS or http_response.status_code in (500, 502, 503, 504):
+        return TRANSIENT
+    return None
+
+
+def retry_delay(attempts, settings=None):
+    """Espera exponencial con jitter completo antes del intento attempts + 1"""
+    if settings is None:
+        settings = get_settings()
+    return random.uniform(0, min(settings.retry_max_delay, settings.retry_base_delay * (2 ** (attempts - 1))))
+
+
+def _policy_error(code, message, operation_name):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation_name)
+
+
+def _before_call(model=None, **kwargs):
+    """Falla sin enviar la llamada si el circuito está abierto o el plazo se agotó"""
+    service = model.service_model.service_name
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        metrics.put_metric('DeadlineExceeded', 1)
+        _mark_overloaded()
+        raise _policy_error(DEADLINE_EXCEEDED, 'Request deadline exceeded before calling AWS', model.name)
+    breaker = get_breaker(service)
+    if not breaker.allow():
+        metrics.put_metric('CircuitOpen', 1)
+        _mark_overloaded(math.ceil(breaker.reset_timeout))
+        raise _policy_error(CIRCUIT_OPEN, f'Circuit open for {service}', model.name)
+
+
+def _needs_retry(response=None, attempts=None, caught_exception=None, operation=None, **kwargs):
+    """
+    Handler de needs-retry: devuelve la espera antes del siguiente intento o
+    None si no se reintenta
+    """
+    settings = get_settings()
+    breaker = get_breaker(operation.service_model.service_name)
+    failure = classify_failure(response, caught_exception)
+    if failure is None:
+        breaker.record_success()
+        return None
+
+    if failure == THROTTLED:
+        metrics.put_metric('AwsThrottled', 1)
+    elif _non_idempotent.get():
+        # El intento pudo aplicarse: reintentarlo podría repetir la escritura
+        _give_up(breaker, settings)
+        return None
+    if attempts >= settings.max_attempts or breaker.is_open:
+        _give_up(breaker, settings)
+        return None
+
+    delay = retry_delay(attempts, settings)
+    remaining = remaining_time()
+    if remaining is not None and delay + MIN_ATTEMPT_SECONDS > remaining:
+        # Otro intento no cabe en el plazo: se responde a tiempo con 503
+        metrics.put_metric('DeadlineExceeded', 1)
+        _give_up(breaker, settings)
+        return None
+    return delay
+
+
+def _give_up(breaker, settings):
+    """La llamada se abandona: cuenta como un fallo del circuito"""
+    if breaker.record_failure():
+        metrics.put_metric('CircuitOpened', 1)
+    _mark_overloaded(math.ceil(settings.circuit_reset_timeout) if breaker.is_open else 1)
+
+
+def apply_policy(client):
+    """Registra la política en los eventos de botocore del cliente"""
+    events = client.meta.events
+    events.register('before-call.*.*', _before_call, unique_id='resilience-before-call')
+    events.register('needs-retry.*.*', _needs_retry, unique_id='resilience-needs-retry')
+    return client
@@ -0,0 +1,90 @@
+"""
+Enrutado de las requests HTTP de API Gateway.
+
+Los handlers se registran con el decorador route y su patrón se compila al
+registrarlos (al importar el módulo) en una tabla método -> [(regex, handler)].
+Los parámetros del path ("{user_id}", o "{name:regex}" con una expresión
+propia) se pasan al handler como argumentos con nombre:
+
+    @route('GET', '/documents/{user_id}/{document_type}')
+    def get_document(event, user_id, document_type):
+        ...
+
+Un path que existe con otro método devuelve 405 (con el header Allow) y uno
+que no existe, 404.
+"""
+import re
+from collections import namedtuple
+
+from .http_utils import create_response
+
+
+Route = namedtuple('Route', ['method', 'pattern', 'regex', 'handler'])
+
+_PARAMETER = re.compile(r'\{(\w+)(?::([^{}]+))?\}')
+# Un parámetro ocupa un segmento completo y no vacío
+_DEFAULT_SEGMENT = '[^/]+'
+
+
+def compile_pattern(pattern):
+    """Convierte "/documents/{user_id}" en una expresión con grupos con nombre"""
+    regex = ''
+    position = 0
+    for match in _PARAMETER.finditer(pattern):
+        regex += re.escape(pattern[position:match.start()])
+        regex += f'(?P<{match.group(1)}>{match.group(2) or _DEFAULT_SEGMENT})'
+        position = match.end()
+    regex += re.escape(pattern[position:])
+    return re.compile(regex)
+
+
+class Router:
+    """Tabla de rutas por método HTTP"""
+
+    def __init__(self):
+        self._routes = {}
+
+    def add(self, method, pattern, handler):
+        self._routes.setdefault(method.upper(), []).append(
+            Route(method.upper(), pattern, compile_pattern(pattern), handler)
+        )
+
+    def route(self, method, pattern):
+        """Decorador que registra el handler para el método y el patrón"""
+        def decorator(handler):
+            self.add(method, pattern, handler)
+            return handler
+        return decorator
+
+    def match(self, method, path):
+        """Devuelve (handler, parámetros) o (None, None). Gana la primera ruta registrada."""
+        for route in self._routes.get(method, ()):
+            match = route.regex.fullmatch(path)
+            if match:
+                return route.handler, match.groupdict()
+        return None, None
+
+    def allowed_methods(self, path):
+        """Métodos con alguna ruta para el path (para el 405)"""
+        return sorted(
+            method for method, routes in self._routes.items()
+            if any(route.regex.fullmatch(path) for route in routes)
+        )
+
+    def dispatch(self, event):
+        """Ejecuta el handler de la request, o devuelve 404/405"""
+        method = (event.get('httpMethod') or '').upper()
+        path = event.get('path') or ''
+        handler, params = self.match(method, path)
+        if handler is not None:
+            return handler(event, **params)
+
+        allowed = self.allowed_methods(path)
+        if allowed:
+            return create_response(405, {'error': 'Method not allowed'}, {'Allow': ', '.join(allowed)})
+        return create_response(404, {'error': 'Route not found'})
+
+
+# Router de la API; los módulos de handlers registran sus rutas al importarse
+router = Router()
+route = router.route
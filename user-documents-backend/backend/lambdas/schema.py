@@ -0,0 +1,141 @@
+"""
+Definición de la tabla UserDocuments y de sus índices secundarios
+"""
+
+# Índice para resolver "el documento más reciente de un tipo" con una sola lectura:
+# HASH user_id + RANGE "{document_type}#{upload_date}"
+TYPE_DATE_INDEX = 'UserDocumentTypeDateIndex'
+TYPE_DATE_ATTRIBUTE = 'type_date'
+TYPE_DATE_SEPARATOR = '#'
+
+
+def build_type_date(document_type, upload_date):
+    """Construye la clave compuesta de ordenación tipo#fecha"""
+    return f"{document_type}{TYPE_DATE_SEPARATOR}{upload_date}"
+
+
+def type_date_prefix(document_type):
+    """Prefijo de la clave compuesta para todos los documentos de un tipo"""
+    return f"{document_type}{TYPE_DATE_SEPARATOR}"
+
+
+# Índice para listar los documentos de un usuario por fecha de subida:
+# HASH user_id + RANGE upload_date. Como type_date, es disperso: los items
+# pendientes no tienen upload_date y no aparecen en los listados.
+UPLOAD_DATE_INDEX = 'UserDocumentUploadDateIndex'
+UPLOAD_DATE_ATTRIBUTE = 'upload_date'
+
+# Atributos que devuelve el listado (solo metadatos, sin claves de S3)
+LIST_ATTRIBUTES = ('document_id', 'document_type', 'file_name', 'file_size', 'upload_date')
+
+
+# Estados de un documento subido en varios pasos (subida directa o multipart).
+# Los documentos subidos en una sola request no llevan estado.
+STATUS_PENDING = 'pending'
+STATUS_COMMITTED = 'committed'
+
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+
+def build_s3_key(user_id, document_type, document_id, file_name):
+    """Key de S3 de un documento"""
+    return f"{user_id}/{document_type}/{document_id}_{file_name}"
+
+
+# Blobs de contenido deduplicado (ver dedup.py)
+BLOB_ID_PREFIX = 'BLOB#'
+BLOB_S3_PREFIX = 'blobs'
+
+
+def blob_item_id(content_sha256):
+    """document_id del item de referencias de un blob"""
+    return f"{BLOB_ID_PREFIX}{content_sha256}"
+
+
+def build_blob_s3_key(user_id, content_sha256):
+    """Key de S3 de un blob (no tiene el formato de documento de parse_s3_key)"""
+    return f"{user_id}/{BLOB_S3_PREFIX}/{content_sha256}"
+
+
+# Puntero a la versión más reciente de cada tipo (ver versions.py)
+LATEST_ID_PREFIX = 'LATEST#'
+
+
+def latest_item_id(document_type):
+    """document_id del puntero a la versión más reciente del tipo"""
+    return f"{LATEST_ID_PREFIX}{document_type}"
+
+
+# Registros de idempotencia de POST /documents (ver idempotency.py)
+IDEMPOTENCY_ID_PREFIX = 'IDEMPOTENCY#'
+
+
+def idempotency_item_id(idempotency_key):
+    """document_id del registro de una Idempotency-Key"""
+    return f"{IDEMPOTENCY_ID_PREFIX}{idempotency_key}"
+
+
+def parse_s3_key(s3_key):
+    """
+    Extrae (user_id, document_type, document_id) de una key de S3 de documento.
+    Devuelve None si la key no tiene el formato esperado.
+    """
+    parts = s3_key.split('/', 2)
+    if len(parts) != 3 or '_' not in parts[2]:
+        return None
+    user_id, document_type, object_name = parts
+    document_id = object_name.split('_', 1)[0]
+    if not user_id or not document_type or not document_id:
+        return None
+    return user_id, document_type, document_id
+
+
+KEY_SCHEMA = [
+    {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+    {'AttributeName': 'document_id', 'KeyType': 'RANGE'}
+]
+
+ATTRIBUTE_DEFINITIONS = [
+    {'AttributeName': 'user_id', 'AttributeType': 'S'},
+    {'AttributeName': 'document_id', 'AttributeType': 'S'},
+    {'AttributeName': TYPE_DATE_ATTRIBUTE, 'AttributeType': 'S'},
+    {'AttributeName': UPLOAD_DATE_ATTRIBUTE, 'AttributeType': 'S'}
+]
+
+TYPE_DATE_INDEX_DEFINITION = {
+    'IndexName': TYPE_DATE_INDEX,
+    'KeySchema': [
+        {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+        {'AttributeName': TYPE_DATE_ATTRIBUTE, 'KeyType': 'RANGE'}
+    ],
+    'Projection': {'ProjectionType': 'ALL'}
+}
+
+# Proyección reducida: el listado no necesita el resto de atributos
+UPLOAD_DATE_INDEX_DEFINITION = {
+    'IndexName': UPLOAD_DATE_INDEX,
+    'KeySchema': [
+        {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+        {'AttributeName': UPLOAD_DATE_ATTRIBUTE, 'KeyType': 'RANGE'}
+    ],
+    'Projection': {
+        'ProjectionType': 'INCLUDE',
+        'NonKeyAttributes': [name for name in LIST_ATTRIBUTES if name not in ('document_id', UPLOAD_DATE_ATTRIBUTE)]
+    }
+}
+
+GLOBAL_SECONDARY_INDEXES = [TYPE_DATE_INDEX_DEFINITION, UPLOAD_DATE_INDEX_DEFINITION]
+
+
+def table_definition(table_name='UserDocuments'):
+    """
+    Parámetros de create_table para la tabla de documentos (usado por la
+    migración y por las pruebas)
+    """
+    return {
+        'TableName': table_name,
+        'KeySchema': KEY_SCHEMA,
+        'AttributeDefinitions': ATTRIBUTE_DEFINITIONS,
+        'GlobalSecondaryIndexes': GLOBAL_SECONDARY_INDEXES,
+        'BillingMode': 'PAY_PER_REQUEST'
+    }
@@ -0,0 +1,227 @@
+"""
+Compresión transparente de los documentos guardados en S3 (opcional,
+STORAGE_CODEC=gzip|deflate).
+
+Al subir se detecta el tipo de contenido por sus primeros bytes y solo se
+comprime lo que se beneficia (texto, XML/JSON, TIFF y BMP sin comprimir, PDF
+sin streams comprimidos). JPEG, PNG, ZIP/Office, PDF comprimidos, etc. se
+guardan tal cual. El codec se guarda en los metadatos (content_encoding) y como
+ContentEncoding del objeto, de modo que las URLs prefirmadas también funcionan
+en los navegadores.
+
+Los documentos mayores que COMPRESSION_MAX_BYTES no se comprimen, de modo que
+un rango de un documento grande se lee de S3 como rango de bytes. Un rango de
+un documento comprimido solo lee y descomprime hasta el final del rango.
+
+Al leer, el contenido se descomprime o se sirve con Content-Encoding si el
+cliente lo acepta (Accept-Encoding).
+"""
+import gzip
+import struct
+import zlib
+
+from .config import get_settings
+from .upload_stream import SpooledContent
+
+
+CODEC_NONE = 'none'
+# Valor guardado cuando el objeto no está comprimido (if_not_exists no admite "ausente")
+IDENTITY = 'identity'
+
+CODECS = {
+    'gzip': (
+        lambda data, level: gzip.compress(data, compresslevel=level, mtime=0),
+        gzip.decompress
+    ),
+    'deflate': (
+        lambda data, level: zlib.compress(data, level),
+        zlib.decompress
+    )
+}
+
+# Solo se guarda comprimido si ahorra al menos un 10%
+MIN_SAVINGS_RATIO = 0.9
+
+_COMPRESSED_SIGNATURES = (
+    b'\xff\xd8\xff',        # JPEG
+    b'\x89PNG\r\n\x1a\n',   # PNG
+    b'GIF8',                # GIF
+    b'PK\x03\x04',          # ZIP, docx/xlsx/odt
+    b'\x1f\x8b',            # gzip
+    b'BZh',                 # bzip2
+    b'\xfd7zXZ\x00',        # xz
+    b"7z\xbc\xaf'\x1c",     # 7z
+    b'RIFF',                # WebP, WAV, AVI
+    b'\x00\x00\x00\x0cjP',  # JPEG 2000
+)
+_PDF_COMPRESSED_FILTERS = (b'/FlateDecode', b'/DCTDecode', b'/JPXDecode', b'/JBIG2Decode',
+                           b'/CCITTFaxDecode', b'/LZWDecode', b'/ObjStm')
+_TEXT_CONTENT_TYPES = ('application/json', 'application/xml', 'application/javascript',
+                       'application/x-yaml', 'image/svg+xml')
+_TEXT_SNIFF_BYTES = 4096
+
+
+def _tiff_uncompressed(data):
+    """TIFF cuyo primer IFD declara Compression = 1 (sin comprimir)"""
+    try:
+        endian = '<' if data[:2] == b'II' else '>'
+        (ifd_offset,) = struct.unpack_from(endian + 'I', data, 4)
+        (entries,) = struct.unpack_from(endian + 'H', data, ifd_offset)
+        for index in range(entries):
+            tag, field_type, _, value = struct.unpack_from(endian + 'HHI4s', data, ifd_offset + 2 + index * 12)
+            if tag == 259:  # Compression
+                fmt = 'H' if field_type == 3 else 'I'
+                return struct.unpack_from(endian + fmt, value)[0] == 1
+    except struct.error:
+        return False
+    # Sin tag Compression el valor por defecto es 1
+    return True
+
+
+def _looks_like_text(data):
+    sample = data[:_TEXT_SNIFF_BYTES]
+    if b'\x00' in sample:
+        return False
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # La muestra puede cortar un carácter multibyte al final
+        return e.start >= len(sample) - 3 and len(sample) == _TEXT_SNIFF_BYTES
+    return True
+
+
+def is_compressible(data, content_type=None):
+    """Decide por el contenido (y el tipo declarado) si merece la pena comprimir"""
+    if data.startswith(_COMPRESSED_SIGNATURES):
+        return False
+    if data.startswith(b'%PDF'):
+        return not any(marker in data for marker in _PDF_COMPRESSED_FILTERS)
+    if data.startswith((b'II*\x00', b'MM\x00*')):
+        return _tiff_uncompressed(data)
+    if data.startswith(b'BM') and len(data) >= 34:
+        # BI_RGB (0) o BI_BITFIELDS (3): píxeles sin comprimir
+        return struct.unpack_from('<I', data, 30)[0] in (0, 3)
+
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type.startswith('text/') or content_type in _TEXT_CONTENT_TYPES \
+            or content_type.endswith(('+xml', '+json')):
+        return True
+    return _looks_like_text(data)
+
+
+def encode(data, codec, level=None):
+    """Comprime con el codec indicado (IDENTITY o None: sin cambios)"""
+    if codec in (None, IDENTITY):
+        return data
+    if level is None:
+        level = get_settings().storage_codec_level
+    return CODECS[codec][0](data, level)
+
+
+def _within_limits(size, settings):
+    """Tamaño comprendido entre COMPRESSION_MIN_BYTES y COMPRESSION_MAX_BYTES"""
+    if size < settings.compression_min_bytes:
+        return False
+    return settings.compression_max_bytes <= 0 or size <= settings.compression_max_bytes
+
+
+def encode_for_storage(data, content_type=None):
+    """
+    Contenido a guardar y su codec según la configuración. Devuelve
+    (bytes, codec) o (data, IDENTITY) si no se comprime.
+    """
+    settings = get_settings()
+    codec = settings.storage_codec
+    if codec == CODEC_NONE or not _within_limits(len(data), settings):
+        return data, IDENTITY
+    if not is_compressible(data, content_type):
+        return data, IDENTITY
+    compressed = encode(data, codec, settings.storage_codec_level)
+    if len(compressed) > len(data) * MIN_SAVINGS_RATIO:
+        return data, IDENTITY
+    return compressed, codec
+
+
+def _wbits(codec):
+    """Formato de zlib de cada codec (cabecera gzip o zlib)"""
+    return 16 + zlib.MAX_WBITS if codec == 'gzip' else zlib.MAX_WBITS
+
+
+def _compressor(codec, level):
+    """Compresor incremental equivalente a CODECS[codec]"""
+    return zlib.compressobj(level, zlib.DEFLATED, _wbits(codec))
+
+
+def encode_content(upload, codec, level=None):
+    """Como encode, pero de un SpooledContent a otro sin leerlo entero"""
+    if codec in (None, IDENTITY):
+        return upload
+    if level is None:
+        level = get_settings().storage_codec_level
+    compressor = _compressor(codec, level)
+    output = SpooledContent(get_settings().upload_spool_max_bytes)
+    for chunk in upload.chunks():
+        output.write(compressor.compress(chunk))
+    output.write(compressor.flush())
+    return output
+
+
+def encode_content_for_storage(upload, content_type=None):
+    """
+    Como encode_for_storage para un SpooledContent (se decide por sus
+    primeros bytes). Devuelve (SpooledContent, codec) o (upload, IDENTITY).
+    """
+    settings = get_settings()
+    codec = settings.storage_codec
+    if codec == CODEC_NONE or not _within_limits(upload.size, settings):
+        return upload, IDENTITY
+    if not is_compressible(upload.head, content_type):
+        return upload, IDENTITY
+    compressed = encode_content(upload, codec, settings.storage_codec_level)
+    if compressed.size > upload.size * MIN_SAVINGS_RATIO:
+        compressed.close()
+        return upload, IDENTITY
+    return compressed, codec
+
+
+def decode(data, codec):
+    """Descomprime el contenido guardado"""
+    if codec in (None, IDENTITY):
+        return data
+    return CODECS[codec][1](data)
+
+
+def decode_prefix(stream, codec, length, chunk_size=64 * 1024):
+    """
+    Primeros length bytes del contenido descomprimido de stream (el Body de
+    S3), sin leer ni descomprimir el resto del objeto
+    """
+    if codec in (None, IDENTITY):
+        return stream.read(length)
+    decompressor = zlib.decompressobj(_wbits(codec))
+    output = bytearray()
+    while len(output) < length and not decompressor.eof:
+        data = decompressor.unconsumed_tail or stream.read(chunk_size)
+        if not data:
+            break
+        output += decompressor.decompress(data, length - len(output))
+    return bytes(output)
+
+
+def accepts_encoding(accept_encoding, codec):
+    """Indica si el header Accept-Encoding admite el codec (q > 0)"""
+    if not accept_encoding or codec in (None, IDENTITY):
+        return False
+    for entry in accept_encoding.split(','):
+        name, _, params = entry.strip().partition(';')
+        name = name.strip().lower()
+        if name not in (codec, '*'):
+            continue
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
@@ -0,0 +1,179 @@
+"""
+Decodificación incremental del contenido de POST /documents.
+
+El cuerpo de la request (un string JSON) es inevitable, pero file_content no se
+copia de nuevo: se localiza su posición en el cuerpo y el base64 se decodifica
+por bloques hacia un SpooledTemporaryFile (en memoria hasta
+UPLOAD_SPOOL_MAX_BYTES, después en /tmp). El tamaño y los checksums (MD5 para
+ETag/Content-MD5, SHA-256 para la deduplicación) se calculan al vuelo y S3
+recibe el archivo como stream, de modo que el pico de memoria no depende del
+tamaño del documento.
+"""
+import base64
+import binascii
+import hashlib
+import json
+import re
+import tempfile
+
+from .http_utils import parse_json_body
+
+
+# Bloque de base64 leído del cuerpo en cada paso (múltiplo de 4)
+DECODE_CHUNK_CHARS = 256 * 1024
+# Bytes iniciales que se conservan para detectar el tipo de contenido
+HEAD_BYTES = 64 * 1024
+
+_FILE_CONTENT_PATTERN = re.compile(r'"file_content"\s*:\s*"')
+_BASE64_ALPHABET = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/='
+# Caracteres que base64.b64decode descarta sin validar
+_NON_BASE64 = bytes(set(range(128)) - set(_BASE64_ALPHABET))
+_UNICODE_ESCAPE_TAIL = re.compile(r'\\u[0-9a-fA-F]{0,3}$')
+
+
+class SpooledContent:
+    """
+    Contenido binario acumulado en un SpooledTemporaryFile con su tamaño,
+    los primeros bytes y los checksums calculados al escribir
+    """
+
+    def __init__(self, max_memory, sha256=False):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        self.size = 0
+        self.head = b''
+        self._md5 = hashlib.md5()
+        self._sha256 = hashlib.sha256() if sha256 else None
+
+    def write(self, data):
+        if not data:
+            return
+        if len(self.head) < HEAD_BYTES:
+            self.head += data[:HEAD_BYTES - len(self.head)]
+        self._md5.update(data)
+        if self._sha256 is not None:
+            self._sha256.update(data)
+        self.file.write(data)
+        self.size += len(data)
+
+    @property
+    def md5_hex(self):
+        """MD5 en hex (ETag de S3 para una subida simple)"""
+        return self._md5.hexdigest()
+
+    @property
+    def content_md5(self):
+        """MD5 en base64 para el header Content-MD5"""
+        return base64.b64encode(self._md5.digest()).decode('ascii')
+
+    @property
+    def sha256_hex(self):
+        return self._sha256.hexdigest() if self._sha256 is not None else None
+
+    def chunks(self, chunk_size=DECODE_CHUNK_CHARS):
+        """Relee el contenido por bloques desde el principio"""
+        self.file.seek(0)
+        while True:
+            data = self.file.read(chunk_size)
+            if not data:
+                return
+            yield data
+
+    def stream(self):
+        """El archivo posicionado al principio, para usarlo como Body de S3"""
+        self.file.seek(0)
+        return self.file
+
+    def read(self):
+        return b''.join(self.chunks())
+
+    def close(self):
+        self.file.close()
+
+
+def _string_end(text, start):
+    """Posición de la comilla que cierra el string JSON que empieza en start"""
+    position = start
+    while True:
+        position = text.find('"', position)
+        if position < 0:
+            return None
+        backslashes = 0
+        while text[position - 1 - backslashes] == '\\':
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return position
+        position += 1
+
+
+def parse_upload_body(event):
+    """
+    Como parse_json_body, pero sin materializar file_content.
+    Devuelve ((body, contenido), None) o (None, respuesta de error), donde
+    contenido es (texto, inicio, fin) del base64 dentro del cuerpo. En el body
+    devuelto file_content queda vacío.
+    """
+    raw = event.get('body')
+    if isinstance(raw, str):
+        match = _FILE_CONTENT_PATTERN.search(raw)
+        end = _string_end(raw, match.end()) if match else None
+        if end is not None:
+            try:
+                body = json.loads(raw[:match.end()] + raw[end:])
+            except json.JSONDecodeError:
+                body = None
+            # La coincidencia debe ser la clave de primer nivel (no una anidada)
+            if isinstance(body, dict) and body.get('file_content') == '':
+                return (body, (raw, match.end(), end)), None
+
+    body, error_response = parse_json_body(event)
+    if error_response:
+        return None, error_response
+    file_content = body.get('file_content')
+    content = (file_content, 0, len(file_content)) if isinstance(file_content, str) else None
+    return (body, content), None
+
+
+def _unescape(piece):
+    """Resuelve las secuencias de escape JSON (p. ej. \\/ o \\n) de un bloque"""
+    return json.loads('"' + piece + '"')
+
+
+def decode_base64_content(content, max_memory, sha256=False, chunk_chars=DECODE_CHUNK_CHARS):
+    """
+    Decodifica por bloques el base64 de content (texto, inicio, fin).
+    Devuelve (SpooledContent, None) o (None, mensaje de error).
+    """
+    error_message = 'Invalid file_content - must be base64 encoded'
+    if content is None:
+        return None, error_message
+    text, position, end = content
+
+    output = SpooledContent(max_memory, sha256=sha256)
+    carry = b''
+    try:
+        while position < end:
+            stop = min(position + chunk_chars, end)
+            piece = text[position:stop]
+            if '\\' in piece:
+                # No cortar una secuencia de escape entre dos bloques
+                trailing = len(piece) - len(piece.rstrip('\\'))
+                if trailing % 2 and stop < end:
+                    stop += 1
+                    piece = text[position:stop]
+                unicode_tail = _UNICODE_ESCAPE_TAIL.search(piece)
+                if unicode_tail and stop < end:
+                    stop = min(stop + 6 - len(unicode_tail.group()), end)
+                    piece = text[position:stop]
+                piece = _unescape(piece)
+            position = stop
+
+            data = carry + piece.encode('ascii').translate(None, _NON_BASE64)
+            usable = len(data) - len(data) % 4
+            carry = data[usable:]
+            output.write(binascii.a2b_base64(data[:usable]))
+        if carry:
+            output.write(binascii.a2b_base64(carry))
+    except (binascii.Error, UnicodeEncodeError, ValueError):
+        output.close()
+        return None, error_message
+    return output, None
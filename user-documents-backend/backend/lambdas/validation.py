@@ -0,0 +1,120 @@
+"""
+Validación de los campos de subida de documentos, compartida por
+POST /documents y POST /documents/batch
+
+Las comprobaciones de tamaño se hacen antes de parsear y de decodificar, para
+rechazar los payloads demasiado grandes sin pagar su coste.
+"""
+import base64
+import os
+
+from .config import get_settings
+from .http_utils import get_header
+from .schema import TYPE_DATE_SEPARATOR
+
+
+def request_size_error(event, max_body_bytes=None):
+    """
+    Comprueba el tamaño del cuerpo antes de parsearlo: el declarado
+    (Content-Length) y el real. Devuelve un mensaje de error o None.
+    """
+    if max_body_bytes is None:
+        max_body_bytes = get_settings().max_request_body_bytes
+    try:
+        declared = int(get_header(event, 'Content-Length') or 0)
+    except ValueError:
+        declared = 0
+    body = event.get('body')
+    actual = len(body) if isinstance(body, (str, bytes)) else 0
+    if max(declared, actual) > max_body_bytes:
+        return f'Request body exceeds {max_body_bytes} bytes'
+    return None
+
+
+def estimated_decoded_size(content):
+    """
+    Tamaño decodificado del base64 de content (texto, inicio, fin), exacto
+    salvo saltos de línea o escapes (que lo sobrestiman ligeramente)
+    """
+    text, start, end = content
+    padding = text.count('=', max(end - 2, start), end)
+    return max((end - start) * 3 // 4 - padding, 0)
+
+
+def max_document_bytes(document_type):
+    """Tamaño máximo de un documento del tipo (MAX_UPLOAD_BYTES o el límite del tipo)"""
+    settings = get_settings()
+    return min(settings.max_upload_bytes,
+               settings.document_type_max_bytes.get(document_type, settings.max_upload_bytes))
+
+
+def content_size_error(document_type, content):
+    """Comprueba el tamaño del contenido antes de decodificarlo. Devuelve un mensaje de error o None."""
+    if content is None:
+        return None
+    limit = max_document_bytes(document_type)
+    if estimated_decoded_size(content) > limit:
+        return f'file_content exceeds the maximum size of {limit} bytes for document_type {document_type}'
+    return None
+
+
+def size_limit_error(document_type, size):
+    """Comprueba un tamaño (declarado o del objeto subido) contra el límite del tipo. Devuelve un mensaje de error o None."""
+    limit = max_document_bytes(document_type)
+    if size > limit:
+        return f'file_size exceeds the maximum size of {limit} bytes for document_type {document_type}'
+    return None
+
+
+def validate_document_fields(body, require_content=True):
+    """
+    Valida los campos de un documento a subir.
+    Devuelve ((user_id, document_type, file_name), None) o (None, mensaje de error).
+    """
+    if not isinstance(body, dict):
+        return None, 'Document must be a JSON object'
+
+    required_fields = ['user_id', 'document_type', 'file_name']
+    if require_content:
+        required_fields.append('file_content')
+    for field in required_fields:
+        if field not in body:
+            return None, f'Missing required field: {field}'
+
+    user_id = body['user_id']
+    document_type = body['document_type']
+    file_name = body['file_name']
+
+    # Validar tipos de datos
+    if not isinstance(user_id, str) or not isinstance(document_type, str) or not isinstance(file_name, str):
+        return None, 'user_id, document_type and file_name must be strings'
+
+    if 'content_type' in body and not isinstance(body['content_type'], str):
+        return None, 'content_type must be a string'
+
+    # El separador se reserva para la clave compuesta tipo#fecha
+    if TYPE_DATE_SEPARATOR in document_type:
+        return None, f'document_type must not contain "{TYPE_DATE_SEPARATOR}"'
+
+    # Tipos de documento y extensiones permitidos (ALLOWED_DOCUMENT_TYPES /
+    # ALLOWED_FILE_EXTENSIONS; vacío: cualquiera)
+    settings = get_settings()
+    if settings.allowed_document_types and document_type not in settings.allowed_document_types:
+        return None, f'document_type must be one of: {", ".join(settings.allowed_document_types)}'
+    if settings.allowed_file_extensions:
+        extension = os.path.splitext(file_name)[1].lower().lstrip('.')
+        if extension not in settings.allowed_file_extensions:
+            return None, f'file_name extension must be one of: {", ".join(settings.allowed_file_extensions)}'
+
+    return (user_id, document_type, file_name), None
+
+
+def decode_file_content(file_content):
+    """
+    Decodifica el contenido del archivo (base64).
+    Devuelve (bytes, None) o (None, mensaje de error).
+    """
+    try:
+        return base64.b64decode(file_content), None
+    except Exception:
+        return None, 'Invalid file_content - must be base64 encoded'
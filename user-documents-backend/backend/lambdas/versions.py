@@ -0,0 +1,175 @@
+"""
+Historial de versiones de los documentos de un usuario.
+
+Cada subida crea un item de versión inmutable (su document_id). Además, cada
+tipo de documento tiene un item puntero "LATEST#{document_type}" con una copia
+de los metadatos de la versión más reciente en el mapa "latest", de modo que
+"el documento más reciente del tipo" es un GetItem. El puntero no tiene
+type_date ni upload_date de primer nivel, así que no aparece en los índices ni
+en los listados.
+
+El puntero se actualiza con una escritura condicional (solo si la versión es
+más reciente que la apuntada) después de que el contenido y los metadatos de
+la versión se hayan guardado: nunca apunta a una versión incompleta, y con
+subidas concurrentes gana la más reciente.
+Si la actualización falla, el puntero se elimina: las lecturas vuelven al
+índice tipo#fecha en lugar de servir una versión anterior, y la siguiente
+subida del tipo lo vuelve a crear.
+
+Con VERSION_RETENTION=N solo se conservan las N versiones más recientes de
+cada tipo: al subir una versión nueva se eliminan las que sobran (un número
+acotado por request).
+"""
+import logging
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from . import metrics
+from .aws_clients import get_client
+from .config import get_settings
+from .dedup import release_blob
+from .models import DocumentMetadata
+from .schema import TYPE_DATE_ATTRIBUTE, TYPE_DATE_INDEX, TYPE_DATE_SEPARATOR, latest_item_id, type_date_prefix
+
+
+logger = logging.getLogger(__name__)
+
+# Versiones sobrantes eliminadas como máximo en cada subida
+RETENTION_BATCH_SIZE = 25
+
+_POINTER_ATTRIBUTES = DocumentMetadata.__slots__
+
+
+def latest_pointer(item):
+    """Metadatos de la versión que se copian en el puntero"""
+    return {name: item[name] for name in _POINTER_ATTRIBUTES if item.get(name) is not None}
+
+
+def update_latest(table, item):
+    """
+    Apunta LATEST#{document_type} a la versión del item si es más reciente que
+    la actual. Devuelve True si el puntero cambió. Los errores se registran y
+    no se propagan (la versión ya está guardada); el puntero se elimina para
+    no servir una versión anterior.
+    """
+    pointer_key = {'user_id': item['user_id'], 'document_id': latest_item_id(item['document_type'])}
+    try:
+        table.update_item(
+            Key=pointer_key,
+            UpdateExpression='SET document_type = :document_type, #latest = :latest',
+            ConditionExpression='attribute_not_exists(#latest) OR #latest.upload_date < :upload_date',
+            ExpressionAttributeNames={'#latest': 'latest'},
+            ExpressionAttributeValues={
+                ':document_type': item['document_type'],
+                ':latest': latest_pointer(item),
+                ':upload_date': item['upload_date']
+            }
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            # Una subida concurrente más reciente ya actualizó el puntero
+            return False
+        logger.error("Failed to update latest pointer of %s/%s: %s", item['user_id'], item['document_type'], e)
+        metrics.put_metric('LatestPointerErrors', 1)
+    try:
+        table.delete_item(Key=pointer_key)
+    except ClientError as e:
+        logger.error("Stale latest pointer left for %s/%s: %s", item['user_id'], item['document_type'], e)
+    return False
+
+
+def publish_version(table, item):
+    """
+    Tras guardar una versión (contenido y metadatos): actualiza el puntero y
+    aplica VERSION_RETENTION. Los errores no afectan a la versión guardada.
+    """
+    update_latest(table, item)
+    keep = get_settings().version_retention
+    if keep > 0:
+        try:
+            enforce_retention(table, get_client('s3'), item['user_id'], item['document_type'], keep)
+        except ClientError as e:
+            logger.error("Failed to enforce version retention for %s/%s: %s",
+                         item['user_id'], item['document_type'], e)
+
+
+def get_latest(table, user_id, document_type):
+    """
+    Item de la versión más reciente del tipo, o None. Los documentos
+    anteriores al puntero se resuelven con el índice tipo#fecha.
+    """
+    pointer = table.get_item(Key={'user_id': user_id, 'document_id': latest_item_id(document_type)}).get('Item')
+    if pointer is not None:
+        return pointer['latest']
+
+    metrics.put_metric('LatestPointerMiss', 1)
+    response = table.query(
+        IndexName=TYPE_DATE_INDEX,
+        KeyConditionExpression=(
+            Key('user_id').eq(user_id)
+            & Key(TYPE_DATE_ATTRIBUTE).begins_with(type_date_prefix(document_type))
+        ),
+        ScanIndexForward=False,  # Orden descendente (más reciente primero)
+        Limit=1
+    )
+    items = response.get('Items', [])
+    return items[0] if items else None
+
+
+def get_version(table, user_id, document_type, document_id):
+    """Item de una versión concreta del tipo, o None (también si está pendiente)"""
+    # Los items LATEST# y BLOB# no son versiones
+    if TYPE_DATE_SEPARATOR in document_id:
+        return None
+    item = table.get_item(Key={'user_id': user_id, 'document_id': document_id}).get('Item')
+    if item is None or item.get('document_type') != document_type or TYPE_DATE_ATTRIBUTE not in item:
+        return None
+    return item
+
+
+def enforce_retention(table, s3_client, user_id, document_type, keep):
+    """
+    Elimina las versiones del tipo que exceden las keep más recientes (como
+    mucho RETENTION_BATCH_SIZE). Devuelve el número de versiones eliminadas.
+    """
+    if keep <= 0:
+        return 0
+    response = table.query(
+        IndexName=TYPE_DATE_INDEX,
+        KeyConditionExpression=(
+            Key('user_id').eq(user_id)
+            & Key(TYPE_DATE_ATTRIBUTE).begins_with(type_date_prefix(document_type))
+        ),
+        ProjectionExpression='document_id, s3_bucket, s3_key, content_sha256',
+        ScanIndexForward=False,
+        Limit=keep + RETENTION_BATCH_SIZE
+    )
+    expired = response.get('Items', [])[keep:]
+
+    deleted = 0
+    for item in expired:
+        try:
+            table.delete_item(
+                Key={'user_id': user_id, 'document_id': item['document_id']},
+                ConditionExpression='attribute_exists(document_id)'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                logger.error("Failed to delete expired version %s: %s", item['document_id'], e)
+            continue
+
+        # Sin metadatos, el contenido de la versión ya no es accesible
+        if item.get('content_sha256'):
+            release_blob(table, s3_client, item['s3_bucket'], user_id, item['content_sha256'])
+        else:
+            try:
+                s3_client.delete_object(Bucket=item['s3_bucket'], Key=item['s3_key'])
+            except ClientError as e:
+                logger.error("Orphan S3 object left at %s: %s", item['s3_key'], e)
+        deleted += 1
+
+    if deleted:
+        metrics.put_metric('VersionsExpired', deleted)
+    return deleted
@@ -0,0 +1,143 @@
+"""
+Medición del arranque en frío de lambda_handler.
+
+Para cada repetición lanza un intérprete nuevo y mide:
+
+- import_ms: importar backend.lambdas.lambda_function sin inicialización
+  (EAGER_INIT=false)
+- init_ms: importar el módulo con la inicialización de la fase de init de
+  Lambda (EAGER_INIT=true: configuración, clientes de AWS, tabla y pool)
+
+Además genera un informe de tiempos de import al estilo de "python -X
+importtime": los módulos con más tiempo propio y el tiempo acumulado por
+paquete de primer nivel (boto3, botocore, urllib3, backend...).
+
+Uso:
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --repeat 10 --top 30 --output cold_start.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+
+DEFAULT_MODULE = 'backend.lambdas.lambda_function'
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_TIMED_IMPORT = (
+    'import time\n'
+    'started = time.perf_counter()\n'
+    'import {module}\n'
+    'print((time.perf_counter() - started) * 1000)\n'
+)
+
+
+def _environment(eager_init):
+    environ = dict(os.environ)
+    environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    environ['EAGER_INIT'] = 'true' if eager_init else 'false'
+    environ['METRICS_ENABLED'] = 'false'
+    environ['PYTHONPATH'] = PROJECT_ROOT + os.pathsep + environ.get('PYTHONPATH', '')
+    return environ
+
+
+def timed_import(module=DEFAULT_MODULE, eager_init=False):
+    """Milisegundos que tarda un intérprete nuevo en importar el módulo"""
+    output = subprocess.run(
+        [sys.executable, '-c', _TIMED_IMPORT.format(module=module)],
+        env=_environment(eager_init), cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    )
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def parse_importtime(stderr):
+    """
+    Parsea la salida de -X importtime. Devuelve una lista de
+    (módulo, tiempo propio en µs, tiempo acumulado en µs).
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def import_time_report(module=DEFAULT_MODULE, top=20, eager_init=False):
+    """
+    Informe de -X importtime del módulo: total, módulos con más tiempo propio
+    y tiempo propio agregado por paquete de primer nivel (en ms)
+    """
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        env=_environment(eager_init), cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    )
+    entries = parse_importtime(output.stderr)
+
+    packages = defaultdict(int)
+    for name, self_us, _ in entries:
+        packages[name.split('.')[0]] += self_us
+    total_us = next((cumulative for name, _, cumulative in entries if name == module),
+                    sum(self_us for _, self_us, _ in entries))
+
+    slowest = sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+    return {
+        'module': module,
+        'total_ms': round(total_us / 1000, 2),
+        'modules': len(entries),
+        'slowest': [{'module': name, 'self_ms': round(self_us / 1000, 2), 'cumulative_ms': round(cumulative_us / 1000, 2)}
+                    for name, self_us, cumulative_us in slowest],
+        'packages': {name: round(self_us / 1000, 2)
+                     for name, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]}
+    }
+
+
+def measure_cold_start(module=DEFAULT_MODULE, repeat=5):
+    """Mediana y máximo de import_ms e init_ms en intérpretes nuevos"""
+    results = {}
+    for label, eager_init in (('import_ms', False), ('init_ms', True)):
+        samples = [timed_import(module, eager_init) for _ in range(repeat)]
+        results[label] = {'median': round(statistics.median(samples), 2), 'max': round(max(samples), 2)}
+    return results
+
+
+def print_report(cold_start, report, stream=sys.stdout):
+    stream.write(f"{'phase':<12} {'median ms':>10} {'max ms':>10}\n")
+    for label, values in cold_start.items():
+        stream.write(f"{label:<12} {values['median']:>10.2f} {values['max']:>10.2f}\n")
+
+    stream.write(f"\nimport {report['module']}: {report['total_ms']:.2f} ms, {report['modules']} modules\n")
+    stream.write(f"\n{'package':<32} {'self ms':>10}\n")
+    for name, self_ms in report['packages'].items():
+        stream.write(f"{name:<32} {self_ms:>10.2f}\n")
+    stream.write(f"\n{'module':<48} {'self ms':>10} {'cumul. ms':>10}\n")
+    for entry in report['slowest']:
+        stream.write(f"{entry['module']:<48} {entry['self_ms']:>10.2f} {entry['cumulative_ms']:>10.2f}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the cold start (import and init) of the Lambda handler')
+    parser.add_argument('--module', default=DEFAULT_MODULE, help='Module imported by the Lambda runtime')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per phase')
+    parser.add_argument('--top', type=int, default=20, help='Modules and packages listed in the report')
+    parser.add_argument('--output', default=None, help='Write the raw results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    cold_start = measure_cold_start(args.module, args.repeat)
+    report = import_time_report(args.module, args.top)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'cold_start': cold_start, 'import_time': report}, output, indent=2)
+    print_report(cold_start, report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""
+Benchmark de lambda_handler contra S3/DynamoDB locales.
+
+Recorre una matriz de tamaños de archivo, documentos por usuario y niveles de
+concurrencia. Para cada celda mide la latencia (p50/p90/p99), el throughput, el
+pico de RSS del proceso y el pico de memoria asignada por request (tracemalloc),
+y compara el resultado con la línea base de benchmarks/baseline.json: si
+alguna métrica empeora más de la tolerancia, o si falta la línea base de
+alguna celda, el comando termina con código 1 (2 si no existe el archivo).
+
+Por defecto S3 y DynamoDB se simulan en proceso con moto. Con --endpoint-url
+se usa un servidor local (moto_server, LocalStack...) en su lugar.
+
+Cada celda se ejecuta en un proceso nuevo para que el pico de RSS sea propio
+de la celda.
+
+Uso:
+    python -m benchmarks.bench_handler                      # matriz completa
+    python -m benchmarks.bench_handler --quick              # matriz reducida
+    python -m benchmarks.bench_handler --update-baseline    # guardar línea base
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import product
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# El mayor tamaño cabe en los límites por defecto de POST /documents:
+# MAX_UPLOAD_BYTES (4 MiB) y, con el ~33 % del base64, MAX_REQUEST_BODY_BYTES (6 MiB)
+DEFAULT_SIZES = [1024, 64 * 1024, 1024 * 1024, 3 * 1024 * 1024]
+DEFAULT_DOCUMENT_COUNTS = [1, 200]
+DEFAULT_CONCURRENCY = [1, 4]
+# Subconjunto de la matriz completa, así que también tiene línea base
+QUICK_SIZES = [1024, 64 * 1024]
+QUICK_DOCUMENT_COUNTS = [1]
+QUICK_CONCURRENCY = [1]
+
+# Métricas comparadas con la línea base (más alto es peor)
+COMPARED_METRICS = ('p50_ms', 'p99_ms', 'alloc_peak_kib', 'peak_rss_kib')
+
+BENCH_USER = 'bench-user'
+BENCH_TYPE = 'contract'
+
+
+def _percentile(samples, percent):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(percent / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class _DiscardSink:
+    """Destino de métricas que descarta los documentos EMF durante el benchmark"""
+
+    def emit(self, document):
+        pass
+
+
+def _setup_aws(document_count):
+    import boto3
+
+    from backend.lambdas.aws_clients import get_client, get_table
+    from backend.lambdas.config import get_settings
+    from backend.lambdas.schema import build_s3_key, build_type_date, table_definition
+
+    settings = get_settings()
+    dynamodb = get_client('dynamodb')
+    if settings.table_name not in dynamodb.list_tables()['TableNames']:
+        boto3.resource('dynamodb', region_name=settings.aws_region).create_table(
+            **table_definition(settings.table_name))
+    s3_client = get_client('s3')
+    try:
+        s3_client.create_bucket(Bucket=settings.bucket_name)
+    except s3_client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+    # Documentos previos del usuario (solo metadatos, repartidos entre varios tipos)
+    with get_table().batch_writer() as batch:
+        for index in range(document_count - 1):
+            document_type = BENCH_TYPE if index % 4 == 0 else f'type{index % 7}'
+            document_id = str(uuid.uuid4())
+            upload_date = f'2024-01-01T00:00:{index % 60:02d}.{index:06d}'
+            batch.put_item(Item={
+                'user_id': BENCH_USER,
+                'document_id': document_id,
+                'document_type': document_type,
+                'file_name': f'old_{index}.pdf',
+                's3_bucket': settings.bucket_name,
+                's3_key': build_s3_key(BENCH_USER, document_type, document_id, f'old_{index}.pdf'),
+                'upload_date': upload_date,
+                'type_date': build_type_date(document_type, upload_date),
+                'file_size': 0
+            })
+
+
+def _upload_event(content_base64):
+    return {
+        'httpMethod': 'POST',
+        'path': '/documents',
+        'body': json.dumps({
+            'user_id': BENCH_USER,
+            'document_type': BENCH_TYPE,
+            'file_name': 'bench.pdf',
+            'file_content': content_base64
+        })
+    }
+
+
+def _get_event():
+    return {'httpMethod': 'GET', 'path': f'/documents/{BENCH_USER}/{BENCH_TYPE}'}
+
+
+def _measure(handler, events, concurrency):
+    """Ejecuta los eventos con la concurrencia indicada y devuelve las latencias en ms"""
+    def invoke(event):
+        started = time.perf_counter()
+        response = handler(event, {})
+        elapsed = (time.perf_counter() - started) * 1000
+        if response['statusCode'] >= 400:
+            raise RuntimeError(f"Benchmark request failed: {response['statusCode']} {response['body'][:200]}")
+        return elapsed
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        latencies = [invoke(event) for event in events]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(invoke, events))
+    return latencies, time.perf_counter() - started
+
+
+def _allocation_peak(handler, event, samples=3):
+    """Pico de memoria asignada (KiB) durante una request, medido con tracemalloc"""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(samples):
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            handler(event, {})
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append((peak - baseline) / 1024)
+    finally:
+        tracemalloc.stop()
+    return statistics.median(peaks)
+
+
+def run_cell(cell):
+    """
+    Ejecuta una celda de la matriz: {'operation', 'size', 'documents',
+    'concurrency', 'iterations', 'endpoint_url'}. Devuelve sus resultados.
+    """
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    mock = None
+    if cell.get('endpoint_url'):
+        os.environ['AWS_ENDPOINT_URL'] = cell['endpoint_url']
+    else:
+        from moto import mock_aws
+        mock = mock_aws()
+        mock.start()
+
+    from backend.lambdas import metrics
+    previous_sink = metrics.set_sink(_DiscardSink())
+    try:
+        from backend.lambdas.aws_clients import reset_clients
+        from backend.lambdas.config import reset_settings
+        from backend.lambdas.lambda_function import lambda_handler
+        from backend.lambdas.metadata_cache import reset_metadata_cache
+
+        reset_settings()
+        reset_clients()
+        reset_metadata_cache()
+        _setup_aws(cell['documents'])
+
+        content_base64 = base64.b64encode(os.urandom(cell['size'])).decode('ascii')
+        upload_event = _upload_event(content_base64)
+        # Siempre hay al menos una versión del documento medido
+        response = lambda_handler(upload_event, {})
+        if response['statusCode'] != 201:
+            raise RuntimeError(
+                f"Benchmark setup upload of {cell['size']} bytes failed: "
+                f"{response['statusCode']} {response['body'][:200]} "
+                "(check MAX_UPLOAD_BYTES and MAX_REQUEST_BODY_BYTES)"
+            )
+
+        if cell['operation'] == 'upload':
+            events = [upload_event] * cell['iterations']
+            probe_event = upload_event
+        else:
+            events = [_get_event()] * cell['iterations']
+            probe_event = _get_event()
+
+        # Calentamiento (clientes, pools de conexiones, imports diferidos)
+        lambda_handler(probe_event, {})
+
+        latencies, wall_time = _measure(lambda_handler, events, cell['concurrency'])
+        alloc_peak = _allocation_peak(lambda_handler, probe_event)
+    finally:
+        metrics.set_sink(previous_sink)
+        if mock is not None:
+            mock.stop()
+
+    return {
+        'operation': cell['operation'],
+        'size': cell['size'],
+        'documents': cell['documents'],
+        'concurrency': cell['concurrency'],
+        'requests': len(latencies),
+        'p50_ms': round(_percentile(latencies, 50), 3),
+        'p90_ms': round(_percentile(latencies, 90), 3),
+        'p99_ms': round(_percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'throughput_rps': round(len(latencies) / wall_time, 2),
+        'alloc_peak_kib': round(alloc_peak, 1),
+        # ru_maxrss está en KiB en Linux
+        'peak_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+
+
+def cell_id(result):
+    return f"{result['operation']}/size={result['size']}/docs={result['documents']}/conc={result['concurrency']}"
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    Devuelve la lista de regresiones (celda, métrica, base, actual) que superan
+    la tolerancia relativa. Las celdas sin línea base las detecta
+    missing_baseline.
+    """
+    regressions = []
+    for result in results:
+        reference = baseline.get(cell_id(result))
+        if not reference:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in reference or not reference[metric]:
+                continue
+            if result[metric] > reference[metric] * (1 + tolerance):
+                regressions.append((cell_id(result), metric, reference[metric], result[metric]))
+    return regressions
+
+
+def missing_baseline(results, baseline):
+    """Celdas de los resultados que no tienen entrada en la línea base"""
+    return [cell_id(result) for result in results if not baseline.get(cell_id(result))]
+
+
+def build_matrix(sizes, document_counts, concurrency_levels, iterations, endpoint_url=None):
+    matrix = []
+    for operation, size, documents, concurrency in product(('upload', 'get'), sizes, document_counts,
+                                                            concurrency_levels):
+        matrix.append({
+            'operation': operation,
+            'size': size,
+            'documents': documents,
+            'concurrency': concurrency,
+            'iterations': iterations,
+            'endpoint_url': endpoint_url
+        })
+    return matrix
+
+
+def run_matrix(matrix, isolate=True):
+    if not isolate:
+        return [run_cell(cell) for cell in matrix]
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for cell in matrix:
+        # Un proceso por celda para que el pico de RSS no se arrastre entre celdas
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results.append(executor.submit(run_cell, cell).result())
+    return results
+
+
+def print_report(results, regressions, missing=(), stream=sys.stdout):
+    header = f"{'cell':<48} {'p50':>9} {'p90':>9} {'p99':>9} {'req/s':>8} {'alloc KiB':>10} {'RSS KiB':>9}"
+    stream.write(header + '\n' + '-' * len(header) + '\n')
+    for result in results:
+        stream.write(
+            f"{cell_id(result):<48} {result['p50_ms']:>9.2f} {result['p90_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+            f"{result['throughput_rps']:>8.1f} {result['alloc_peak_kib']:>10.1f} {result['peak_rss_kib']:>9}\n"
+        )
+    for cell, metric, reference, current in regressions:
+        stream.write(f"REGRESSION {cell} {metric}: baseline {reference} -> {current}\n")
+    for cell in missing:
+        stream.write(f"MISSING BASELINE {cell} (run with --update-baseline)\n")
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark lambda_handler against local AWS stand-ins')
+    parser.add_argument('--sizes', type=_int_list, default=None, help='File sizes in bytes (comma separated)')
+    parser.add_argument('--documents', type=_int_list, default=None, help='Documents per user (comma separated)')
+    parser.add_argument('--concurrency', type=_int_list, default=None, help='Concurrency levels (comma separated)')
+    parser.add_argument('--iterations', type=int, default=30, help='Requests per cell')
+    parser.add_argument('--quick', action='store_true', help='Run a reduced matrix')
+    parser.add_argument('--endpoint-url', default=None, help='Local S3/DynamoDB endpoint instead of in-process moto')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--update-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative regression (0.25 = 25%%)')
+    parser.add_argument('--output', default=None, help='Write the raw results as JSON to this file')
+    parser.add_argument('--no-isolate', action='store_true', help='Run every cell in this process')
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    document_counts = args.documents or (QUICK_DOCUMENT_COUNTS if args.quick else DEFAULT_DOCUMENT_COUNTS)
+    concurrency_levels = args.concurrency or (QUICK_CONCURRENCY if args.quick else DEFAULT_CONCURRENCY)
+
+    matrix = build_matrix(sizes, document_counts, concurrency_levels, args.iterations, args.endpoint_url)
+    results = run_matrix(matrix, isolate=not args.no_isolate)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump({cell_id(result): result for result in results}, baseline_file, indent=2, sort_keys=True)
+        print_report(results, [])
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print_report(results, [])
+        sys.stderr.write(f"Baseline file {args.baseline} not found (run with --update-baseline)\n")
+        return 2
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    missing = missing_baseline(results, baseline)
+    print_report(results, regressions, missing)
+    return 1 if regressions or missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,7 @@ import os
 import boto3
 from moto import mock_aws
 from backend.lambdas.lambda_function import lambda_handler
+from backend.lambdas.schema import table_definition
 
 # Configurar región de AWS para las pruebas
 os.environ['AWS_DEFAULT_REGION'] = 'us-east-1'
@@ -22,18 +23,7 @@ def demonstrate_lambda_workflow():
     s3_client.create_bucket(Bucket='user-documents-bucket')
     
     dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.create_table(
-        TableName='UserDocuments',
-        KeySchema=[
-            {'AttributeName': 'user_id', 'KeyType': 'HASH'},
-            {'AttributeName': 'document_id', 'KeyType': 'RANGE'}
-        ],
-        AttributeDefinitions=[
-            {'AttributeName': 'user_id', 'AttributeType': 'S'},
-            {'AttributeName': 'document_id', 'AttributeType': 'S'}
-        ],
-        BillingMode='PAY_PER_REQUEST'
-    )
+    table = dynamodb.create_table(**table_definition())
     print("   ✅ S3 y DynamoDB simulados listos")
 
     # PASO 1: Usuario sube un documento
@@ -154,18 +144,7 @@ def test_multiple_users():
     s3_client.create_bucket(Bucket='user-documents-bucket')
     
     dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.create_table(
-        TableName='UserDocuments',
-        KeySchema=[
-            {'AttributeName': 'user_id', 'KeyType': 'HASH'},
-            {'AttributeName': 'document_id', 'KeyType': 'RANGE'}
-        ],
-        AttributeDefinitions=[
-            {'AttributeName': 'user_id', 'AttributeType': 'S'},
-            {'AttributeName': 'document_id', 'AttributeType': 'S'}
-        ],
-        BillingMode='PAY_PER_REQUEST'
-    )
+    table = dynamodb.create_table(**table_definition())
     
     # Datos de prueba
     test_data = [
@@ -3,6 +3,7 @@ import base64
 import boto3
 from moto import mock_aws
 from backend.lambdas.lambda_function import lambda_handler
+from backend.lambdas.schema import table_definition
 
 @mock_aws
 def test_complete_flow():
@@ -19,18 +20,7 @@ def test_complete_flow():
     
     # Mock de DynamoDB
     dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-    table = dynamodb.create_table(
-        TableName='UserDocuments',
-        KeySchema=[
-            {'AttributeName': 'user_id', 'KeyType': 'HASH'},
-            {'AttributeName': 'document_id', 'KeyType': 'RANGE'}
-        ],
-        AttributeDefinitions=[
-            {'AttributeName': 'user_id', 'AttributeType': 'S'},
-            {'AttributeName': 'document_id', 'AttributeType': 'S'}
-        ],
-        BillingMode='PAY_PER_REQUEST'
-    )
+    table = dynamodb.create_table(**table_definition())
     
     print("✅ Mocks configurados correctamente")
     
@@ -151,18 +141,7 @@ def test_s3_and_dynamo_internals():
     s3_client.create_bucket(Bucket='user-documents-bucket')
     
     dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-    table = dynamodb.create_table(
-        TableName='UserDocuments',
-        KeySchema=[
-            {'AttributeName': 'user_id', 'KeyType': 'HASH'},
-            {'AttributeName': 'document_id', 'KeyType': 'RANGE'}
-        ],
-        AttributeDefinitions=[
-            {'AttributeName': 'user_id', 'AttributeType': 'S'},
-            {'AttributeName': 'document_id', 'AttributeType': 'S'}
-        ],
-        BillingMode='PAY_PER_REQUEST'
-    )
+    table = dynamodb.create_table(**table_definition())
     
     # Subir un documento
     file_content = "Contenido para ver internamente"
@@ -187,7 +166,7 @@ def test_s3_and_dynamo_internals():
         
         print("📊 EN DYNAMODB (Metadatos):")
         # Leer de DynamoDB
-        items = table.scan()['Items']
+        items = [item for item in table.scan()['Items'] if not item['document_id'].startswith('LATEST#')]
         for item in items:
             print(f"   👤 User: {item['user_id']}")
             print(f"   📝 Doc ID: {item['document_id']}")
@@ -0,0 +1,60 @@
+import sys
+import os
+import pytest
+from moto import mock_aws
+import boto3
+
+# Añadir el directorio raíz al path de Python
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.lambdas.aws_clients import reset_clients
+from backend.lambdas.config import reset_settings
+from backend.lambdas.idempotency import reset_response_cache
+from backend.lambdas.metadata_cache import reset_metadata_cache
+from backend.lambdas.resilience import reset_breakers
+from backend.lambdas.schema import table_definition
+
+@pytest.fixture(autouse=True)
+def reset_aws_state():
+    """Descartar configuración, clientes, cachés y circuitos entre pruebas."""
+    reset_settings()
+    reset_clients()
+    reset_metadata_cache()
+    reset_response_cache()
+    reset_breakers()
+    yield
+    reset_settings()
+    reset_clients()
+    reset_metadata_cache()
+    reset_response_cache()
+    reset_breakers()
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    import os
+    os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+    os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+    os.environ['AWS_DEFAULT_REGION'] = 'us-east-1'
+
+@pytest.fixture
+def dynamodb_mock(aws_credentials):
+    """Mock DynamoDB resource."""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        
+        # Crear tabla de DynamoDB
+        table = dynamodb.create_table(**table_definition())
+        
+        yield table
+
+@pytest.fixture
+def s3_mock(aws_credentials):
+    """Mock S3 resource."""
+    with mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        
+        # Crear bucket de S3
+        s3.create_bucket(Bucket='user-documents-bucket')
+        
+        yield s3
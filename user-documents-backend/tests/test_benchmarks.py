@@ -0,0 +1,65 @@
+import pytest
+
+from benchmarks.bench_cold_start import import_time_report, parse_importtime
+from benchmarks.bench_handler import build_matrix, cell_id, compare_with_baseline, main, missing_baseline, run_cell
+
+def test_compare_with_baseline_flags_regressions():
+    """Test detección de regresiones respecto a la línea base."""
+    result = {'operation': 'get', 'size': 1024, 'documents': 1, 'concurrency': 1,
+              'p50_ms': 13.0, 'p99_ms': 20.0, 'alloc_peak_kib': 50.0, 'peak_rss_kib': 1000}
+    baseline = {cell_id(result): {'p50_ms': 10.0, 'p99_ms': 19.0, 'alloc_peak_kib': 50.0, 'peak_rss_kib': 1000}}
+
+    regressions = compare_with_baseline([result], baseline, tolerance=0.25)
+    assert regressions == [('get/size=1024/docs=1/conc=1', 'p50_ms', 10.0, 13.0)]
+    assert compare_with_baseline([result], {}, tolerance=0.25) == []
+    assert missing_baseline([result], {}) == ['get/size=1024/docs=1/conc=1']
+    assert missing_baseline([result], baseline) == []
+
+def test_benchmark_cell_smoke(aws_credentials):
+    """Test ejecución de una celda reducida del benchmark contra moto."""
+    cell = build_matrix([2048], [3], [2], iterations=4)[0]
+    result = run_cell(cell)
+    assert result['operation'] == 'upload'
+    assert result['requests'] == 4
+    assert 0 < result['p50_ms'] <= result['p99_ms']
+    assert result['alloc_peak_kib'] > 0
+
+def test_parse_importtime():
+    """Test parseo de la salida de -X importtime."""
+    stderr = (
+        'import time: self [us] | cumulative | imported package\n'
+        'import time:       120 |        120 |     botocore.exceptions\n'
+        'import time:      1000 |       1500 |   backend.lambdas.lambda_function\n'
+    )
+    assert parse_importtime(stderr) == [('botocore.exceptions', 120, 120),
+                                        ('backend.lambdas.lambda_function', 1000, 1500)]
+
+def test_import_time_report_smoke():
+    """Test informe de import del handler en un intérprete nuevo."""
+    report = import_time_report(top=5)
+    assert report['total_ms'] > 0
+    assert len(report['slowest']) == 5
+    assert len(report['packages']) == 5
+
+def test_benchmark_cell_rejected_setup(aws_credentials, monkeypatch):
+    """Test celda cuyo documento no cabe en los límites: error claro en la preparación."""
+    monkeypatch.setenv('MAX_UPLOAD_BYTES', '1024')
+    cell = build_matrix([2048], [1], [1], iterations=1)[1]
+    with pytest.raises(RuntimeError, match='setup upload of 2048 bytes failed: 413'):
+        run_cell(cell)
+
+def test_benchmark_fails_without_baseline(aws_credentials, tmp_path, monkeypatch):
+    """Test benchmark sin archivo de línea base o sin la entrada de una celda: código distinto de 0."""
+    import benchmarks.bench_handler as bench_handler
+    result = {'operation': 'get', 'size': 1024, 'documents': 1, 'concurrency': 1, 'requests': 1,
+              'p50_ms': 1.0, 'p90_ms': 1.0, 'p99_ms': 1.0, 'throughput_rps': 1.0,
+              'alloc_peak_kib': 1.0, 'peak_rss_kib': 1}
+    monkeypatch.setattr(bench_handler, 'run_matrix', lambda matrix, isolate=True: [result])
+    baseline = tmp_path / 'baseline.json'
+    argv = ['--quick', '--baseline', str(baseline)]
+
+    assert main(argv) == 2
+    baseline.write_text('{}')
+    assert main(argv) == 1
+    baseline.write_text('{"get/size=1024/docs=1/conc=1": {"p50_ms": 1.0}}')
+    assert main(argv) == 0
@@ -1,5 +1,6 @@
 import json
 import base64
+import logging
 import pytest
 import sys
 import os
@@ -10,59 +11,10 @@ import boto3
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from backend.lambdas.lambda_function import lambda_handler, upload_document, get_document, create_response
-
-@pytest.fixture
-def aws_credentials():
-    """Mocked AWS Credentials for moto."""
-    import os
-    os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
-    os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
-    os.environ['AWS_DEFAULT_REGION'] = 'us-east-1'
-
-@pytest.fixture
-def dynamodb_mock(aws_credentials):
-    """Mock DynamoDB resource."""
-    with mock_aws():
-        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-        
-        # Crear tabla de DynamoDB
-        table = dynamodb.create_table(
-            TableName='UserDocuments',
-            KeySchema=[
-                {
-                    'AttributeName': 'user_id',
-                    'KeyType': 'HASH'
-                },
-                {
-                    'AttributeName': 'document_id',
-                    'KeyType': 'RANGE'
-                }
-            ],
-            AttributeDefinitions=[
-                {
-                    'AttributeName': 'user_id',
-                    'AttributeType': 'S'
-                },
-                {
-                    'AttributeName': 'document_id',
-                    'AttributeType': 'S'
-                }
-            ],
-            BillingMode='PAY_PER_REQUEST'
-        )
-        
-        yield table
-
-@pytest.fixture
-def s3_mock(aws_credentials):
-    """Mock S3 resource."""
-    with mock_aws():
-        s3 = boto3.client('s3', region_name='us-east-1')
-        
-        # Crear bucket de S3
-        s3.create_bucket(Bucket='user-documents-bucket')
-        
-        yield s3
+from backend.lambdas.aws_clients import get_client, get_table, reset_clients
+from backend.lambdas.config import load_settings, reset_settings
+from backend.lambdas.migrations import backfill_type_date, ensure_type_date_index, ensure_upload_date_index
+from backend.lambdas.request_logging import redact_body
 
 def test_upload_document_valid(s3_mock, dynamodb_mock):
     """Test upload de documento válido."""
@@ -197,4 +149,1108 @@ def test_invalid_route():
     
     assert response['statusCode'] == 404
     response_body = json.loads(response['body'])
-    assert 'error' in response_body
\ No newline at end of file
+    assert 'error' in response_body
+
+def test_clients_are_reused_between_invocations(aws_credentials):
+    """Test que los clientes AWS se crean una sola vez por contenedor."""
+    assert get_client('s3') is get_client('s3')
+    assert get_table() is get_table()
+    assert get_table().name == 'UserDocuments'
+
+    first_client = get_client('s3')
+    reset_clients()
+    assert get_client('s3') is not first_client
+
+def test_client_config_from_environment(aws_credentials, monkeypatch):
+    """Test configuración del pool de conexiones y reintentos desde el entorno."""
+    monkeypatch.setenv('AWS_MAX_POOL_CONNECTIONS', '7')
+    monkeypatch.setenv('AWS_RETRY_MODE', 'adaptive')
+    monkeypatch.setenv('AWS_TCP_KEEPALIVE', 'false')
+    reset_settings()
+    reset_clients()
+
+    config = get_client('s3').meta.config
+    assert config.max_pool_connections == 7
+    assert config.retries['mode'] == 'adaptive'
+    assert config.tcp_keepalive is False
+    # Los reintentos los decide resilience.py; timeouts por servicio
+    assert config.retries['total_max_attempts'] == 1
+    assert config.read_timeout == 10.0
+    assert get_table().meta.client.meta.config.read_timeout == 3.0
+
+    settings = load_settings({'AWS_REGION': 'eu-west-1'})
+    assert settings.aws_region == 'eu-west-1'
+    assert settings.max_pool_connections == 50
+
+def version_items(table):
+    """Items de documentos de la tabla (sin punteros LATEST# ni blobs)"""
+    return [item for item in table.scan()['Items'] if '#' not in item['document_id']]
+
+def upload(user_id, document_type, file_name, content):
+    """Subir un documento a través del handler y devolver la respuesta."""
+    event = {
+        'httpMethod': 'POST',
+        'path': '/documents',
+        'body': json.dumps({
+            'user_id': user_id,
+            'document_type': document_type,
+            'file_name': file_name,
+            'file_content': base64.b64encode(content.encode('utf-8')).decode('utf-8')
+        })
+    }
+    return lambda_handler(event, {})
+
+def test_get_document_returns_latest_of_type(s3_mock, dynamodb_mock):
+    """Test que se devuelve el documento más reciente del tipo pedido aunque el usuario tenga muchos."""
+    for i in range(5):
+        assert upload('user789', 'invoice', f'invoice_{i}.pdf', f'factura {i}')['statusCode'] == 201
+    assert upload('user789', 'contract', 'contract.pdf', 'contrato')['statusCode'] == 201
+    assert upload('user789', 'invoice', 'invoice_latest.pdf', 'factura final')['statusCode'] == 201
+    assert upload('user789', 'photo', 'photo.jpg', 'foto')['statusCode'] == 201
+
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/user789/invoice'}, {})
+
+    assert response['statusCode'] == 200
+    response_body = json.loads(response['body'])
+    assert response_body['file_name'] == 'invoice_latest.pdf'
+    assert base64.b64decode(response_body['file_content']) == b'factura final'
+
+def test_migration_backfills_type_date_index(s3_mock, aws_credentials):
+    """Test migración de una tabla sin índice tipo#fecha."""
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    legacy_table = dynamodb.create_table(
+        TableName='UserDocuments',
+        KeySchema=[
+            {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+            {'AttributeName': 'document_id', 'KeyType': 'RANGE'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'user_id', 'AttributeType': 'S'},
+            {'AttributeName': 'document_id', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    s3_mock.put_object(Bucket='user-documents-bucket', Key='legacy/contract/doc-1_old.pdf', Body=b'viejo')
+    legacy_table.put_item(Item={
+        'user_id': 'legacy', 'document_id': 'doc-1', 'document_type': 'contract',
+        'file_name': 'old.pdf', 's3_bucket': 'user-documents-bucket',
+        's3_key': 'legacy/contract/doc-1_old.pdf', 'upload_date': '2024-01-01T00:00:00', 'file_size': 5
+    })
+
+    assert ensure_type_date_index('UserDocuments') is True
+    assert ensure_type_date_index('UserDocuments') is False
+    assert ensure_upload_date_index('UserDocuments') is True
+    assert backfill_type_date(get_table()) == 1
+    assert backfill_type_date(get_table()) == 0
+
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/legacy/contract'}, {})
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['file_name'] == 'old.pdf'
+
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/legacy'}, {})
+    assert [document['document_id'] for document in json.loads(response['body'])['documents']] == ['doc-1']
+
+def test_get_document_presigned_url_mode(s3_mock, dynamodb_mock, monkeypatch):
+    """Test modo de descarga con URL prefirmada para archivos grandes."""
+    monkeypatch.setenv('INLINE_DOWNLOAD_MAX_BYTES', '16')
+    reset_settings()
+    assert upload('user321', 'contract', 'big "contract".pdf', 'x' * 64)['statusCode'] == 201
+    assert upload('user321', 'photo', 'small.jpg', 'tiny')['statusCode'] == 201
+
+    response = lambda_handler({
+        'httpMethod': 'GET',
+        'path': '/documents/user321/contract',
+        'queryStringParameters': {'download': 'url'}
+    }, {})
+    assert response['statusCode'] == 200
+    response_body = json.loads(response['body'])
+    assert response_body['delivery'] == 'url'
+    assert 'file_content' not in response_body
+    assert response_body['download_url'].startswith('https://')
+    assert 'X-Amz-Expires=300' in response_body['download_url']
+    assert response_body['file_size'] == 64
+
+    # Los archivos bajo el umbral se siguen devolviendo en línea
+    response = lambda_handler({
+        'httpMethod': 'GET',
+        'path': '/documents/user321/photo',
+        'headers': {'x-download-mode': 'URL'}
+    }, {})
+    assert response['statusCode'] == 200
+    response_body = json.loads(response['body'])
+    assert 'download_url' not in response_body
+    assert base64.b64decode(response_body['file_content']) == b'tiny'
+
+def test_get_document_invalid_download_mode(s3_mock, dynamodb_mock):
+    """Test modo de descarga no soportado."""
+    response = lambda_handler({
+        'httpMethod': 'GET',
+        'path': '/documents/user321/contract',
+        'queryStringParameters': {'download': 'carrier-pigeon'}
+    }, {})
+    assert response['statusCode'] == 400
+
+def start_direct_upload(user_id, document_type, file_name, **extra):
+    """Crear una sesión de subida directa a S3."""
+    body = {'user_id': user_id, 'document_type': document_type, 'file_name': file_name, 'upload_mode': 'presigned'}
+    body.update(extra)
+    return lambda_handler({'httpMethod': 'POST', 'path': '/documents', 'body': json.dumps(body)}, {})
+
+def test_direct_upload_with_explicit_completion(s3_mock, dynamodb_mock):
+    """Test subida directa a S3 con URL prefirmada y finalización explícita."""
+    response = start_direct_upload('user555', 'contract', 'contract.pdf', content_type='application/pdf',
+                                   file_size=len(b'contenido directo'))
+    assert response['statusCode'] == 201
+    response_body = json.loads(response['body'])
+    assert response_body['status'] == 'pending'
+    assert response_body['upload']['method'] == 'PUT'
+    assert response_body['upload']['headers'] == {'Content-Type': 'application/pdf', 'Content-Length': '17'}
+    document_id = response_body['document_id']
+    complete_event = {'httpMethod': 'POST', 'path': f'/documents/user555/{document_id}/complete'}
+
+    # Mientras está pendiente no es visible ni se puede completar
+    assert lambda_handler({'httpMethod': 'GET', 'path': '/documents/user555/contract'}, {})['statusCode'] == 404
+    assert lambda_handler(complete_event, {})['statusCode'] == 409
+
+    # El cliente sube el archivo directamente a S3
+    item = dynamodb_mock.get_item(Key={'user_id': 'user555', 'document_id': document_id})['Item']
+    s3_mock.put_object(Bucket='user-documents-bucket', Key=item['s3_key'], Body=b'contenido directo')
+
+    response = lambda_handler(complete_event, {})
+    assert response['statusCode'] == 200
+    response_body = json.loads(response['body'])
+    assert response_body['status'] == 'committed'
+    assert response_body['file_size'] == len(b'contenido directo')
+
+    item = dynamodb_mock.get_item(Key={'user_id': 'user555', 'document_id': document_id})['Item']
+    assert item['etag']
+    assert 'expires_at' not in item
+
+    # Completar dos veces es idempotente
+    assert lambda_handler(complete_event, {})['statusCode'] == 200
+
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/user555/contract'}, {})
+    assert response['statusCode'] == 200
+    assert base64.b64decode(json.loads(response['body'])['file_content']) == b'contenido directo'
+
+def test_direct_upload_size_limits(s3_mock, dynamodb_mock, monkeypatch):
+    """Test límites de tamaño de la subida directa: al crear la sesión y al finalizar."""
+    monkeypatch.setenv('MAX_UPLOAD_BYTES', '100')
+    reset_settings()
+    assert start_direct_upload('user557', 'contract', 'c.pdf')['statusCode'] == 400
+    assert start_direct_upload('user557', 'contract', 'c.pdf', file_size='10')['statusCode'] == 400
+    assert start_direct_upload('user557', 'contract', 'c.pdf', file_size=101)['statusCode'] == 413
+
+    response = start_direct_upload('user557', 'contract', 'c.pdf', upload_method='POST')
+    policy = json.loads(base64.b64decode(json.loads(response['body'])['upload']['fields']['policy']))
+    assert ['content-length-range', 1, 100] in policy['conditions']
+
+    # Un objeto mayor que el límite (subido sin respetar la firma) se descarta
+    document_id = json.loads(response['body'])['document_id']
+    item = dynamodb_mock.get_item(Key={'user_id': 'user557', 'document_id': document_id})['Item']
+    s3_mock.put_object(Bucket='user-documents-bucket', Key=item['s3_key'], Body=b'x' * 101)
+    response = lambda_handler({'httpMethod': 'POST', 'path': f'/documents/user557/{document_id}/complete'}, {})
+    assert response['statusCode'] == 413
+    assert s3_mock.list_objects_v2(Bucket='user-documents-bucket')['KeyCount'] == 0
+    assert 'Item' not in dynamodb_mock.get_item(Key={'user_id': 'user557', 'document_id': document_id})
+
+    response = start_direct_upload('user557', 'contract', 'c.pdf', file_size=50)
+    document_id = json.loads(response['body'])['document_id']
+    item = dynamodb_mock.get_item(Key={'user_id': 'user557', 'document_id': document_id})['Item']
+    s3_mock.put_object(Bucket='user-documents-bucket', Key=item['s3_key'], Body=b'x' * 101)
+    s3_event = {'Records': [{
+        'eventSource': 'aws:s3',
+        'eventName': 'ObjectCreated:Put',
+        's3': {'bucket': {'name': 'user-documents-bucket'}, 'object': {'key': item['s3_key'], 'size': 101}}
+    }]}
+    assert lambda_handler(s3_event, {}) == {'finalized': 0}
+    assert s3_mock.list_objects_v2(Bucket='user-documents-bucket')['KeyCount'] == 0
+    assert 'Item' not in dynamodb_mock.get_item(Key={'user_id': 'user557', 'document_id': document_id})
+
+def test_direct_upload_completed_by_s3_event(s3_mock, dynamodb_mock):
+    """Test finalización de la subida directa desde la notificación de S3."""
+    response = start_direct_upload('user556', 'photo', 'mi foto.jpg', upload_method='POST')
+    assert response['statusCode'] == 201
+    response_body = json.loads(response['body'])
+    assert 'key' in response_body['upload']['fields']
+    document_id = response_body['document_id']
+
+    item = dynamodb_mock.get_item(Key={'user_id': 'user556', 'document_id': document_id})['Item']
+    s3_mock.put_object(Bucket='user-documents-bucket', Key=item['s3_key'], Body=b'imagen')
+
+    s3_event = {'Records': [{
+        'eventSource': 'aws:s3',
+        'eventName': 'ObjectCreated:Post',
+        's3': {
+            'bucket': {'name': 'user-documents-bucket'},
+            'object': {'key': item['s3_key'].replace(' ', '+'), 'size': 6, 'eTag': 'abc123'}
+        }
+    }]}
+    assert lambda_handler(s3_event, {}) == {'finalized': 1}
+    assert lambda_handler(s3_event, {}) == {'finalized': 0}
+
+    item = dynamodb_mock.get_item(Key={'user_id': 'user556', 'document_id': document_id})['Item']
+    assert item['status'] == 'committed'
+    assert item['file_size'] == 6
+    assert item['etag'] == 'abc123'
+
+def upload_s3_part(s3_client, user_id, document_id, part_number, data):
+    """Sube una parte directamente a S3 (como con una URL prefirmada)."""
+    session = get_table().get_item(Key={'user_id': user_id, 'document_id': document_id})['Item']
+    return s3_client.upload_part(Bucket=session['s3_bucket'], Key=session['s3_key'],
+                                 UploadId=session['multipart_upload_id'], PartNumber=part_number, Body=data)
+
+def test_multipart_upload_resume_and_complete(s3_mock, dynamodb_mock):
+    """Test subida multipart reanudable: partes, listado, URLs prefirmadas y completado."""
+    response = start_direct_upload('user600', 'scan', 'scan.tiff', upload_mode='multipart')
+    assert response['statusCode'] == 201
+    document_id = json.loads(response['body'])['document_id']
+    session_path = f'/documents/user600/{document_id}/upload'
+
+    # Completar sin partes no es posible
+    complete_event = {'httpMethod': 'POST', 'path': f'/documents/user600/{document_id}/complete'}
+    assert lambda_handler(complete_event, {})['statusCode'] == 409
+
+    # Una parte de 5 MiB no cabe en el payload de Lambda: va directa a S3
+    first_part = b'a' * (5 * 1024 * 1024)
+    response = lambda_handler({
+        'httpMethod': 'PUT',
+        'path': f'{session_path}/parts/1',
+        'body': json.dumps({'part_content': base64.b64encode(first_part).decode('utf-8')})
+    }, {})
+    assert response['statusCode'] == 413
+    upload_s3_part(s3_mock, 'user600', document_id, 1, first_part)
+
+    # Tras un corte el cliente consulta qué partes recibió S3
+    response = lambda_handler({'httpMethod': 'GET', 'path': session_path}, {})
+    assert response['statusCode'] == 200
+    parts = json.loads(response['body'])['parts']
+    assert [(part['part_number'], part['size']) for part in parts] == [(1, len(first_part))]
+
+    response = lambda_handler({
+        'httpMethod': 'POST',
+        'path': f'{session_path}/parts',
+        'body': json.dumps({'part_numbers': [2]})
+    }, {})
+    assert response['statusCode'] == 200
+    assert 'partNumber=2' in json.loads(response['body'])['parts'][0]['url']
+
+    response = lambda_handler({
+        'httpMethod': 'PUT',
+        'path': f'{session_path}/parts/2',
+        'isBase64Encoded': True,
+        'body': base64.b64encode(b'final').decode('utf-8')
+    }, {})
+    assert response['statusCode'] == 200
+
+    response = lambda_handler(complete_event, {})
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['file_size'] == len(first_part) + 5
+
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/user600/scan'}, {})
+    assert response['statusCode'] == 200
+    assert base64.b64decode(json.loads(response['body'])['file_content']).endswith(b'aaaafinal')
+
+def test_complete_upload_rejects_internal_items(s3_mock, dynamodb_mock):
+    """Test complete sobre items internos (LATEST#, BLOB#, IDEMPOTENCY#): 404 sin tocarlos."""
+    assert upload('user604', 'payslip', 'payslip.pdf', 'nomina')['statusCode'] == 201
+    internal = [item for item in dynamodb_mock.scan()['Items'] if '#' in item['document_id']]
+    assert internal
+    for item in internal:
+        path = f"/documents/user604/{item['document_id']}/complete"
+        response = lambda_handler({'httpMethod': 'POST', 'path': path}, {})
+        assert response['statusCode'] == 404
+        assert dynamodb_mock.get_item(Key={'user_id': 'user604', 'document_id': item['document_id']})['Item'] == item
+
+def test_multipart_complete_rejects_incomplete_parts(s3_mock, dynamodb_mock):
+    """Test completar con huecos, tamaño distinto al declarado o partes intermedias pequeñas."""
+    response = start_direct_upload('user602', 'scan', 'scan.tiff', upload_mode='multipart', file_size=20)
+    document_id = json.loads(response['body'])['document_id']
+    complete_path = f'/documents/user602/{document_id}/complete'
+    part = b'a' * (5 * 1024 * 1024)
+    upload_s3_part(s3_mock, 'user602', document_id, 1, part)
+    upload_s3_part(s3_mock, 'user602', document_id, 3, b'end')
+
+    response = lambda_handler({'httpMethod': 'POST', 'path': complete_path}, {})
+    assert response['statusCode'] == 409
+    assert json.loads(response['body'])['error'] == 'Missing parts: 2'
+
+    upload_s3_part(s3_mock, 'user602', document_id, 2, b'small')
+    response = lambda_handler({'httpMethod': 'POST', 'path': complete_path}, {})
+    assert response['statusCode'] == 400
+
+    upload_s3_part(s3_mock, 'user602', document_id, 2, part)
+    response = lambda_handler({'httpMethod': 'POST', 'path': complete_path}, {})
+    assert response['statusCode'] == 409
+    assert 'declared file_size 20' in json.loads(response['body'])['error']
+
+    response = lambda_handler({'httpMethod': 'POST', 'path': complete_path,
+                               'body': json.dumps({'file_size': 2 * len(part) + 3,
+                                                   'parts': [{'part_number': 1, 'etag': 'other'}]})}, {})
+    assert response['statusCode'] == 409
+    assert json.loads(response['body'])['error'] == 'Uploaded parts do not match the declared parts'
+
+    response = lambda_handler({'httpMethod': 'POST', 'path': complete_path,
+                               'body': json.dumps({'file_size': 2 * len(part) + 3})}, {})
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['status'] == 'committed'
+
+def test_multipart_complete_retry_after_metadata_failure(s3_mock, dynamodb_mock, monkeypatch):
+    """Test reintento de complete cuando S3 completó el objeto pero falló la finalización."""
+    from backend.lambdas import direct_uploads
+    response = start_direct_upload('user603', 'scan', 'scan.tiff', upload_mode='multipart')
+    document_id = json.loads(response['body'])['document_id']
+    complete_event = {'httpMethod': 'POST', 'path': f'/documents/user603/{document_id}/complete'}
+    upload_s3_part(s3_mock, 'user603', document_id, 1, b'single part')
+
+    with monkeypatch.context() as patch:
+        def failing_finalize(*args, **kwargs):
+            raise client_error('ProvisionedThroughputExceededException', 'UpdateItem')
+        patch.setattr(direct_uploads, 'finalize_document', failing_finalize)
+        assert lambda_handler(complete_event, {})['statusCode'] == 500
+
+    response = lambda_handler(complete_event, {})
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['file_size'] == len(b'single part')
+
+def test_multipart_upload_abort(s3_mock, dynamodb_mock):
+    """Test abortar una subida multipart."""
+    response = start_direct_upload('user601', 'scan', 'scan.tiff', upload_mode='multipart')
+    document_id = json.loads(response['body'])['document_id']
+    session_path = f'/documents/user601/{document_id}/upload'
+
+    assert lambda_handler({'httpMethod': 'PUT', 'path': f'{session_path}/parts/0', 'isBase64Encoded': True,
+                           'body': 'YQ=='}, {})['statusCode'] == 400
+
+    response = lambda_handler({'httpMethod': 'DELETE', 'path': session_path}, {})
+    assert response['statusCode'] == 200
+    assert 'Item' not in dynamodb_mock.get_item(Key={'user_id': 'user601', 'document_id': document_id})
+    assert s3_mock.list_multipart_uploads(Bucket='user-documents-bucket').get('Uploads', []) == []
+    assert lambda_handler({'httpMethod': 'GET', 'path': session_path}, {})['statusCode'] == 404
+
+def test_request_logging_omits_file_content(s3_mock, dynamodb_mock, caplog):
+    """Test que el log de la request solo incluye enrutamiento, tamaños y tiempos."""
+    secret = 'contenido-confidencial-del-documento'
+    with caplog.at_level(logging.INFO):
+        response = upload('user700', 'contract', 'contract.pdf', secret)
+    assert response['statusCode'] == 201
+
+    encoded_secret = base64.b64encode(secret.encode('utf-8')).decode('utf-8')
+    assert encoded_secret not in caplog.text
+    records = [json.loads(record.getMessage()) for record in caplog.records if record.name.endswith('request_logging')]
+    assert [record['event'] for record in records] == ['request', 'response']
+    assert records[1]['status'] == 201
+    assert records[1]['path'] == '/documents'
+    assert records[1]['body_bytes'] > len(encoded_secret)
+    assert 'duration_ms' in records[1]
+
+def test_request_logging_sampling(s3_mock, dynamodb_mock, caplog, monkeypatch):
+    """Test que las requests fuera de la muestra no se registran salvo los errores."""
+    monkeypatch.setenv('LOG_SAMPLE_RATE', '0')
+    reset_settings()
+    with caplog.at_level(logging.INFO):
+        lambda_handler({'httpMethod': 'GET', 'path': '/documents/user700/contract'}, {})
+    assert not [record for record in caplog.records if record.name.endswith('request_logging')]
+
+def test_redact_body_truncates_and_hides_content():
+    """Test redacción y truncado del cuerpo para logs en nivel DEBUG."""
+    body = json.dumps({'user_id': 'u1', 'file_content': 'QUJD' * 100, 'file_name': 'a.pdf'})
+    redacted = redact_body(body, 1000)
+    assert 'QUJD' not in redacted
+    assert '"file_content":"<redacted>"' in redacted
+    assert redact_body('x' * 50, 10) == 'xxxxxxxxxx...<truncated 40 chars>'
+
+def client_error(code, operation):
+    from botocore.exceptions import ClientError
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+def test_upload_writes_s3_and_dynamodb_in_parallel(s3_mock, dynamodb_mock, monkeypatch):
+    """Test que put_object y put_item se lanzan a la vez."""
+    import threading
+    barrier = threading.Barrier(2, timeout=5)
+    s3_client = get_client('s3')
+    table = get_table()
+    original_put_object = s3_client.put_object
+    original_put_item = table.put_item
+
+    def put_object(**kwargs):
+        barrier.wait()
+        return original_put_object(**kwargs)
+
+    def put_item(**kwargs):
+        barrier.wait()
+        return original_put_item(**kwargs)
+
+    monkeypatch.setattr(s3_client, 'put_object', put_object)
+    monkeypatch.setattr(table, 'put_item', put_item)
+
+    assert upload('user800', 'contract', 'contract.pdf', 'paralelo')['statusCode'] == 201
+
+def test_upload_compensates_failed_s3_write(s3_mock, dynamodb_mock, monkeypatch):
+    """Test que si falla S3 no quedan metadatos huérfanos."""
+    def put_object(**kwargs):
+        raise client_error('InternalError', 'PutObject')
+
+    monkeypatch.setattr(get_client('s3'), 'put_object', put_object)
+
+    response = upload('user801', 'contract', 'contract.pdf', 'fallo')
+    assert response['statusCode'] == 500
+    assert json.loads(response['body'])['error'] == 'Failed to upload file to S3'
+    assert dynamodb_mock.scan()['Items'] == []
+
+def test_upload_compensates_failed_dynamodb_write(s3_mock, dynamodb_mock, monkeypatch):
+    """Test que si falla DynamoDB no quedan archivos huérfanos en S3."""
+    def put_item(**kwargs):
+        raise client_error('InternalServerError', 'PutItem')
+
+    monkeypatch.setattr(get_table(), 'put_item', put_item)
+
+    response = upload('user802', 'contract', 'contract.pdf', 'fallo')
+    assert response['statusCode'] == 500
+    assert json.loads(response['body'])['error'] == 'Failed to save document metadata'
+    assert s3_mock.list_objects_v2(Bucket='user-documents-bucket').get('KeyCount') == 0
+
+def batch_event(documents):
+    return {'httpMethod': 'POST', 'path': '/documents/batch', 'body': json.dumps({'documents': documents})}
+
+def batch_document(user_id, document_type, file_name, content):
+    return {
+        'user_id': user_id,
+        'document_type': document_type,
+        'file_name': file_name,
+        'file_content': base64.b64encode(content.encode('utf-8')).decode('utf-8')
+    }
+
+def test_batch_upload_with_per_item_results(s3_mock, dynamodb_mock):
+    """Test subida por lotes con resultados por documento."""
+    response = lambda_handler(batch_event([
+        batch_document('user850', 'identification', 'id.pdf', 'cedula'),
+        batch_document('user850', 'contract', 'contract.pdf', 'contrato'),
+        {'user_id': 'user850', 'document_type': 'certificate'},
+        batch_document('user850', 'certificate', 'cert.pdf', 'certificado')
+    ]), {})
+
+    assert response['statusCode'] == 207
+    response_body = json.loads(response['body'])
+    assert response_body['succeeded'] == 3
+    assert response_body['failed'] == 1
+    assert [result['status'] for result in response_body['results']] == [201, 201, 400, 201]
+    assert response_body['results'][2]['error'] == 'Missing required field: file_name'
+
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/user850/contract'}, {})
+    assert base64.b64decode(json.loads(response['body'])['file_content']) == b'contrato'
+    assert s3_mock.list_objects_v2(Bucket='user-documents-bucket')['KeyCount'] == 3
+
+def test_batch_upload_retries_unprocessed_items(s3_mock, dynamodb_mock, monkeypatch):
+    """Test reintento de UnprocessedItems y compensación de los que no se escriben."""
+    from backend.lambdas import batch_uploads
+    from backend.lambdas.aws_clients import get_resource
+
+    monkeypatch.setattr(batch_uploads, '_sleep', lambda seconds: None)
+    dynamodb = get_resource('dynamodb')
+    original = dynamodb.batch_write_item
+    calls = []
+
+    def flaky_batch_write_item(RequestItems):
+        # Primera llamada: solo se procesa el primer item
+        calls.append(RequestItems)
+        requests = RequestItems['UserDocuments']
+        if len(calls) == 1:
+            original(RequestItems={'UserDocuments': requests[:1]})
+            return {'UnprocessedItems': {'UserDocuments': requests[1:]}}
+        return original(RequestItems=RequestItems)
+
+    monkeypatch.setattr(dynamodb, 'batch_write_item', flaky_batch_write_item)
+    response = lambda_handler(batch_event([
+        batch_document('user851', 'identification', 'id.pdf', 'cedula'),
+        batch_document('user851', 'contract', 'contract.pdf', 'contrato')
+    ]), {})
+    assert response['statusCode'] == 201
+    assert len(calls) == 2
+    assert len(version_items(dynamodb_mock)) == 2
+
+    # Si nunca se procesan, se compensan los archivos subidos
+    monkeypatch.setattr(dynamodb, 'batch_write_item',
+                        lambda RequestItems: {'UnprocessedItems': RequestItems})
+    response = lambda_handler(batch_event([batch_document('user852', 'contract', 'c.pdf', 'x')]), {})
+    assert response['statusCode'] == 207
+    assert json.loads(response['body'])['results'][0]['error'] == 'Failed to save document metadata'
+    assert s3_mock.list_objects_v2(Bucket='user-documents-bucket', Prefix='user852/')['KeyCount'] == 0
+
+def test_batch_write_stops_at_the_deadline(s3_mock, dynamodb_mock, monkeypatch):
+    """Test reintento de UnprocessedItems: no se espera si otro intento no cabe en el plazo."""
+    from backend.lambdas import batch_uploads, resilience
+    from backend.lambdas.aws_clients import get_resource
+    calls = []
+
+    def unprocessed(RequestItems):
+        calls.append(RequestItems)
+        return {'UnprocessedItems': RequestItems}
+
+    monkeypatch.setattr(get_resource('dynamodb'), 'batch_write_item', unprocessed)
+    monkeypatch.setattr(batch_uploads, '_sleep', lambda seconds: pytest.fail('sleep'))
+    monkeypatch.setattr(resilience, 'remaining_time', lambda: 0.05)
+    failed = batch_uploads.batch_write_items('UserDocuments', [{'user_id': 'u', 'document_id': 'd'}])
+    assert failed == {('u', 'd')}
+    assert len(calls) == 1
+
+def test_batch_upload_compensates_unexpected_error(s3_mock, dynamodb_mock, monkeypatch):
+    """Test error inesperado tras subir los archivos del lote: no quedan archivos ni metadatos."""
+    from backend.lambdas import batch_uploads
+    original = batch_uploads.batch_write_items
+
+    def failing_batch_write_items(table_name, items):
+        original(table_name, items)
+        raise RuntimeError('unexpected')
+
+    monkeypatch.setattr(batch_uploads, 'batch_write_items', failing_batch_write_items)
+    response = lambda_handler(batch_event([
+        batch_document('user853', 'identification', 'id.pdf', 'cedula'),
+        batch_document('user853', 'contract', 'contract.pdf', 'contrato')
+    ]), {})
+    assert response['statusCode'] == 500
+    assert s3_mock.list_objects_v2(Bucket='user-documents-bucket')['KeyCount'] == 0
+    assert version_items(dynamodb_mock) == []
+
+def put_document_metadata(table, user_id, document_id, document_type, upload_date):
+    table.put_item(Item={
+        'user_id': user_id, 'document_id': document_id, 'document_type': document_type,
+        'file_name': f'{document_id}.pdf', 's3_bucket': 'user-documents-bucket',
+        's3_key': f'{user_id}/{document_type}/{document_id}_{document_id}.pdf',
+        'upload_date': upload_date, 'type_date': f'{document_type}#{upload_date}', 'file_size': 10
+    })
+
+def list_event(user_id, **params):
+    return {'httpMethod': 'GET', 'path': f'/documents/{user_id}', 'queryStringParameters': params or None}
+
+def test_list_documents_paginates_metadata_only(s3_mock, dynamodb_mock):
+    """Test listado paginado con proyección reducida y sin acceso a S3."""
+    for day in range(1, 6):
+        put_document_metadata(dynamodb_mock, 'user900', f'doc-{day}', 'contract' if day % 2 else 'photo',
+                              f'2024-05-0{day}T10:00:00')
+    put_document_metadata(dynamodb_mock, 'user901', 'other', 'contract', '2024-05-03T10:00:00')
+    # Un documento pendiente no aparece en el listado
+    assert start_direct_upload('user900', 'contract', 'pending.pdf', file_size=10)['statusCode'] == 201
+
+    seen = []
+    params = {'limit': '2'}
+    while True:
+        response = lambda_handler(list_event('user900', **params), {})
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['count'] <= 2
+        seen.extend(body['documents'])
+        if not body['next_token']:
+            break
+        params['next_token'] = body['next_token']
+
+    assert [document['document_id'] for document in seen] == ['doc-5', 'doc-4', 'doc-3', 'doc-2', 'doc-1']
+    assert set(seen[0]) == {'document_id', 'document_type', 'file_name', 'file_size', 'upload_date'}
+    assert seen[0]['file_size'] == 10
+
+    # Un token de otro usuario no es válido
+    response = lambda_handler(list_event('user901', next_token=params['next_token']), {})
+    assert response['statusCode'] == 400
+
+def test_list_documents_filters_by_type_and_date(s3_mock, dynamodb_mock):
+    """Test filtros por tipo y rango de fechas con la condición de clave."""
+    for day in range(1, 6):
+        put_document_metadata(dynamodb_mock, 'user902', f'doc-{day}', 'contract' if day % 2 else 'photo',
+                              f'2024-05-0{day}T10:00:00')
+
+    def listed(**params):
+        response = lambda_handler(list_event('user902', **params), {})
+        assert response['statusCode'] == 200
+        return [document['document_id'] for document in json.loads(response['body'])['documents']]
+
+    assert listed(document_type='contract') == ['doc-5', 'doc-3', 'doc-1']
+    assert listed(**{'from': '2024-05-02', 'to': '2024-05-04'}) == ['doc-4', 'doc-3', 'doc-2']
+    assert listed(**{'to': '2024-05-02'}) == ['doc-2', 'doc-1']
+    assert listed(**{'document_type': 'contract', 'from': '2024-05-03'}) == ['doc-5', 'doc-3']
+
+    for params in ({'limit': '0'}, {'from': 'yesterday'}, {'from': '2024-05-04', 'to': '2024-05-01'},
+                   {'next_token': 'not-a-token'}, {'document_type': 'a#b'}):
+        assert lambda_handler(list_event('user902', **params), {})['statusCode'] == 400
+
+def test_get_document_conditional_requests(s3_mock, dynamodb_mock, monkeypatch):
+    """Test ETag/Last-Modified y respuestas 304 sin leer el objeto de S3."""
+    import hashlib
+    assert upload('user960', 'contract', 'contract.pdf', 'contenido')['statusCode'] == 201
+
+    event = {'httpMethod': 'GET', 'path': '/documents/user960/contract'}
+    response = lambda_handler(event, {})
+    assert response['statusCode'] == 200
+    etag = response['headers']['ETag']
+    last_modified = response['headers']['Last-Modified']
+    assert etag == '"%s"' % hashlib.md5(b'contenido').hexdigest()
+    # El ETag guardado coincide con el de S3
+    s3_key = version_items(dynamodb_mock)[0]['s3_key']
+    assert s3_mock.head_object(Bucket='user-documents-bucket', Key=s3_key)['ETag'] == etag
+
+    s3_client = get_client('s3')
+    def fail_get_object(**kwargs):
+        raise AssertionError('S3 must not be read for a 304')
+    monkeypatch.setattr(s3_client, 'get_object', fail_get_object)
+
+    for headers in ({'If-None-Match': etag}, {'if-none-match': f'"other", W/{etag}'},
+                    {'If-Modified-Since': last_modified}):
+        response = lambda_handler(dict(event, headers=headers), {})
+        assert response['statusCode'] == 304
+        assert response['body'] == ''
+        assert response['headers']['ETag'] == etag
+
+    monkeypatch.undo()
+    # If-None-Match tiene prioridad sobre If-Modified-Since
+    for headers in ({'If-None-Match': '"other"', 'If-Modified-Since': last_modified},
+                    {'If-Modified-Since': 'Mon, 01 Jan 2001 00:00:00 GMT'},
+                    {'If-Modified-Since': 'not a date'}):
+        assert lambda_handler(dict(event, headers=headers), {})['statusCode'] == 200
+
+def test_get_document_range_requests(s3_mock, dynamodb_mock, monkeypatch):
+    """Test descargas parciales con Range u offset/length (206 y 416)."""
+    monkeypatch.setenv('RANGE_MAX_BYTES', '8')
+    reset_settings()
+    content = 'abcdefghijklmnopqrstuvwxyz'
+    assert upload('user970', 'scan', 'scan.pdf', content)['statusCode'] == 201
+
+    def get(headers=None, **params):
+        return lambda_handler({
+            'httpMethod': 'GET',
+            'path': '/documents/user970/scan',
+            'headers': headers,
+            'queryStringParameters': params or None
+        }, {})
+
+    def partial(response):
+        assert response['statusCode'] == 206
+        body = json.loads(response['body'])
+        return base64.b64decode(body['file_content']).decode(), response['headers']['Content-Range']
+
+    assert partial(get({'Range': 'bytes=2-5'})) == ('cdef', 'bytes 2-5/26')
+    assert partial(get({'range': 'bytes=-3'})) == ('xyz', 'bytes 23-25/26')
+    # Los rangos abiertos se limitan a RANGE_MAX_BYTES
+    assert partial(get({'Range': 'bytes=10-'})) == ('klmnopqr', 'bytes 10-17/26')
+    assert partial(get(offset='20', length='100')) == ('uvwxyz', 'bytes 20-25/26')
+
+    response = get({'Range': 'bytes=26-'})
+    assert response['statusCode'] == 416
+    assert response['headers']['Content-Range'] == 'bytes */26'
+    assert get(offset='-1')['statusCode'] == 400
+    assert get(length='0')['statusCode'] == 400
+
+    # Varios rangos o un If-Range obsoleto: documento completo
+    full = get({'Range': 'bytes=0-1,4-5'})
+    assert full['statusCode'] == 200
+    assert full['headers']['Accept-Ranges'] == 'bytes'
+    assert get({'Range': 'bytes=0-1', 'If-Range': '"stale"'})['statusCode'] == 200
+    etag = full['headers']['ETag']
+    assert partial(get({'Range': 'bytes=0-1', 'If-Range': etag})) == ('ab', 'bytes 0-1/26')
+
+def test_get_document_binary_response(s3_mock, dynamodb_mock):
+    """Test respuesta binaria con el content type real y metadatos en headers."""
+    event = {
+        'httpMethod': 'POST',
+        'path': '/documents',
+        'body': json.dumps({
+            'user_id': 'user980',
+            'document_type': 'pension',
+            'file_name': 'resolucion.pdf',
+            'content_type': 'application/pdf',
+            'file_content': base64.b64encode(b'%PDF-1.7 contenido').decode('utf-8')
+        })
+    }
+    assert lambda_handler(event, {})['statusCode'] == 201
+
+    for request in ({'queryStringParameters': {'download': 'binary'}},
+                    {'headers': {'Accept': 'application/octet-stream'}}):
+        response = lambda_handler(dict({'httpMethod': 'GET', 'path': '/documents/user980/pension'}, **request), {})
+        assert response['statusCode'] == 200
+        assert response['isBase64Encoded'] is True
+        assert base64.b64decode(response['body']) == b'%PDF-1.7 contenido'
+        headers = response['headers']
+        assert headers['Content-Type'] == 'application/pdf'
+        assert headers['Content-Disposition'] == 'attachment; filename="resolucion.pdf"'
+        assert headers['X-File-Size'] == '18'
+        assert headers['ETag']
+
+    response = lambda_handler({
+        'httpMethod': 'GET',
+        'path': '/documents/user980/pension',
+        'headers': {'X-Download-Mode': 'binary', 'Range': 'bytes=0-3'}
+    }, {})
+    assert response['statusCode'] == 206
+    assert base64.b64decode(response['body']) == b'%PDF'
+    assert response['headers']['Content-Range'] == 'bytes 0-3/18'
+
+def test_dedup_uploads_store_identical_content_once(s3_mock, dynamodb_mock, monkeypatch):
+    """Test modo deduplicado: el contenido repetido solo se sube una vez."""
+    monkeypatch.setenv('DEDUP_UPLOADS', 'true')
+    reset_settings()
+    assert upload('user990', 'identification', 'cedula.jpg', 'misma cedula')['statusCode'] == 201
+    s3_client = get_client('s3')
+    original_put_object = s3_client.put_object
+    put_calls = []
+    monkeypatch.setattr(s3_client, 'put_object', lambda **kwargs: put_calls.append(kwargs) or original_put_object(**kwargs))
+    assert upload('user990', 'identification', 'cedula-otra-vez.jpg', 'misma cedula')['statusCode'] == 201
+    assert upload('user990', 'contract', 'contrato.pdf', 'misma cedula')['statusCode'] == 201
+    assert put_calls == []
+
+    objects = s3_mock.list_objects_v2(Bucket='user-documents-bucket')['Contents']
+    assert len(objects) == 1
+    assert objects[0]['Key'].startswith('user990/blobs/')
+    blob = get_table().get_item(Key={'user_id': 'user990', 'document_id': 'BLOB#' + objects[0]['Key'].split('/')[-1]})['Item']
+    assert blob['ref_count'] == 3 and blob['stored'] is True
+
+    for document_type, file_name in (('identification', 'cedula-otra-vez.jpg'), ('contract', 'contrato.pdf')):
+        response = lambda_handler({'httpMethod': 'GET', 'path': f'/documents/user990/{document_type}'}, {})
+        body = json.loads(response['body'])
+        assert body['file_name'] == file_name
+        assert base64.b64decode(body['file_content']) == b'misma cedula'
+
+    # El blob no aparece en el listado
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/user990'}, {})
+    assert json.loads(response['body'])['count'] == 3
+
+def test_dedup_upload_releases_blob_when_metadata_fails(s3_mock, dynamodb_mock, monkeypatch):
+    """Test compensación del modo deduplicado al fallar la escritura de metadatos."""
+    monkeypatch.setenv('DEDUP_UPLOADS', 'true')
+    reset_settings()
+    table = get_table()
+    original_put_item = table.put_item
+
+    def failing_put_item(**kwargs):
+        raise client_error('InternalServerError', 'PutItem')
+
+    monkeypatch.setattr(table, 'put_item', failing_put_item)
+    assert upload('user991', 'contract', 'c.pdf', 'contenido')['statusCode'] == 500
+    # Sin referencias: se eliminan el objeto y el item del blob
+    assert s3_mock.list_objects_v2(Bucket='user-documents-bucket')['KeyCount'] == 0
+    assert table.scan()['Items'] == []
+
+    monkeypatch.setattr(table, 'put_item', original_put_item)
+    assert upload('user991', 'contract', 'c.pdf', 'contenido')['statusCode'] == 201
+    monkeypatch.setattr(table, 'put_item', failing_put_item)
+    assert upload('user991', 'photo', 'p.jpg', 'contenido')['statusCode'] == 500
+    # El blob sigue referenciado por el primer documento
+    assert s3_mock.list_objects_v2(Bucket='user-documents-bucket')['KeyCount'] == 1
+    blobs = [item for item in table.scan()['Items'] if item['document_id'].startswith('BLOB#')]
+    assert blobs[0]['ref_count'] == 1
+
+def test_dedup_upload_releases_blob_on_unexpected_error(s3_mock, dynamodb_mock, monkeypatch):
+    """Test compensación del modo deduplicado ante un error que no es de AWS."""
+    from backend.lambdas import lambda_function
+    monkeypatch.setenv('DEDUP_UPLOADS', 'true')
+    reset_settings()
+    assert upload('user992', 'contract', 'c.pdf', 'contenido')['statusCode'] == 201
+    original_submit = lambda_function.submit
+
+    def failing_submit(fn, *args, **kwargs):
+        if fn.__name__ == 'put_object':
+            raise RuntimeError('executor shut down')
+        return original_submit(fn, *args, **kwargs)
+
+    monkeypatch.setattr(lambda_function, 'submit', failing_submit)
+    assert upload('user992', 'photo', 'p.jpg', 'otro contenido')['statusCode'] == 500
+    # El segundo blob no queda referenciado ni el documento a medias
+    items = get_table().scan()['Items']
+    assert [item['file_name'] for item in items if 'file_name' in item] == ['c.pdf']
+    blobs = [item for item in items if item['document_id'].startswith('BLOB#')]
+    assert len(blobs) == 1 and blobs[0]['ref_count'] == 1
+
+def test_dedup_reused_blob_keeps_its_stored_size(s3_mock, dynamodb_mock, monkeypatch):
+    """Test blob reutilizado con otro codec configurado: stored_size es el del objeto en S3."""
+    monkeypatch.setenv('DEDUP_UPLOADS', 'true')
+    monkeypatch.setenv('STORAGE_CODEC', 'gzip')
+    reset_settings()
+    content = '<pension><beneficiario>Ana</beneficiario></pension>\n' * 100
+    assert upload('user996', 'resolution', 'resolucion.xml', content)['statusCode'] == 201
+
+    monkeypatch.setenv('STORAGE_CODEC', 'none')
+    reset_settings()
+    assert upload('user996', 'appeal', 'recurso.xml', content)['statusCode'] == 201
+
+    items = version_items(dynamodb_mock)
+    s3_object = s3_mock.head_object(Bucket='user-documents-bucket', Key=items[0]['s3_key'])
+    assert [item['content_encoding'] for item in items] == ['gzip', 'gzip']
+    assert [item['stored_size'] for item in items] == [s3_object['ContentLength']] * 2
+
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/user996/appeal'}, {})
+    assert base64.b64decode(json.loads(response['body'])['file_content']).decode() == content
+
+def test_compressed_storage_round_trip(s3_mock, dynamodb_mock, monkeypatch):
+    """Test compresión transparente al guardar y descompresión al leer."""
+    import gzip
+    monkeypatch.setenv('STORAGE_CODEC', 'gzip')
+    reset_settings()
+    content = '<pension><beneficiario>Ana</beneficiario></pension>\n' * 100
+    assert upload('user995', 'resolution', 'resolucion.xml', content)['statusCode'] == 201
+
+    item = version_items(dynamodb_mock)[0]
+    assert item['content_encoding'] == 'gzip'
+    assert item['file_size'] == len(content)
+    s3_object = s3_mock.get_object(Bucket='user-documents-bucket', Key=item['s3_key'])
+    assert s3_object['ContentEncoding'] == 'gzip'
+    assert item['stored_size'] == s3_object['ContentLength'] < len(content) // 5
+
+    event = {'httpMethod': 'GET', 'path': '/documents/user995/resolution'}
+    response = lambda_handler(event, {})
+    assert base64.b64decode(json.loads(response['body'])['file_content']).decode() == content
+
+    # Binario: se envía comprimido si el cliente acepta gzip
+    response = lambda_handler(dict(event, headers={'Accept': 'application/octet-stream', 'Accept-Encoding': 'gzip'}), {})
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    assert response['headers']['ETag'].startswith('W/"')
+    assert gzip.decompress(base64.b64decode(response['body'])).decode() == content
+    response = lambda_handler(dict(event, headers={'Accept': 'application/octet-stream'}), {})
+    assert 'Content-Encoding' not in response['headers']
+    assert base64.b64decode(response['body']).decode() == content
+
+    # Los rangos se refieren al contenido original
+    response = lambda_handler(dict(event, headers={'Range': 'bytes=1-7', 'Accept-Encoding': 'gzip'}), {})
+    assert response['statusCode'] == 206
+    assert base64.b64decode(json.loads(response['body'])['file_content']) == b'pension'
+
+    # El contenido ya comprimido se guarda tal cual
+    jpeg = b'\xff\xd8\xff\xe0' + b'x' * 2000
+    assert lambda_handler({'httpMethod': 'POST', 'path': '/documents', 'body': json.dumps({
+        'user_id': 'user995', 'document_type': 'photo', 'file_name': 'foto.jpg',
+        'file_content': base64.b64encode(jpeg).decode('utf-8')
+    })}, {})['statusCode'] == 201
+    photo = [i for i in version_items(dynamodb_mock) if i['document_type'] == 'photo'][0]
+    assert 'content_encoding' not in photo
+
+def test_upload_spills_large_content_to_disk(s3_mock, dynamodb_mock, monkeypatch):
+    """Test subida mayor que el spool en memoria."""
+    monkeypatch.setenv('UPLOAD_SPOOL_MAX_BYTES', '1024')
+    reset_settings()
+    content = ''.join(chr(ord('a') + i % 26) for i in range(300000))
+    assert upload('user994', 'report', 'informe.txt', content)['statusCode'] == 201
+
+    item = version_items(dynamodb_mock)[0]
+    assert item['file_size'] == len(content)
+    s3_object = s3_mock.get_object(Bucket='user-documents-bucket', Key=item['s3_key'])
+    assert s3_object['Body'].read().decode() == content
+    assert s3_object['ETag'].strip('"') == item['etag']
+
+    event = {'httpMethod': 'POST', 'path': '/documents', 'body': json.dumps({
+        'user_id': 'user994', 'document_type': 'report', 'file_name': 'roto.txt', 'file_content': 'abcde'
+    })}
+    response = lambda_handler(event, {})
+    assert response['statusCode'] == 400
+    assert 'base64' in json.loads(response['body'])['error']
+
+def test_upload_rejected_before_decoding(s3_mock, dynamodb_mock, monkeypatch):
+    """Test límites de tamaño, tipos y extensiones antes de decodificar."""
+    from backend.lambdas import lambda_function
+    from backend.lambdas.upload_stream import decode_base64_content
+    monkeypatch.setenv('MAX_REQUEST_BODY_BYTES', '4096')
+    monkeypatch.setenv('MAX_UPLOAD_BYTES', '2048')
+    monkeypatch.setenv('DOCUMENT_TYPE_MAX_BYTES', 'photo=100')
+    monkeypatch.setenv('ALLOWED_DOCUMENT_TYPES', 'photo,resolution')
+    monkeypatch.setenv('ALLOWED_FILE_EXTENSIONS', '.PDF,jpg')
+    reset_settings()
+
+    def fail_decode(*args, **kwargs):
+        raise AssertionError('el contenido no debe decodificarse')
+    monkeypatch.setattr(lambda_function, 'decode_base64_content', fail_decode)
+
+    def status(document_type, file_name, size, **event_extra):
+        return lambda_handler(dict({'httpMethod': 'POST', 'path': '/documents', 'body': json.dumps({
+            'user_id': 'user993', 'document_type': document_type, 'file_name': file_name,
+            'file_content': base64.b64encode(b'x' * size).decode('ascii')
+        })}, **event_extra), {})['statusCode']
+
+    assert status('resolution', 'a.pdf', 3500) == 413                        # cuerpo
+    assert status('resolution', 'a.pdf', 10, headers={'Content-Length': '999999'}) == 413
+    assert status('resolution', 'a.pdf', 2049) == 413                        # MAX_UPLOAD_BYTES
+    assert status('photo', 'a.jpg', 101) == 413                              # límite del tipo
+    assert status('passport', 'a.pdf', 10) == 400
+    assert status('photo', 'a.exe', 10) == 400
+
+    for name in ('MAX_REQUEST_BODY_BYTES', 'MAX_UPLOAD_BYTES', 'ALLOWED_DOCUMENT_TYPES', 'ALLOWED_FILE_EXTENSIONS'):
+        monkeypatch.delenv(name)
+    monkeypatch.setattr(lambda_function, 'decode_base64_content', decode_base64_content)
+    reset_settings()
+    assert status('photo', 'a.jpg', 100) == 201
+
+    response = lambda_handler(batch_event([
+        batch_document('user993', 'photo', 'a.jpg', 'x' * 101),
+        batch_document('user993', 'photo', 'b.jpg', 'x' * 99)
+    ]), {})
+    results = json.loads(response['body'])['results']
+    assert [result['status'] for result in results] == [413, 201]
+
+def test_routes_reject_malformed_paths(s3_mock, dynamodb_mock):
+    """Test 404 para paths mal formados y 405 para métodos no soportados."""
+    upload('user992', 'passport', 'pasaporte.pdf', 'contenido')
+    assert lambda_handler({'httpMethod': 'GET', 'path': '/documents/user992/passport'}, {})['statusCode'] == 200
+    for path in ('/documents/user992/passport/extra', '/documents//passport', '/documents/user992/passport/'):
+        assert lambda_handler({'httpMethod': 'GET', 'path': path}, {})['statusCode'] == 404
+
+    response = lambda_handler({'httpMethod': 'DELETE', 'path': '/documents/user992/passport'}, {})
+    assert response['statusCode'] == 405
+    assert response['headers']['Allow'] == 'GET'
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents'}, {})
+    assert response['statusCode'] == 405
+    assert response['headers']['Allow'] == 'POST'
+
+def test_initialize_creates_shared_resources(aws_credentials, monkeypatch):
+    """Test inicialización de la fase de init de Lambda."""
+    from backend.lambdas import aws_clients, lambda_function
+    monkeypatch.setenv('AWS_LAMBDA_FUNCTION_NAME', 'user-documents')
+    reset_settings()
+    assert load_settings().eager_init
+    assert not load_settings({'AWS_LAMBDA_FUNCTION_NAME': 'x', 'EAGER_INIT': 'false'}).eager_init
+
+    lambda_function.initialize()
+    assert 's3' in aws_clients._clients
+    assert 'UserDocuments' in aws_clients._tables
+
+def test_document_versions_with_latest_pointer(s3_mock, dynamodb_mock, monkeypatch):
+    """Test historial de versiones y puntero LATEST# a la más reciente."""
+    from backend.lambdas import versions
+    for i in range(3):
+        assert upload('user960', 'payslip', f'payslip_{i}.pdf', f'nomina {i}')['statusCode'] == 201
+    assert upload('user960', 'contract', 'contract.pdf', 'contrato')['statusCode'] == 201
+    history = sorted(version_items(dynamodb_mock), key=lambda item: item['upload_date'])
+    payslips = [item for item in history if item['document_type'] == 'payslip']
+
+    pointer = dynamodb_mock.get_item(Key={'user_id': 'user960', 'document_id': 'LATEST#payslip'})['Item']
+    assert pointer['latest']['document_id'] == payslips[-1]['document_id']
+
+    # Con el puntero, el documento más reciente no consulta el índice
+    def no_query(**kwargs):
+        raise AssertionError('query')
+    with monkeypatch.context() as patch:
+        patch.setattr(get_table(), 'query', no_query)
+        response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/user960/payslip'}, {})
+    assert json.loads(response['body'])['file_name'] == 'payslip_2.pdf'
+
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/user960/payslip/versions'}, {})
+    assert response['statusCode'] == 200
+    listed = json.loads(response['body'])['documents']
+    assert [doc['file_name'] for doc in listed] == ['payslip_2.pdf', 'payslip_1.pdf', 'payslip_0.pdf']
+
+    path = f"/documents/user960/payslip/versions/{payslips[0]['document_id']}"
+    response = lambda_handler({'httpMethod': 'GET', 'path': path}, {})
+    assert response['statusCode'] == 200
+    assert base64.b64decode(json.loads(response['body'])['file_content']) == b'nomina 0'
+
+    for path in (f"/documents/user960/contract/versions/{payslips[0]['document_id']}",
+                 '/documents/user960/payslip/versions/LATEST#payslip',
+                 '/documents/user960/payslip/versions/missing'):
+        response = lambda_handler({'httpMethod': 'GET', 'path': path}, {})
+        assert response['statusCode'] == 404
+
+    # Una versión anterior no mueve el puntero
+    assert not versions.update_latest(dynamodb_mock, payslips[0])
+    assert versions.update_latest(dynamodb_mock, {**payslips[0], 'upload_date': '9999-01-01T00:00:00'})
+
+def test_failed_latest_pointer_update_falls_back_to_index(s3_mock, dynamodb_mock, monkeypatch):
+    """Test fallo al actualizar el puntero LATEST#: se elimina y se lee del índice."""
+    assert upload('user963', 'payslip', 'payslip_0.pdf', 'nomina 0')['statusCode'] == 201
+    table = get_table()
+    original_update_item = table.update_item
+
+    def failing_update_item(**kwargs):
+        if kwargs['Key']['document_id'].startswith('LATEST#'):
+            raise client_error('InternalServerError', 'UpdateItem')
+        return original_update_item(**kwargs)
+
+    monkeypatch.setattr(table, 'update_item', failing_update_item)
+    assert upload('user963', 'payslip', 'payslip_1.pdf', 'nomina 1')['statusCode'] == 201
+    assert 'Item' not in dynamodb_mock.get_item(Key={'user_id': 'user963', 'document_id': 'LATEST#payslip'})
+
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/user963/payslip'}, {})
+    assert json.loads(response['body'])['file_name'] == 'payslip_1.pdf'
+
+def test_get_document_without_latest_pointer(s3_mock, dynamodb_mock):
+    """Test documentos anteriores al puntero: se resuelven con el índice tipo#fecha."""
+    put_document_metadata(dynamodb_mock, 'user961', 'doc-1', 'passport', '2024-01-01T00:00:00')
+    put_document_metadata(dynamodb_mock, 'user961', 'doc-2', 'passport', '2024-02-01T00:00:00')
+    s3_mock.put_object(Bucket='user-documents-bucket', Key='user961/passport/doc-2_doc-2.pdf', Body=b'pasaporte')
+
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/user961/passport'}, {})
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['document_id'] == 'doc-2'
+
+def test_version_retention_expires_old_versions(s3_mock, dynamodb_mock, monkeypatch):
+    """Test VERSION_RETENTION: se eliminan las versiones antiguas y su contenido."""
+    monkeypatch.setenv('VERSION_RETENTION', '2')
+    reset_settings()
+    for i in range(4):
+        assert upload('user962', 'receipt', f'receipt_{i}.pdf', f'recibo {i}')['statusCode'] == 201
+
+    remaining = sorted(item['file_name'] for item in version_items(dynamodb_mock))
+    assert remaining == ['receipt_2.pdf', 'receipt_3.pdf']
+    objects = s3_mock.list_objects_v2(Bucket='user-documents-bucket', Prefix='user962/')['Contents']
+    assert sorted(obj['Key'].split('_', 1)[1] for obj in objects) == ['receipt_2.pdf', 'receipt_3.pdf']
+    pointer = dynamodb_mock.get_item(Key={'user_id': 'user962', 'document_id': 'LATEST#receipt'})['Item']
+    assert pointer['latest']['file_name'] == 'receipt_3.pdf'
+
+def idempotent_upload(key, content):
+    """Subida con Idempotency-Key."""
+    event = {
+        'httpMethod': 'POST',
+        'path': '/documents',
+        'headers': {'Idempotency-Key': key},
+        'body': json.dumps({
+            'user_id': 'user970',
+            'document_type': 'invoice',
+            'file_name': 'invoice.pdf',
+            'file_content': base64.b64encode(content.encode('utf-8')).decode('utf-8')
+        })
+    }
+    return lambda_handler(event, {})
+
+def test_idempotent_upload_replays_original_response(s3_mock, dynamodb_mock, monkeypatch):
+    """Test reintento con la misma Idempotency-Key: misma respuesta, sin escribir en S3."""
+    from backend.lambdas import idempotency
+    first = idempotent_upload('retry-1', 'factura')
+    assert first['statusCode'] == 201
+
+    def no_put(**kwargs):
+        raise AssertionError('put_object')
+    monkeypatch.setattr(get_client('s3'), 'put_object', no_put)
+
+    # Mismo contenedor (caché) y otro contenedor (registro en DynamoDB)
+    for reset in (False, True):
+        if reset:
+            idempotency.reset_response_cache()
+        retry = idempotent_upload('retry-1', 'factura')
+        assert retry['statusCode'] == 201
+        assert retry['body'] == first['body']
+        assert retry['headers']['Idempotent-Replayed'] == 'true'
+    assert len(version_items(dynamodb_mock)) == 1
+
+    response = idempotent_upload('retry-1', 'otra factura')
+    assert response['statusCode'] == 422
+
+def test_idempotent_upload_serializes_concurrent_duplicates(s3_mock, dynamodb_mock):
+    """Test duplicada concurrente (clave en curso) y clave liberada tras un 5xx."""
+    from backend.lambdas import idempotency
+    table = get_table()
+    event = {'body': 'payload'}
+    assert idempotency.claim(table, 'user971', 'key-1', idempotency.request_fingerprint(event)) is None
+
+    response = idempotency.run_idempotent(event, table, 'user971', 'key-1', lambda: pytest.fail('handler'))
+    assert response['statusCode'] == 409
+    assert response['headers']['Retry-After'] == '1'
+
+    idempotency.complete(table, 'user971', 'key-1', {'statusCode': 500})
+    response = idempotency.run_idempotent(event, table, 'user971', 'key-1',
+                                          lambda: create_response(201, {'ok': True}))
+    assert response['statusCode'] == 201
+
+    event = {'httpMethod': 'POST', 'path': '/documents', 'headers': {'Idempotency-Key': ' '}, 'body': '{}'}
+    assert idempotency.get_idempotency_key(event)[1]['statusCode'] == 400
+
+def test_request_fingerprint_hashes_in_chunks():
+    """Test fingerprint por bloques: igual al sha256 del cuerpo completo."""
+    import hashlib
+    from backend.lambdas import idempotency
+    body = 'ñandú €' * (idempotency.FINGERPRINT_CHUNK_CHARS // 3)
+    expected = hashlib.sha256(body.encode('utf-8')).hexdigest()
+    assert idempotency.request_fingerprint({'body': body}) == expected
+    assert idempotency.request_fingerprint({'body': body.encode('utf-8')}) == expected
+    assert idempotency.request_fingerprint({}) == hashlib.sha256(b'').hexdigest()
@@ -0,0 +1,94 @@
+import json
+import base64
+
+from backend.lambdas.lambda_function import lambda_handler
+from backend.lambdas.metadata_cache import TTLCache, get_metadata_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    """Test caducidad por TTL (positiva y negativa) y expulsión LRU."""
+    clock = FakeClock()
+    cache = TTLCache(max_entries=2, ttl=10, negative_ttl=1, clock=clock)
+    cache.put('a', {'id': 'a'})
+    cache.put('missing', None)
+    assert cache.get('missing') == (True, None)
+
+    clock.now = 2
+    assert cache.get('missing') == (False, None)
+    assert cache.get('a') == (True, {'id': 'a'})
+
+    cache.put('b', {'id': 'b'})
+    cache.get('a')
+    cache.put('c', {'id': 'c'})
+    assert cache.get('b') == (False, None)
+    assert cache.get('a')[0] and cache.get('c')[0]
+
+    clock.now = 20
+    assert cache.get('a') == (False, None)
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 5
+    assert stats['misses'] == 3
+
+
+def test_ttl_cache_disabled_with_zero_entries():
+    cache = TTLCache(max_entries=0, ttl=10, negative_ttl=1)
+    cache.put('a', {'id': 'a'})
+    assert cache.get('a') == (False, None)
+
+
+def get_contract(user_id):
+    return lambda_handler({'httpMethod': 'GET', 'path': f'/documents/{user_id}/contract'}, {})
+
+
+def upload_contract(user_id, content):
+    return lambda_handler({'httpMethod': 'POST', 'path': '/documents', 'body': json.dumps({
+        'user_id': user_id,
+        'document_type': 'contract',
+        'file_name': 'contract.pdf',
+        'file_content': base64.b64encode(content).decode('utf-8')
+    })}, {})
+
+
+def test_get_document_uses_cache_and_upload_invalidates(s3_mock, dynamodb_mock, monkeypatch):
+    """Test lecturas repetidas servidas desde la caché e invalidación al subir."""
+    from backend.lambdas import lambda_function
+
+    original_get_latest = lambda_function.get_latest
+    queries = []
+
+    def counting_get_latest(*args):
+        queries.append(args)
+        return original_get_latest(*args)
+
+    monkeypatch.setattr(lambda_function, 'get_latest', counting_get_latest)
+
+    # El 404 también se cachea
+    assert get_contract('user950')['statusCode'] == 404
+    assert get_contract('user950')['statusCode'] == 404
+    assert len(queries) == 1
+
+    # La subida invalida el resultado negativo
+    assert upload_contract('user950', b'v1')['statusCode'] == 201
+    response = get_contract('user950')
+    assert base64.b64decode(json.loads(response['body'])['file_content']) == b'v1'
+    assert get_contract('user950')['statusCode'] == 200
+    assert len(queries) == 2
+
+    # Una nueva versión reemplaza la cacheada
+    assert upload_contract('user950', b'v2')['statusCode'] == 201
+    response = get_contract('user950')
+    assert base64.b64decode(json.loads(response['body'])['file_content']) == b'v2'
+    assert len(queries) == 3
+
+    stats = get_metadata_cache().stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 3
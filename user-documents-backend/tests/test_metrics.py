@@ -0,0 +1,71 @@
+import json
+import base64
+import pytest
+
+from backend.lambdas import metrics
+from backend.lambdas.lambda_function import lambda_handler
+from backend.lambdas.config import reset_settings
+
+@pytest.fixture
+def metrics_sink():
+    """Recoger las métricas EMF en memoria."""
+    sink = metrics.InMemorySink()
+    previous = metrics.set_sink(sink)
+    metrics.reset_cold_start()
+    yield sink
+    metrics.set_sink(previous)
+
+def upload_event(user_id, content):
+    return {
+        'httpMethod': 'POST',
+        'path': '/documents',
+        'body': json.dumps({
+            'user_id': user_id,
+            'document_type': 'contract',
+            'file_name': 'contract.pdf',
+            'file_content': base64.b64encode(content).decode('utf-8')
+        })
+    }
+
+def test_metrics_per_route_and_aws_call(s3_mock, dynamodb_mock, metrics_sink):
+    """Test métricas de duración, bytes y llamadas AWS de una subida."""
+    response = lambda_handler(upload_event('user900', b'x' * 1000), {})
+    assert response['statusCode'] == 201
+
+    route_document = metrics_sink.documents[0]
+    assert route_document['Route'] == 'upload_document'
+    assert route_document['ColdStart'] == 1
+    assert route_document['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [['Route']]
+    assert route_document['Duration'] >= route_document['HandlerDuration'] > 0
+    assert route_document['Errors'] == 0
+    assert 'Base64Decode' in route_document
+
+    assert metrics_sink.values('AwsRequestBytes', Service='s3', Operation='PutObject') == [1000]
+    assert metrics_sink.values('AwsCallRetries', Service='dynamodb', Operation='PutItem') == [0]
+    assert len(metrics_sink.values('AwsCallDuration', Service='s3', Operation='PutObject')) == 1
+
+    metrics_sink.clear()
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/user900/contract'}, {})
+    assert response['statusCode'] == 200
+    assert metrics_sink.values('ColdStart', Route='get_document') == [0]
+    assert metrics_sink.values('AwsResponseBytes', Service='s3', Operation='GetObject') == [1000]
+    assert metrics_sink.values('ResponseBytes', Route='get_document') == [len(response['body'])]
+
+def test_metrics_emf_line_on_stdout(capsys):
+    """Test que el destino por defecto escribe una línea JSON EMF por documento."""
+    token = metrics.start_invocation()
+    metrics.set_route('test_route')
+    metrics.put_metric('Custom', 3)
+    metrics.finish_invocation(token)
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert lines[0]['Route'] == 'test_route'
+    assert lines[0]['Custom'] == 3
+    assert {'Name': 'Custom', 'Unit': 'Count'} in lines[0]['_aws']['CloudWatchMetrics'][0]['Metrics']
+
+def test_metrics_disabled(metrics_sink, monkeypatch):
+    """Test que con METRICS_ENABLED=false no se registra nada."""
+    monkeypatch.setenv('METRICS_ENABLED', 'false')
+    reset_settings()
+    lambda_handler({'httpMethod': 'PUT', 'path': '/invalid'}, {})
+    assert metrics_sink.documents == []
@@ -0,0 +1,33 @@
+import json
+from decimal import Decimal
+
+from backend.lambdas.http_utils import create_response
+from backend.lambdas.models import DocumentMetadata, DocumentSummary, decimal_to_number
+
+
+def test_decimal_to_number():
+    assert decimal_to_number(Decimal('1E+2')) == 100
+    assert isinstance(decimal_to_number(Decimal('1E+2')), int)
+    assert decimal_to_number(Decimal('2048')) == 2048
+    assert decimal_to_number(Decimal('2.50')) == 2.5
+    assert isinstance(decimal_to_number(Decimal('3.0')), int)
+
+
+def test_document_records_from_items():
+    """Test conversión directa de items de DynamoDB a registros tipados."""
+    item = {
+        'user_id': 'user1', 'document_id': 'doc1', 'document_type': 'passport', 'file_name': 'p.pdf',
+        's3_bucket': 'bucket', 's3_key': 'user1/passport/doc1/p.pdf', 'upload_date': '2024-01-01T00:00:00',
+        'type_date': 'passport#2024-01-01T00:00:00', 'file_size': Decimal('1E+3'), 'stored_size': Decimal('200'),
+        'content_encoding': 'gzip'
+    }
+    metadata = DocumentMetadata.from_item(item)
+    assert metadata.file_size == 1000 and type(metadata.file_size) is int
+    assert metadata.stored_size == 200
+    assert metadata.etag is None
+    assert not hasattr(metadata, '__dict__')
+
+    summary = DocumentSummary.from_item(item)
+    body = json.loads(create_response(200, {'documents': [summary], 'total': Decimal('2.5')})['body'])
+    assert body == {'documents': [{'document_id': 'doc1', 'document_type': 'passport', 'file_name': 'p.pdf',
+                                   'file_size': 1000, 'upload_date': '2024-01-01T00:00:00'}], 'total': 2.5}
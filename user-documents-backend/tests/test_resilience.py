@@ -0,0 +1,188 @@
+import base64
+import json
+
+import boto3
+import pytest
+from botocore import xform_name
+from botocore.awsrequest import AWSResponse
+from moto.core.botocore_stubber import MockRawResponse
+
+from backend.lambdas.aws_clients import get_client, get_resource
+from backend.lambdas.config import reset_settings
+from backend.lambdas.lambda_function import lambda_handler
+from backend.lambdas.resilience import CircuitBreaker
+
+DYNAMODB_THROTTLING = json.dumps({
+    '__type': 'com.amazonaws.dynamodb.v20120810#ProvisionedThroughputExceededException',
+    'message': 'The level of configured provisioned throughput for the table was exceeded'
+})
+DYNAMODB_INTERNAL_ERROR = json.dumps({
+    '__type': 'com.amazonaws.dynamodb.v20120810#InternalServerError',
+    'message': 'Internal server error'
+})
+S3_SLOW_DOWN = '<Error><Code>SlowDown</Code><Message>Please reduce your request rate.</Message></Error>'
+
+class FailureInjector:
+    """Responde con un error a las primeras llamadas de una operación, antes de llegar a moto."""
+
+    def __init__(self, client, operation, status, body, times=None):
+        self.status = status
+        self.body = body
+        self.times = times
+        self.calls = 0
+        service = client.meta.service_model.service_id.hyphenize()
+        client.meta.events.register_first(f'before-send.{service}.{operation}', self)
+
+    def __call__(self, request, **kwargs):
+        self.calls += 1
+        if self.times is None or self.calls <= self.times:
+            return AWSResponse(request.url, self.status, {}, MockRawResponse(self.body))
+        return None
+
+class AppliedFailureInjector(FailureInjector):
+    """Como FailureInjector, pero la llamada de DynamoDB se aplica antes de responder con el error"""
+
+    def __init__(self, client, operation, status, body, times=None):
+        super().__init__(client, operation, status, body, times)
+        self.operation = operation
+        # Cliente sin el injector, contra el mismo backend de moto
+        self.direct = boto3.client('dynamodb', region_name=client.meta.region_name)
+
+    def __call__(self, request, **kwargs):
+        if self.times is None or self.calls < self.times:
+            getattr(self.direct, xform_name(self.operation))(**json.loads(request.body))
+        return super().__call__(request, **kwargs)
+
+class LambdaContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+        self.aws_request_id = 'request-1'
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+def upload_event(user_id):
+    return {
+        'httpMethod': 'POST',
+        'path': '/documents',
+        'body': json.dumps({
+            'user_id': user_id,
+            'document_type': 'invoice',
+            'file_name': 'invoice.pdf',
+            'file_content': base64.b64encode(b'factura').decode('utf-8')
+        })
+    }
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setenv('RETRY_BASE_DELAY', '0')
+    # Sin la limitación adaptativa de botocore, que espera tras un throttling
+    monkeypatch.setenv('AWS_RETRY_MODE', 'standard')
+    reset_settings()
+
+def test_throttled_calls_are_retried(s3_mock, dynamodb_mock, fast_retries):
+    """Test throttling transitorio de DynamoDB y S3: la subida se completa con reintentos."""
+    put_item = FailureInjector(get_resource('dynamodb').meta.client, 'PutItem', 400, DYNAMODB_THROTTLING, times=2)
+    put_object = FailureInjector(get_client('s3'), 'PutObject', 503, S3_SLOW_DOWN, times=1)
+
+    response = lambda_handler(upload_event('user980'), LambdaContext(30000))
+
+    assert response['statusCode'] == 201
+    assert put_item.calls == 3
+    assert put_object.calls == 2
+
+def test_circuit_breaker_sheds_load(s3_mock, dynamodb_mock, fast_retries, monkeypatch):
+    """Test throttling persistente: 503 con Retry-After y, con el circuito abierto, sin llamar a S3."""
+    monkeypatch.setenv('CIRCUIT_FAILURE_THRESHOLD', '2')
+    monkeypatch.setenv('CIRCUIT_RESET_TIMEOUT', '30')
+    reset_settings()
+    put_object = FailureInjector(get_client('s3'), 'PutObject', 503, S3_SLOW_DOWN)
+
+    # Una request con throttling agota sus reintentos sin abrir el circuito
+    response = lambda_handler(upload_event('user981'), LambdaContext(30000))
+    assert response['statusCode'] == 503
+    assert response['headers']['Retry-After'] == '1'
+    assert put_object.calls == 5
+
+    response = lambda_handler(upload_event('user981'), LambdaContext(30000))
+    assert response['statusCode'] == 503
+    assert response['headers']['Retry-After'] == '30'
+    assert put_object.calls == 10
+
+    response = lambda_handler(upload_event('user981'), LambdaContext(30000))
+    assert response['statusCode'] == 503
+    assert put_object.calls == 10
+    # La subida compensada no deja metadatos
+    assert dynamodb_mock.scan()['Count'] == 0
+
+def test_non_idempotent_calls_retry_only_throttling(s3_mock, dynamodb_mock, fast_retries, monkeypatch):
+    """Test ADD ref_count de dedup: se reintenta el throttling, no un error transitorio."""
+    monkeypatch.setenv('DEDUP_UPLOADS', 'true')
+    reset_settings()
+    client = get_resource('dynamodb').meta.client
+    update_item = FailureInjector(client, 'UpdateItem', 400, DYNAMODB_THROTTLING, times=1)
+    assert lambda_handler(upload_event('user983'), LambdaContext(30000))['statusCode'] == 201
+    # acquire (2 intentos), mark_blob_stored y el puntero LATEST#
+    assert update_item.calls == 4
+
+    update_item = FailureInjector(client, 'UpdateItem', 500, DYNAMODB_INTERNAL_ERROR, times=1)
+    response = lambda_handler(upload_event('user984'), LambdaContext(30000))
+    assert response['statusCode'] == 503
+    assert update_item.calls == 1
+
+def test_deadline_stops_calls(s3_mock, dynamodb_mock):
+    """Test plazo agotado: la request responde 503 sin llamar a AWS."""
+    get_item = FailureInjector(get_resource('dynamodb').meta.client, 'GetItem', 400, DYNAMODB_THROTTLING)
+
+    response = lambda_handler({'httpMethod': 'GET', 'path': '/documents/user982/invoice'}, LambdaContext(100))
+
+    assert response['statusCode'] == 503
+    assert get_item.calls == 0
+
+def test_circuit_breaker_half_open_probe():
+    """Test circuito: abierto tras los fallos, una llamada de prueba tras reset_timeout."""
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    assert not breaker.record_failure()
+    assert breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 10.0
+    assert breaker.allow()
+    assert not breaker.allow()
+    assert breaker.record_failure()
+
+    now[0] = 20.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+def test_idempotency_claim_applied_before_a_5xx(s3_mock, dynamodb_mock, fast_retries):
+    """Test claim aplicado pero respondido con 5xx: el reintento reconoce su registro y sube."""
+    event = dict(upload_event('user985'), headers={'Idempotency-Key': 'retry-1'})
+    put_item = AppliedFailureInjector(get_resource('dynamodb').meta.client, 'PutItem', 500,
+                                      DYNAMODB_INTERNAL_ERROR, times=1)
+
+    response = lambda_handler(event, LambdaContext(30000))
+    assert response['statusCode'] == 201
+    # claim (2 intentos) y metadatos del documento
+    assert put_item.calls == 3
+
+    replay = lambda_handler(event, LambdaContext(30000))
+    assert replay['statusCode'] == 201
+    assert replay['headers']['Idempotent-Replayed'] == 'true'
+    assert replay['body'] == response['body']
+
+def test_throttled_batch_write_is_not_retried_twice(s3_mock, dynamodb_mock, fast_retries):
+    """Test BatchWriteItem con throttling: solo los reintentos de la política, sin el bucle del lote."""
+    batch_write = FailureInjector(get_resource('dynamodb').meta.client, 'BatchWriteItem', 400, DYNAMODB_THROTTLING)
+    response = lambda_handler({
+        'httpMethod': 'POST',
+        'path': '/documents/batch',
+        'body': json.dumps({'documents': [json.loads(upload_event('user986')['body'])]})
+    }, LambdaContext(30000))
+
+    assert response['statusCode'] == 207
+    assert batch_write.calls == 5
+    # El archivo sin metadatos se compensa
+    assert s3_mock.list_objects_v2(Bucket='user-documents-bucket')['KeyCount'] == 0
@@ -0,0 +1,36 @@
+from backend.lambdas.routing import Router
+
+
+def test_router_extracts_path_parameters():
+    """Test extracción de parámetros y prioridad de registro."""
+    router = Router()
+
+    @router.route('POST', '/documents/batch')
+    def batch(event):
+        return 'batch'
+
+    @router.route('POST', '/documents/{user_id}')
+    def by_user(event, user_id):
+        return f'user {user_id}'
+
+    @router.route('PUT', r'/documents/{user_id}/parts/{part_number:\d+}')
+    def part(event, user_id, part_number):
+        return (user_id, part_number)
+
+    assert router.dispatch({'httpMethod': 'POST', 'path': '/documents/batch'}) == 'batch'
+    assert router.dispatch({'httpMethod': 'POST', 'path': '/documents/user1'}) == 'user user1'
+    assert router.dispatch({'httpMethod': 'put', 'path': '/documents/u.1/parts/7'}) == ('u.1', '7')
+    assert router.match('PUT', '/documents/u1/parts/x') == (None, None)
+    assert router.match('POST', '/documents/') == (None, None)
+
+
+def test_router_distinguishes_404_and_405():
+    router = Router()
+    router.add('GET', '/documents/{user_id}', lambda event, user_id: user_id)
+    router.add('POST', '/documents/{user_id}', lambda event, user_id: user_id)
+
+    response = router.dispatch({'httpMethod': 'DELETE', 'path': '/documents/user1'})
+    assert response['statusCode'] == 405
+    assert response['headers']['Allow'] == 'GET, POST'
+    assert router.dispatch({'httpMethod': 'GET', 'path': '/documents/user1/extra'})['statusCode'] == 404
+    assert router.dispatch({'httpMethod': 'GET'})['statusCode'] == 404
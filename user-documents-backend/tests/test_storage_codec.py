@@ -0,0 +1,70 @@
+import gzip
+import io
+import struct
+
+from backend.lambdas import storage_codec
+
+
+def tiff(compression):
+    """TIFF little-endian mínimo con un único tag Compression"""
+    header = b'II*\x00' + struct.pack('<I', 8)
+    ifd = struct.pack('<H', 1) + struct.pack('<HHI', 259, 3, 1) + struct.pack('<H', compression) + b'\x00\x00'
+    return header + ifd + struct.pack('<I', 0) + b'\x00' * 64
+
+
+def test_is_compressible_sniffs_content():
+    """Test detección del contenido que merece la pena comprimir."""
+    assert storage_codec.is_compressible(b'<?xml version="1.0"?><pension/>' * 10)
+    assert storage_codec.is_compressible('Resolución de pensión\n'.encode('utf-8') * 10)
+    assert storage_codec.is_compressible(b'{"a": 1}', 'application/json')
+    assert storage_codec.is_compressible(tiff(1))
+    assert not storage_codec.is_compressible(tiff(5))
+    assert storage_codec.is_compressible(b'BM' + b'\x00' * 28 + struct.pack('<I', 0) + b'\x00' * 32)
+
+    assert not storage_codec.is_compressible(b'\xff\xd8\xff\xe0' + b'\x00' * 64)
+    assert not storage_codec.is_compressible(b'\x89PNG\r\n\x1a\n' + b'\x00' * 64)
+    assert not storage_codec.is_compressible(b'PK\x03\x04' + b'\x00' * 64)
+    assert storage_codec.is_compressible(b'%PDF-1.4\n1 0 obj << /Length 10 >> stream\nBT ET\nendstream')
+    assert not storage_codec.is_compressible(b'%PDF-1.7\n1 0 obj << /Filter /FlateDecode >> stream\nx\x9c')
+    assert not storage_codec.is_compressible(bytes(range(256)) * 4)
+
+
+def test_encode_for_storage_uses_configured_codec(monkeypatch):
+    """Test compresión según la configuración y ahorro mínimo."""
+    from backend.lambdas.config import reset_settings
+    text = b'linea de texto repetida\n' * 200
+
+    assert storage_codec.encode_for_storage(text) == (text, storage_codec.IDENTITY)
+
+    monkeypatch.setenv('STORAGE_CODEC', 'gzip')
+    reset_settings()
+    stored, codec = storage_codec.encode_for_storage(text, 'text/plain')
+    assert codec == 'gzip'
+    assert gzip.decompress(stored) == text
+    assert storage_codec.decode(stored, codec) == text
+    # Por debajo del tamaño mínimo no se comprime
+    assert storage_codec.encode_for_storage(b'corto', 'text/plain')[1] == storage_codec.IDENTITY
+    # Por encima del máximo tampoco: sus rangos se leen de S3
+    monkeypatch.setenv('COMPRESSION_MAX_BYTES', '1024')
+    reset_settings()
+    assert storage_codec.encode_for_storage(text, 'text/plain') == (text, storage_codec.IDENTITY)
+
+
+def test_decode_prefix_reads_only_the_range():
+    """Test descompresión parcial: solo hasta el final del rango."""
+    text = bytes(range(256)) * 4096
+    for codec in ('gzip', 'deflate'):
+        body = io.BytesIO(storage_codec.encode(text, codec, 6))
+        assert storage_codec.decode_prefix(body, codec, 1000, chunk_size=256) == text[:1000]
+        assert body.tell() < len(body.getvalue())
+        body = io.BytesIO(storage_codec.encode(text, codec, 6))
+        assert storage_codec.decode_prefix(body, codec, len(text) + 10) == text
+    assert storage_codec.decode_prefix(io.BytesIO(text), storage_codec.IDENTITY, 5) == text[:5]
+
+
+def test_accepts_encoding():
+    assert storage_codec.accepts_encoding('gzip, deflate, br', 'gzip')
+    assert storage_codec.accepts_encoding('*', 'deflate')
+    assert not storage_codec.accepts_encoding('gzip;q=0, br', 'gzip')
+    assert not storage_codec.accepts_encoding('br', 'gzip')
+    assert not storage_codec.accepts_encoding(None, 'gzip')
@@ -0,0 +1,63 @@
+import base64
+import gzip
+import hashlib
+import json
+
+from backend.lambdas import storage_codec
+from backend.lambdas.upload_stream import decode_base64_content, parse_upload_body
+
+
+def test_decode_from_body_without_copying_file_content():
+    """Test decodificación por bloques desde el cuerpo JSON, con escapes."""
+    data = bytes(range(256)) * 40
+    encoded = base64.encodebytes(data).decode('ascii')  # con saltos de línea
+    raw = json.dumps({'user_id': 'user1', 'file_content': encoded, 'file_name': 'a.bin'})
+    raw = raw.replace('/', '\\/')  # escape permitido por JSON
+    (body, content), error = parse_upload_body({'body': raw})
+    assert error is None
+    assert body == {'user_id': 'user1', 'file_content': '', 'file_name': 'a.bin'}
+
+    for chunk_chars in (7, 64, 4096):
+        upload, error = decode_base64_content(content, max_memory=1024, sha256=True, chunk_chars=chunk_chars)
+        assert error is None
+        assert upload.read() == data
+        assert upload.size == len(data)
+        assert upload.md5_hex == hashlib.md5(data).hexdigest()
+        assert upload.sha256_hex == hashlib.sha256(data).hexdigest()
+        assert upload.head == data[:len(upload.head)]
+        # Supera max_memory: el contenido está en disco
+        assert upload.file._rolled
+        upload.close()
+
+
+def test_parse_upload_body_falls_back_to_json():
+    """Test file_content anidado, ausente o con tipo incorrecto."""
+    raw = json.dumps({'metadata': {'file_content': 'aG9sYQ=='}, 'file_content': 'YWRpb3M='})
+    (body, content), _ = parse_upload_body({'body': raw})
+    assert body['metadata'] == {'file_content': 'aG9sYQ=='}
+    assert decode_base64_content(content, 1024)[0].read() == b'adios'
+
+    (body, content), _ = parse_upload_body({'body': json.dumps({'file_content': 5})})
+    assert content is None
+    assert decode_base64_content(content, 1024) == (None, 'Invalid file_content - must be base64 encoded')
+
+    assert parse_upload_body({'body': '{"file_content": "abc"'})[1]['statusCode'] == 400
+    assert parse_upload_body({'body': None})[1]['statusCode'] == 400
+    upload, error = decode_base64_content(('abcde', 0, 5), 1024)
+    assert upload is None and error
+
+
+def test_encode_content_for_storage_streams_compression(monkeypatch):
+    """Test compresión del spool por bloques."""
+    from backend.lambdas.config import reset_settings
+    monkeypatch.setenv('STORAGE_CODEC', 'gzip')
+    reset_settings()
+    text = b'linea de texto repetida\n' * 20000
+    encoded = base64.b64encode(text).decode('ascii')
+    upload, _ = decode_base64_content((encoded, 0, len(encoded)), max_memory=4096)
+
+    stored, codec = storage_codec.encode_content_for_storage(upload, 'text/plain')
+    assert codec == 'gzip'
+    assert stored.size < upload.size // 10
+    assert gzip.decompress(stored.read()) == text
+    assert stored.content_md5 == base64.b64encode(hashlib.md5(stored.read()).digest()).decode('ascii')